@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+from interactions import CONFIDENCE_ALPHA, CONFIDENCE_EPSILON, confidence_weights
+
+BLOCK_ROWS = 4096
+
+
+def transpose_csc(csc):
+    # the CSC arrays of a users x items matrix are the CSR arrays of its items x users transpose
+    return sp.csr_matrix((csc.data, csc.indices, csc.indptr), shape=(csc.shape[1], csc.shape[0]), copy=False)
+
+
+def solve_block(weights, X, Y, YtY, regularization, cg_steps):
+    """A few conjugate-gradient steps on the implicit normal equations for every row of a block at once.
+
+    For row u with confidence weights w (c - 1) on its observed columns, solves
+    (YtY + Y^T diag(w) Y + regularization * I) x_u = Y^T (1 + w), warm-started from X.
+    """
+    rows = np.repeat(np.arange(weights.shape[0]), np.diff(weights.indptr))
+    # gather the observed factors once; summing them back per row through a CSR over their positions reads
+    # them sequentially instead of scattering across all of Y
+    Y_observed = Y[weights.indices]
+    positions = np.arange(len(weights.indices))
+
+    def row_sums(values):
+        return sp.csr_matrix((values, positions, weights.indptr), shape=(weights.shape[0], len(positions))) @ Y_observed
+
+    def product(P):
+        # (YtY + Y^T diag(w) Y + regularization * I) p, the diag(w) part over each row's observed columns only
+        scaled = weights.data * np.einsum("ij,ij->i", Y_observed, np.take(P, rows, axis=0))
+        return P @ YtY + regularization * P + row_sums(scaled)
+
+    X = X.copy()
+    R = row_sums(weights.data + 1) - product(X)
+    P = R.copy()
+    residual = np.einsum("ij,ij->i", R, R)
+    for _ in range(cg_steps):
+        AP = product(P)
+        curvature = np.einsum("ij,ij->i", P, AP)
+        step = np.divide(residual, curvature, out=np.zeros_like(residual), where=curvature > 0)
+        X += step[:, None] * P
+        R -= step[:, None] * AP
+        new_residual = np.einsum("ij,ij->i", R, R)
+        ratio = np.divide(new_residual, residual, out=np.zeros_like(residual), where=residual > 0)
+        P = R + ratio[:, None] * P
+        residual = new_residual
+    return X
+
+
+class AlternatingLeastSquares:
+    """Implicit-feedback matrix factorization (Hu, Koren & Volinsky) trained by alternating least squares.
+
+    Ratings become confidence weights with interactions.confidence_weights, so unobserved pairs are weak
+    negatives rather than explicit zero ratings. Each half-iteration solves every user (then item) with a few
+    warm-started conjugate-gradient steps, in blocks of rows spread over a thread pool.
+    """
+
+    def __init__(self, n_factors=50, regularization=0.01, alpha=CONFIDENCE_ALPHA, weighting="linear",
+                 epsilon=CONFIDENCE_EPSILON, iterations=15, cg_steps=3, n_threads=None, block_rows=BLOCK_ROWS,
+                 dtype=np.float32, random_state=42):
+        self.n_factors = n_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.weighting = weighting
+        self.epsilon = epsilon
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.n_threads = n_threads or os.cpu_count()
+        self.block_rows = block_rows
+        self.dtype = dtype
+        self.random_state = random_state
+        self.user_factors = None
+        self.item_factors = None
+
+    def _weights(self, matrix):
+        matrix = sp.csr_matrix(matrix)
+        data = confidence_weights(matrix.data.astype(self.dtype), self.weighting, self.alpha, self.epsilon)
+        return sp.csr_matrix((data, matrix.indices, matrix.indptr), shape=matrix.shape, copy=False)
+
+    def _solve(self, pool, weights, X, Y):
+        YtY = Y.T @ Y
+        starts = range(0, weights.shape[0], self.block_rows)
+
+        def solve(start):
+            end = min(start + self.block_rows, weights.shape[0])
+            X[start:end] = solve_block(weights[start:end], X[start:end], Y, YtY, self.regularization, self.cg_steps)
+
+        # numpy and the sparse products release the GIL for most of each block, so threads overlap usefully
+        list(pool.map(solve, starts))
+
+    def fit(self, matrix, csc=None, verbose=True):
+        """Fit on a users x items matrix of ratings; csc is its CSC form if one is already at hand."""
+        user_weights = self._weights(matrix)
+        item_weights = self._weights(transpose_csc(csc) if csc is not None else sp.csr_matrix(matrix).T.tocsr())
+        n_users, n_items = user_weights.shape
+
+        rng = np.random.default_rng(self.random_state)
+        self.user_factors = (rng.standard_normal((n_users, self.n_factors)) * 0.01).astype(self.dtype)
+        self.item_factors = (rng.standard_normal((n_items, self.n_factors)) * 0.01).astype(self.dtype)
+
+        with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+            for iteration in range(self.iterations):
+                self._solve(pool, user_weights, self.user_factors, self.item_factors)
+                self._solve(pool, item_weights, self.item_factors, self.user_factors)
+                if verbose:
+                    print(f"ALS iteration {iteration + 1}/{self.iterations}")
+        # factor-major, like TruncatedSVD's components_.T: scoring one user against every item then streams
+        # each factor column instead of taking a short dot product per item row
+        self.item_factors = np.asfortranarray(self.item_factors)
+        return self
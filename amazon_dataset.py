@@ -0,0 +1,267 @@
+import os
+import shutil
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DATASET_PATH = "amazon_df.parquet"
+ROW_GROUP_ROWS = 100000
+
+# hive-partitioned layout: one main_category=<value>/ directory per category, rows sorted by user so
+# row-group statistics on user_id let per-user reads skip most of the file
+DATASET_DIR = "amazon_df"
+PARTITION_COLUMN = "main_category"
+SORT_COLUMNS = ["user_id", "parent_asin"]
+PARTITION_ROW_GROUP_ROWS = 16384
+# '' and null main_category share this partition; cleaning drops null categories, so readers map it back to ''
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# repeated strings: dictionary-encoded in the file and read straight into pandas categoricals by
+# load_interactions; the Arrow type stays string so plain pd.read_parquet callers still get strings
+CATEGORICAL_COLUMNS = ["user_id", "parent_asin", "asin", "filename", "main_category", "store"]
+COLUMN_TYPES = {
+    "rating": pa.float32(),
+    "average_rating": pa.float32(),
+    "price": pa.float32(),
+    "review_timestamp": pa.int64(),
+    "helpful_vote": pa.int32(),
+    "rating_number": pa.int32(),
+}
+NULLABLE_INTEGERS = {pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype()}
+# int32 codes derived from the sorted distinct ids, so they agree with the categorical codes
+CODE_COLUMNS = {"user_idx": "user_id", "item_idx": "parent_asin"}
+
+
+def compact_type(field):
+    if field.name in CATEGORICAL_COLUMNS:
+        return pa.string()
+    return COLUMN_TYPES.get(field.name, field.type)
+
+
+def compact_schema(schema):
+    return pa.schema([pa.field(field.name, compact_type(field)) for field in schema], metadata=schema.metadata)
+
+
+def compact_table(table):
+    return table.cast(compact_schema(table.schema))
+
+
+def write_interactions(data, path=DATASET_PATH, row_group_rows=ROW_GROUP_ROWS):
+    table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+    table = compact_table(table)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        pq.write_table(table, tmp_path, row_group_size=row_group_rows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return table.num_rows
+
+
+def partition_path(dataset_dir, value):
+    segment = quote(value, safe="") if value else NULL_PARTITION
+    return os.path.join(dataset_dir, f"{PARTITION_COLUMN}={segment}")
+
+
+def partition_runs(table):
+    # start/end/value of each run of equal main_category values in a table sorted by it
+    indices = pc.dictionary_encode(table.column(PARTITION_COLUMN)).combine_chunks()
+    codes = indices.indices.fill_null(-1).to_numpy()
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1])
+    ends = np.concatenate([starts[1:], [len(codes)]])
+    for start, end in zip(starts, ends):
+        code = codes[start]
+        yield int(start), int(end), indices.dictionary[code].as_py() if code >= 0 else None
+
+
+class PartitionedWriter:
+    # input must arrive sorted by main_category, then user_id; each category is written once
+    def __init__(self, dataset_dir=DATASET_DIR, row_group_rows=PARTITION_ROW_GROUP_ROWS):
+        self.dataset_dir = dataset_dir
+        self.row_group_rows = row_group_rows
+        self.tmp_dir = f"{dataset_dir}.{os.getpid()}.tmp"
+        self.written = 0
+        self._partitions = set()
+        self._writer = None
+        self._partition = None
+        self._pending = []
+        self._pending_rows = 0
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+
+    def write(self, table):
+        table = compact_table(table)
+        for start, end, value in partition_runs(table):
+            partition = partition_path(self.tmp_dir, value)
+            if partition != self._partition:
+                self._open(partition, table.schema)
+            self._pending.append(table.slice(start, end - start).drop_columns([PARTITION_COLUMN]))
+            self._pending_rows += end - start
+            if self._pending_rows >= self.row_group_rows:
+                self._flush()
+
+    def _open(self, partition, schema):
+        self._close_writer()
+        if partition in self._partitions:
+            raise ValueError(f"rows for {partition} arrived out of order; sort by {PARTITION_COLUMN} first")
+        self._partitions.add(partition)
+        os.makedirs(partition)
+        file_schema = schema.remove(schema.get_field_index(PARTITION_COLUMN))
+        self._writer = pq.ParquetWriter(
+            os.path.join(partition, "part-0.parquet"),
+            file_schema,
+            sorting_columns=pq.SortingColumn.from_ordering(file_schema, [(c, "ascending") for c in SORT_COLUMNS]),
+        )
+        self._partition = partition
+
+    def _flush(self):
+        if self._pending_rows:
+            self._writer.write_table(pa.concat_tables(self._pending), row_group_size=self.row_group_rows)
+            self.written += self._pending_rows
+            self._pending, self._pending_rows = [], 0
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+            self._partition = None
+
+    def close(self):
+        self._close_writer()
+        old_dir = f"{self.dataset_dir}.{os.getpid()}.old"
+        if os.path.exists(self.dataset_dir):
+            os.rename(self.dataset_dir, old_dir)
+        os.rename(self.tmp_dir, self.dataset_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return self.written
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def write_partitioned(data, dataset_dir=DATASET_DIR, row_group_rows=PARTITION_ROW_GROUP_ROWS):
+    table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+    table = compact_table(table)
+    # '' and null share the default partition, so they have to sort next to each other
+    category = table.column(PARTITION_COLUMN)
+    category = pc.if_else(pc.equal(category, ""), pa.scalar(None, pa.string()), category)
+    table = table.set_column(table.schema.get_field_index(PARTITION_COLUMN), PARTITION_COLUMN, category)
+    table = table.sort_by([(c, "ascending") for c in [PARTITION_COLUMN] + SORT_COLUMNS])
+    writer = PartitionedWriter(dataset_dir, row_group_rows)
+    try:
+        writer.write(table)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def ensure_partitioned(dataset_dir=DATASET_DIR, source=DATASET_PATH, row_group_rows=PARTITION_ROW_GROUP_ROWS):
+    # a checkout ships the single amazon_df.parquet; split it into partitions once, without the database
+    if not os.path.isdir(dataset_dir):
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"neither {dataset_dir}/ nor {source} exists; run `python clean_reviews.py`")
+        write_partitioned(pq.read_table(source), dataset_dir, row_group_rows)
+    return dataset_dir
+
+
+def open_dataset(path, dictionary_columns=()):
+    file_format = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=dictionary_columns))
+    return ds.dataset(path, format=file_format, partitioning="hive" if os.path.isdir(path) else None)
+
+
+def sorted_codes(column):
+    if pa.types.is_dictionary(column.type):
+        dictionary_rows = sum(len(chunk.dictionary) for chunk in column.chunks)
+        # filtered reads keep whole row-group dictionaries, so re-encoding the few values left is cheaper;
+        # the hive null partition comes back as a null dictionary entry, which unify_dictionaries rejects
+        if dictionary_rows > len(column) or any(chunk.dictionary.null_count for chunk in column.chunks):
+            column = column.cast(pa.string())
+    if not pa.types.is_dictionary(column.type):
+        column = pc.dictionary_encode(column)
+    column = column.unify_dictionaries()
+    if column.num_chunks == 0:
+        return np.empty(0, dtype=np.int32), pa.array([], type=pa.string())
+
+    dictionary = column.chunk(0).dictionary
+    order = pc.array_sort_indices(dictionary).to_numpy()
+    rank = np.empty(len(dictionary), dtype=np.int32)
+    rank[order] = np.arange(len(dictionary), dtype=np.int32)
+
+    indices = np.concatenate([chunk.indices.fill_null(-1).to_numpy() for chunk in column.chunks])
+    codes = np.where(indices >= 0, rank[np.maximum(indices, 0)], -1).astype(np.int32)
+    return codes, dictionary.take(pa.array(order))
+
+
+def dataset_ids(path, id_column):
+    # every distinct id in the dataset, sorted; read dictionary-encoded so only the distinct values are materialised
+    column = open_dataset(path, [id_column]).to_table(columns=[id_column]).column(id_column)
+    return sorted_codes(column)[1]
+
+
+def load_interactions(columns=None, filters=None, path=DATASET_DIR, indexes=None):
+    # user_idx/item_idx come from indexes[code_column] (an IdIndex) when given; otherwise they rank the ids
+    # of the whole dataset, which a filtered read has to look up instead of ranking only the rows it kept
+    indexes = dict(indexes or {})
+    requested = list(columns) if columns is not None else None
+    # decoding straight into dictionaries pays off for whole-dataset reads, but evaluating a filter against
+    # dictionary columns is far slower than against plain strings, so filtered reads encode afterwards
+    dataset = open_dataset(path, CATEGORICAL_COLUMNS if filters is None else ())
+    file_columns = dataset.schema.names
+    if requested is None:
+        requested = file_columns
+    read_columns = [c for c in requested if c in file_columns]
+    for code_column, id_column in CODE_COLUMNS.items():
+        if code_column in requested and id_column not in read_columns:
+            read_columns.append(id_column)
+
+    if filters is not None and not isinstance(filters, ds.Expression):
+        filters = pq.filters_to_expression(filters)
+    # the dataset scanner prunes partitions and row groups (via min/max statistics) before decoding
+    table = dataset.to_table(columns=read_columns, filter=filters)
+    data = {}
+    for name in read_columns:
+        column = table.column(name)
+        if name == PARTITION_COLUMN and column.null_count:
+            column = pc.fill_null(column.cast(pa.string()), "")
+        if name in CATEGORICAL_COLUMNS:
+            codes, categories = sorted_codes(column)
+            data[name] = pd.Categorical.from_codes(codes, categories=categories.to_pandas().astype(object))
+            for code_column, id_column in CODE_COLUMNS.items():
+                if id_column != name or code_column not in requested:
+                    continue
+                if code_column in indexes:
+                    data[code_column] = indexes[code_column].encode(pd.Series(data[name]))
+                elif filters is None:
+                    data[code_column] = codes
+                else:
+                    # positions of the slice's ids among the whole dataset's sorted ids
+                    ranks = pc.index_in(categories, value_set=dataset_ids(path, id_column)).fill_null(-1).to_numpy()
+                    data[code_column] = np.where(codes >= 0, ranks[np.maximum(codes, 0)], -1).astype(np.int32)
+        else:
+            column = column.cast(COLUMN_TYPES.get(name, column.type))
+            if column.null_count and column.type in NULLABLE_INTEGERS:
+                data[name] = column.to_pandas(types_mapper=NULLABLE_INTEGERS.get)
+            else:
+                data[name] = column.to_pandas()
+    return pd.DataFrame({name: data[name] for name in requested})
+
+
+def read_frame(columns=None, filters=None, path=DATASET_DIR):
+    # plain pandas dtypes (main_category as strings rather than the partition dictionary) for the notebooks
+    partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive")
+    df = pd.read_parquet(path, columns=columns, filters=filters, partitioning=partitioning)
+    if PARTITION_COLUMN in df.columns:
+        df[PARTITION_COLUMN] = df[PARTITION_COLUMN].fillna("")
+    return df
@@ -0,0 +1,124 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+import db
+from retrieval import recommend_batch
+
+RECOMMENDATIONS_PATH = "user_recommendations.parquet"
+RECOMMENDATIONS_TABLE = "user_recommendations"
+TOP_N = 20
+MEMORY_BUDGET_MB = 1024
+COPY_BATCH_ROWS = 500000
+
+RECOMMENDATION_SCHEMA = pa.schema([
+    ("user_id", pa.string()),
+    ("rank", pa.int16()),
+    ("parent_asin", pa.string()),
+    ("score", pa.float32()),
+])
+
+
+def block_users(n_items, itemsize, n_threads, memory_budget_mb=MEMORY_BUDGET_MB):
+    # every in-flight block holds a users x items score matrix plus argpartition's int64 indices of the same shape
+    per_user = n_items * (itemsize + np.dtype(np.int64).itemsize)
+    return max(1, int(memory_budget_mb * 1024 ** 2 // (per_user * n_threads)))
+
+
+def score_blocks(user_factors, item_factors, interactions, k=TOP_N, n_threads=None, memory_budget_mb=MEMORY_BUDGET_MB,
+                 user_codes=None):
+    """(user codes, item codes, scores) blocks in user order, for every user or just user_codes.
+
+    Blocks are sized so all threads' score matrices together stay within memory_budget_mb; the matrix products and
+    argpartition release the GIL, so the blocks score in parallel.
+    """
+    n_threads = n_threads or os.cpu_count()
+    if user_codes is None:
+        user_codes = np.arange(user_factors.shape[0])
+    scores_dtype = np.result_type(user_factors.dtype, item_factors.dtype)
+    rows = block_users(item_factors.shape[0], scores_dtype.itemsize, n_threads, memory_budget_mb)
+    blocks = [user_codes[start:start + rows] for start in range(0, len(user_codes), rows)]
+
+    def score(users):
+        items, scores = recommend_batch(users, user_factors, item_factors, interactions, k)
+        return users, items, scores
+
+    pool = ThreadPoolExecutor(max_workers=n_threads)
+    try:
+        yield from pool.map(score, blocks)
+    finally:
+        # a consumer that stops early should not wait for the rest of the users to be scored
+        pool.shutdown(cancel_futures=True)
+
+
+def recommendation_table(users, items, scores, user_ids, item_ids):
+    # one row per (user, rank); user_ids/item_ids are Arrow string arrays indexed by code
+    k = items.shape[1]
+    valid = (items >= 0).ravel()
+    ranks = np.tile(np.arange(1, k + 1, dtype=np.int16), len(users))[valid]
+    return pa.table({
+        "user_id": user_ids.take(pa.array(np.repeat(users, k)[valid])),
+        "rank": pa.array(ranks),
+        "parent_asin": item_ids.take(pa.array(items.ravel()[valid])),
+        "score": pa.array(scores.ravel()[valid].astype(np.float32)),
+    }, schema=RECOMMENDATION_SCHEMA)
+
+
+def export_recommendations(user_factors, item_factors, interactions, user_index, item_index, path=RECOMMENDATIONS_PATH,
+                           k=TOP_N, n_threads=None, memory_budget_mb=MEMORY_BUDGET_MB, user_codes=None):
+    """Write the top-k unseen items for every user to a Parquet file; returns the number of rows written."""
+    user_ids = pa.array(user_index.decode(np.arange(len(user_index))), pa.string())
+    item_ids = pa.array(item_index.decode(np.arange(len(item_index))), pa.string())
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    written = 0
+    try:
+        with pq.ParquetWriter(tmp_path, RECOMMENDATION_SCHEMA) as writer:
+            for users, items, scores in score_blocks(user_factors, item_factors, interactions, k, n_threads,
+                                                     memory_budget_mb, user_codes):
+                table = recommendation_table(users, items, scores, user_ids, item_ids)
+                writer.write_table(table)
+                written += table.num_rows
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+def copy_recommendations(cursor, path=RECOMMENDATIONS_PATH, table=RECOMMENDATIONS_TABLE, batch_rows=COPY_BATCH_ROWS):
+    # load into a staging table and swap it in, so readers see either the old or the new night's rows
+    staging = f"{table}_staging"
+    cursor.execute(f"""
+        DROP TABLE IF EXISTS {staging};
+        CREATE TABLE {staging} (
+            user_id TEXT NOT NULL,
+            rank SMALLINT NOT NULL,
+            parent_asin TEXT NOT NULL,
+            score REAL NOT NULL
+        )
+    """)
+    copied = 0
+    options = pacsv.WriteOptions(include_header=False)
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+        buffer = io.BytesIO()
+        pacsv.write_csv(pa.Table.from_batches([batch]), buffer, options)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {staging} (user_id, rank, parent_asin, score) FROM STDIN WITH (FORMAT csv)", buffer)
+        copied += batch.num_rows
+    cursor.execute(f"""
+        ALTER TABLE {staging} ADD PRIMARY KEY (user_id, rank);
+        DROP TABLE IF EXISTS {table};
+        ALTER TABLE {staging} RENAME TO {table};
+        ALTER INDEX {staging}_pkey RENAME TO {table}_pkey;
+    """)
+    return copied
+
+
+def load_recommendations(path=RECOMMENDATIONS_PATH, table=RECOMMENDATIONS_TABLE):
+    return db.run_transaction("loading recommendations", copy_recommendations, path, table)
@@ -0,0 +1,69 @@
+import argparse
+import os
+import time
+
+from sklearn.decomposition import TruncatedSVD
+
+from als import AlternatingLeastSquares
+from benchmarks.fixtures import latent_interactions_df
+from interactions import build_interactions
+from retrieval import recommend_batch
+
+
+def leave_latest_out(df, n_test_users, seed=0):
+    # hold out the latest review of users with at least three, for a sample of those users
+    counts = df["user_id"].map(df["user_id"].value_counts())
+    latest = df[counts >= 3].sort_values("review_timestamp").drop_duplicates("user_id", keep="last")
+    test = latest.sample(min(n_test_users, len(latest)), random_state=seed)
+    return df.drop(index=test.index), test
+
+
+def recall_at_k(user_factors, item_factors, train, test_users, test_items, k=10, block=32):
+    hits = 0
+    for start in range(0, len(test_users), block):
+        top, _ = recommend_batch(test_users[start:start + block], user_factors, item_factors, train, k)
+        expected = test_items[start:start + block, None]
+        # -1 marks both padding in top and held-out items never seen in training
+        hits += int(((top == expected) & (expected >= 0)).any(axis=1).sum())
+    return hits / len(test_users)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TruncatedSVD vs implicit ALS: training time and Recall@K")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--factors", type=int, default=50)
+    parser.add_argument("--test-users", type=int, default=5000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=15)
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, os.cpu_count()}))
+    args = parser.parse_args()
+
+    train_df, test = leave_latest_out(latent_interactions_df(args.rows), args.test_users)
+    data = build_interactions(train_df)
+    test_users = data.user_index.encode(test["user_id"])
+    test_items = data.item_index.encode(test["parent_asin"])
+    print(f"{data.matrix.nnz:,} training interactions, {data.shape[0]:,} users x {data.shape[1]:,} items; "
+          f"Recall@{args.k} over {len(test):,} held-out latest reviews "
+          f"({int((test_items < 0).sum())} of them items unseen in training)")
+
+    svd_model = TruncatedSVD(n_components=args.factors, random_state=42)
+    user_factors, svd_time = timed(svd_model.fit_transform, data.matrix)
+    svd_recall = recall_at_k(user_factors, svd_model.components_.T, data.matrix, test_users, test_items, args.k)
+    print(f"{'TruncatedSVD':<26}{str(user_factors.dtype):>9}  train {svd_time:7.1f}s  Recall@{args.k} {svd_recall:.4f}")
+
+    for threads in args.threads:
+        model = AlternatingLeastSquares(n_factors=args.factors, iterations=args.iterations, n_threads=threads)
+        _, als_time = timed(model.fit, data.matrix, data.csc, verbose=False)
+        als_recall = recall_at_k(model.user_factors, model.item_factors, data.matrix, test_users, test_items, args.k)
+        print(f"{f'ALS, {threads} thread(s)':<26}{str(model.user_factors.dtype):>9}  train {als_time:7.1f}s  "
+              f"Recall@{args.k} {als_recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
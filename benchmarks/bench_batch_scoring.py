@@ -0,0 +1,51 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from batch_scoring import MEMORY_BUDGET_MB, TOP_N, export_recommendations, score_blocks
+from benchmarks.fixtures import latent_interactions_df
+from interactions import build_interactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nightly top-N export: users/sec against thread count")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--factors", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=TOP_N)
+    parser.add_argument("--memory-budget-mb", type=int, default=MEMORY_BUDGET_MB)
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count()}))
+    args = parser.parse_args()
+
+    data = build_interactions(latent_interactions_df(args.rows))
+    n_users, n_items = data.shape
+    rng = np.random.default_rng(0)
+    users = np.sort(rng.choice(n_users, min(args.users, n_users), replace=False))
+    # float32, item factors factor-major, as AlternatingLeastSquares returns them
+    user_factors = rng.standard_normal((n_users, args.factors)).astype(np.float32)
+    item_factors = np.asfortranarray(rng.standard_normal((n_items, args.factors)).astype(np.float32))
+    print(f"{n_users:,} users x {n_items:,} items, {args.factors} factors, top {args.k} for {len(users):,} users, "
+          f"{args.memory_budget_mb} MB scoring budget, {os.cpu_count()} CPU(s)")
+
+    for threads in args.threads:
+        start = time.perf_counter()
+        for _ in score_blocks(user_factors, item_factors, data.matrix, args.k, threads, args.memory_budget_mb, users):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"  scoring, {threads} thread(s)   {len(users) / elapsed:9,.0f} users/sec")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        rows = export_recommendations(user_factors, item_factors, data.matrix, data.user_index, data.item_index,
+                                      os.path.join(tmp, "recommendations.parquet"), args.k, max(args.threads),
+                                      args.memory_budget_mb, users)
+        elapsed = time.perf_counter() - start
+        print(f"  export to Parquet, {max(args.threads)} thread(s)   {len(users) / elapsed:9,.0f} users/sec  "
+              f"({rows:,} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import time
+
+from benchmarks.fixtures import synthetic_amazon_df
+from clean_reviews import repair_main_category
+
+
+def repair_loop(df):
+    # the per-file loop the cleaning notebook used before repair_main_category
+    mask = (df['main_category'] == '') | (df['main_category'].isnull())
+    for filename in df.loc[mask, 'filename'].unique():
+        valid_categories = df[
+            (df['filename'] == filename) &
+            (df['main_category'] != '') &
+            (df['main_category'].notna())
+        ]['main_category'].unique()
+
+        if len(valid_categories) > 0:
+            correct_category = df[
+                (df['filename'] == filename) &
+                (df['main_category'] != '') &
+                (df['main_category'].notna())
+            ]['main_category'].mode().iloc[0]
+
+            df.loc[
+                (df['filename'] == filename) &
+                ((df['main_category'] == '') | (df['main_category'].isnull())),
+                'main_category'
+            ] = correct_category
+
+
+def timed(label, func, df, repeat):
+    best = None
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        func(frame)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<11} best of {repeat}: {best:6.3f}s")
+    return frame, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the notebook main_category loop with repair_main_category")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--files", type=int, default=33)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_amazon_df(args.rows, n_files=args.files)
+    missing = (df["main_category"].isna() | (df["main_category"] == "")).sum()
+    print(f"{len(df):,} rows, {df['filename'].nunique()} files, {missing:,} rows without main_category")
+
+    looped, loop_time = timed("loop", repair_loop, df, args.repeat)
+    vectorized, vector_time = timed("vectorized", lambda frame: repair_main_category(frame, verbose=False),
+                                    df, args.repeat)
+    if not looped["main_category"].equals(vectorized["main_category"]):
+        raise AssertionError("repair_main_category disagrees with the notebook loop")
+    print(f"Identical output, {loop_time / vector_time:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import psycopg2
+import psycopg2.extras
+
+import db
+from benchmarks.bench_sampler_memory import peak_rss_kb
+from benchmarks.fixtures import synthetic_review
+from bulk_copy import copy_rows
+from clean_reviews import export_clean_file
+from load_meta import create_meta_data_table
+from load_review import create_review_data_table
+
+BENCH_DB = "bench_cleaning"
+ADMIN_DB = db.DB_NAME or "postgres"
+CATEGORIES = ["All_Beauty.jsonl", "Books.jsonl", "Electronics.jsonl", "Home_and_Kitchen.jsonl"]
+
+
+def admin_execute(*statements):
+    connection = psycopg2.connect(**{**db.connection_params(), "dbname": ADMIN_DB})
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    finally:
+        connection.close()
+
+
+def create_fixture(n_reviews, n_items, seed=0):
+    admin_execute(f"DROP DATABASE IF EXISTS {BENCH_DB}", f"CREATE DATABASE {BENCH_DB}")
+
+    db.DB_NAME = BENCH_DB
+    rng = random.Random(seed)
+    item_category = {}
+
+    def review_rows():
+        for _ in range(n_reviews):
+            review = synthetic_review(rng, n_users=n_reviews // 8, n_items=n_items)
+            filename = item_category.setdefault(review["parent_asin"], rng.choice(CATEGORIES))
+            yield (review["rating"], review["title"], review["text"], "[]", review["asin"],
+                   review["parent_asin"], review["user_id"], review["timestamp"],
+                   review["verified_purchase"], review["helpful_vote"], filename)
+
+    def meta_rows():
+        for parent_asin, filename in item_category.items():
+            main_category = "" if rng.random() < 0.05 else filename.replace(".jsonl", "").replace("_", " ")
+            yield (filename, main_category, "Synthetic product", round(rng.uniform(1, 5), 1), rng.randint(0, 5000),
+                   '["feature"]', "[]", round(rng.uniform(1, 200), 2), "[]", "[]", "Store", '["Category"]',
+                   '{"Brand": "Synthetic"}', parent_asin, None)
+
+    with db.connection() as connection, connection.cursor() as cursor:
+        create_review_data_table(connection, cursor)
+        copy_rows(cursor, "review_data", ["rating", "title", "review_text", "images", "asin", "parent_asin",
+                                          "user_id", "review_timestamp", "verified_purchase", "helpful_vote",
+                                          "filename"], review_rows())
+        connection.commit()
+        create_meta_data_table(connection, cursor)
+        copy_rows(cursor, "meta_data", ["filename", "main_category", "title", "average_rating", "rating_number",
+                                        "features", "description", "price", "images", "videos", "store",
+                                        "categories", "details", "parent_asin", "bought_together"], meta_rows())
+        cursor.execute("ANALYZE review_data; ANALYZE meta_data")
+        connection.commit()
+    db.close_pool()
+
+
+def fetch_frame(query):
+    with db.connection() as connection, connection.cursor() as cursor:
+        psycopg2.extras.register_default_jsonb(cursor, loads=lambda value: value)
+        cursor.execute(query)
+        data = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+    return pd.DataFrame(data, columns=columns)
+
+
+def clean_in_pandas(output):
+    review_df = fetch_frame("SELECT * FROM review_data")
+    meta_df = fetch_frame("SELECT * FROM meta_data").drop(columns=["content_hash"])
+    df = pd.merge(review_df, meta_df, how="left", suffixes=["_review", "_meta"],
+                  left_on=["parent_asin", "filename"], right_on=["parent_asin", "filename"])
+    df = df.drop_duplicates()
+    df = df.dropna(subset=["main_category"])
+
+    df["review_date"] = pd.to_datetime(df["review_timestamp"], unit="ms")
+    df["review_year"] = df["review_date"].dt.year
+    df["review_text"] = df["review_text"].fillna("").astype(str)
+    df["title_review"] = df["title_review"].fillna("").astype(str)
+    df["rating"] = df["rating"].astype(float)
+    df["average_rating"] = pd.to_numeric(df["average_rating"], errors="coerce")
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df["helpful_vote"] = df["helpful_vote"].astype(int)
+    df["rating_number"] = pd.to_numeric(df["rating_number"], errors="coerce").astype("Int64")
+    df["id"] = df["id"].astype("Int64")
+    df["verified_purchase"] = df["verified_purchase"].astype(bool)
+
+    mask = (df["main_category"] == "") | (df["main_category"].isnull())
+    for filename in df.loc[mask, "filename"].unique():
+        valid = df[(df["filename"] == filename) & (df["main_category"] != "") & (df["main_category"].notna())]
+        if len(valid) > 0:
+            df.loc[(df["filename"] == filename) & ((df["main_category"] == "") | (df["main_category"].isnull())),
+                   "main_category"] = valid["main_category"].mode().iloc[0]
+
+    df.to_parquet(output, index=False)
+    return len(df)
+
+
+def measure(mode, output):
+    db.DB_NAME = BENCH_DB
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    rows = clean_in_pandas(output) if mode == "pandas" else export_clean_file(output)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+    print(f"{mode:<7} rows={rows:<8} time={elapsed:6.2f}s  "
+          f"peak RSS={peak / 1024:8.1f} MB  (+{(peak - baseline) / 1024:.1f} MB over baseline)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the pandas cleaning notebook steps with the SQL cleaning stage")
+    parser.add_argument("--reviews", type=int, default=300000)
+    parser.add_argument("--items", type=int, default=150000)
+    parser.add_argument("--mode", choices=["pandas", "sql"])
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args.output)
+        return
+
+    print(f"Creating {args.reviews} synthetic reviews in database {BENCH_DB}...")
+    create_fixture(args.reviews, args.items)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in ("pandas", "sql"):
+                subprocess.run([sys.executable, "-m", "benchmarks.bench_cleaning", "--mode", mode,
+                                "--output", os.path.join(directory, f"{mode}.parquet")], check=True)
+    finally:
+        admin_execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from amazon_dataset import PARTITION_ROW_GROUP_ROWS, load_interactions, read_frame, write_interactions, write_partitioned
+from benchmarks.fixtures import synthetic_amazon_df
+
+
+def dir_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1024 ** 2
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 1024 ** 2
+
+
+def best_of(repeat, func, *args, **kwargs):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def user_lookups(path, users):
+    return sum(len(load_interactions(filters=[("user_id", "=", user)], path=path)) for user in users)
+
+
+def read_patterns(path, category, users, repeat):
+    full, full_time = best_of(repeat, load_interactions, path=path)
+    training, training_time = best_of(repeat, load_interactions, ["user_idx", "item_idx", "rating"],
+                                      filters=[("main_category", "=", category)], path=path)
+    eda, eda_time = best_of(repeat, read_frame, ["main_category", "rating", "review_timestamp"], path=path)
+    looked_up, lookup_time = best_of(repeat, user_lookups, path, users)
+    return [
+        ("full load", len(full), full_time),
+        (f"category training slice ({category})", len(training), training_time),
+        ("EDA projection (3 columns)", len(eda), eda_time),
+        (f"{len(users)} per-user lookups", looked_up, lookup_time),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read patterns on the single amazon_df file vs the partitioned dataset")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--row-group-rows", type=int, nargs="+", default=[PARTITION_ROW_GROUP_ROWS])
+    args = parser.parse_args()
+
+    df = synthetic_amazon_df(args.rows)
+    category = df.loc[df["main_category"] != "", "main_category"].value_counts().index[0]
+    users = random.Random(0).sample(sorted(df["user_id"].unique()), args.users)
+
+    with tempfile.TemporaryDirectory() as directory:
+        layouts = [("single file", os.path.join(directory, "amazon_df.parquet"), write_interactions, None)]
+        for rows in args.row_group_rows:
+            layouts.append((f"partitioned, {rows} rows/group", os.path.join(directory, f"amazon_df_{rows}"),
+                            write_partitioned, rows))
+
+        for label, path, writer, rows in layouts:
+            _, write_time = best_of(1, writer, df, path, **({"row_group_rows": rows} if rows else {}))
+            print(f"\n{label}: {dir_mb(path):.1f} MB on disk, written in {write_time:.2f}s")
+            for pattern, n_rows, elapsed in read_patterns(path, category, users, args.repeat):
+                print(f"  {pattern:<42} rows={n_rows:<9,} {elapsed * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from amazon_dataset import CATEGORICAL_COLUMNS, load_interactions, write_interactions
+from benchmarks.fixtures import synthetic_amazon_df
+
+
+def frame_mb(df):
+    return df.memory_usage(index=False, deep=True) / 1024 ** 2
+
+
+def load_plain(path):
+    df = pd.read_parquet(path)
+    # pandas < 3 gives object columns; keep the comparison the same on every version
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column]):
+            df[column] = df[column].astype(object)
+    return df
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of amazon_df with object strings vs the compact dtypes")
+    parser.add_argument("--rows", type=int, default=1500000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        plain_path = os.path.join(directory, "plain.parquet")
+        compact_path = os.path.join(directory, "compact.parquet")
+        synthetic_amazon_df(args.rows).to_parquet(plain_path, index=False)
+        write_interactions(pd.read_parquet(plain_path), compact_path)
+
+        before, before_time = timed(load_plain, plain_path)
+        after, after_time = timed(load_interactions, path=compact_path)
+        codes, codes_time = timed(load_interactions, ["user_idx", "item_idx", "rating"], path=compact_path)
+
+    before_mb, after_mb = frame_mb(before), frame_mb(after)
+    print(f"{'column':<18}{'before':>14}{'after':>14}{'before MB':>12}{'after MB':>12}")
+    for column in before.columns:
+        print(f"{column:<18}{str(before[column].dtype):>14}{str(after[column].dtype):>14}"
+              f"{before_mb[column]:12.1f}{after_mb[column]:12.1f}")
+    print(f"{'total':<46}{before_mb.sum():12.1f}{after_mb.sum():12.1f}")
+    print(f"\n{len(before):,} rows; string columns stored as categoricals: {', '.join(CATEGORICAL_COLUMNS)}")
+    print(f"load time: object strings {before_time:.2f}s, compact {after_time:.2f}s, "
+          f"user_idx/item_idx/rating only {codes_time:.2f}s ({frame_mb(codes).sum():.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fixtures import synthetic_amazon_df
+from id_index import IdIndex
+
+
+def dict_maps(ids):
+    # the four dicts create_interaction_matrix used to build, for one id column
+    uniques = ids.unique()
+    to_idx = {value: idx for idx, value in enumerate(uniques)}
+    from_idx = {idx: value for value, idx in to_idx.items()}
+    return to_idx, from_idx
+
+
+def dict_mb(maps):
+    return sum(sys.getsizeof(m) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in m.items()) for m in maps) / 1024 ** 2
+
+
+def traced(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Python dict id maps vs the memory-mapped IdIndex")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--users", type=int, default=192000)
+    parser.add_argument("--items", type=int, default=914000)
+    args = parser.parse_args()
+
+    df = synthetic_amazon_df(args.rows, n_users=args.users, n_items=args.items)
+    print(f"{'column':<12}{'ids':>10}  {'':<8}{'build s':>9}{'encode s':>10}{'peak MB':>9}{'held MB':>9}{'load s':>8}")
+    for column in ("user_id", "parent_asin"):
+        ids = df[column].astype(object)
+
+        maps, dict_build, dict_peak = traced(dict_maps, ids)
+        _, dict_encode = timed(ids.map, maps[0])
+        print(f"{column:<12}{len(maps[0]):>10,}  {'dicts':<8}{dict_build:9.2f}{dict_encode:10.2f}"
+              f"{dict_peak:9.1f}{dict_mb(maps):9.1f}{'-':>8}")
+        del maps
+
+        index, index_build, index_peak = traced(IdIndex.build, ids)
+        _, index_encode = timed(index.encode, ids)
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            held = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 1024 ** 2
+            loaded, load_time = timed(IdIndex.load, directory)
+            assert (loaded.encode(ids[:1000]) == index.encode(ids[:1000])).all()
+            del loaded
+        print(f"{'':<12}{len(index):>10,}  {'IdIndex':<8}{index_build:9.2f}{index_encode:10.2f}"
+              f"{index_peak:9.1f}{held:9.1f}{load_time:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from amazon_dataset import write_partitioned
+from benchmarks.fixtures import synthetic_amazon_df
+from interactions import build_interactions, cached_interactions
+
+
+def dict_matrix(df, user_col="user_id", item_col="parent_asin", rating_col="rating"):
+    # the notebook's original create_interaction_matrix
+    users = df[user_col].unique()
+    items = df[item_col].unique()
+    user_to_idx = {user: idx for idx, user in enumerate(users)}
+    item_to_idx = {item: idx for idx, item in enumerate(items)}
+    idx_to_user = {idx: user for user, idx in user_to_idx.items()}
+    idx_to_item = {idx: item for item, idx in item_to_idx.items()}
+    user_indices = df[user_col].map(user_to_idx)
+    item_indices = df[item_col].map(item_to_idx)
+    matrix = csr_matrix((df[rating_col].values, (user_indices, item_indices)), shape=(len(users), len(items)))
+    return matrix, user_to_idx, item_to_idx, idx_to_user, idx_to_item
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dict-mapped csr_matrix vs build_interactions and its on-disk cache")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--duplicates", type=int, default=20000, help="repeated (user, item) reviews to add")
+    args = parser.parse_args()
+
+    df = synthetic_amazon_df(args.rows)
+    repeats = df.sample(args.duplicates, random_state=0)
+    repeats = repeats.assign(review_timestamp=repeats["review_timestamp"] + 1, rating=np.float32(1.0))
+    df = pd.concat([df, repeats], ignore_index=True)
+
+    old, old_time = timed(dict_matrix, df)
+    print(f"dict maps + csr_matrix:           {old_time:6.2f}s  max value {old[0].max():.0f} (duplicates summed)")
+    for policy in ("latest", "mean", "max"):
+        new, new_time = timed(build_interactions, df, duplicates=policy)
+        print(f"build_interactions({policy!r:<8}):    {new_time:6.2f}s  max value {new.matrix.max():.0f}, "
+              f"{new.meta['duplicates_dropped']:,} duplicates combined")
+    _, weight_time = timed(build_interactions, df, weighting="log")
+    print(f"build_interactions(weighting='log'): {weight_time:.2f}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache_dir = os.path.join(directory, "cache")
+        _, first = timed(cached_interactions, df, cache_dir)
+        cached, hit = timed(cached_interactions, df, cache_dir)
+        print(f"cached_interactions, frame hash:  build + save {first:.2f}s, cache hit {hit:.2f}s")
+
+        dataset_dir = os.path.join(directory, "amazon_df")
+        write_partitioned(df, dataset_dir)
+        timed(cached_interactions, df, cache_dir, source=dataset_dir)
+        cached, hit = timed(cached_interactions, df, cache_dir, source=dataset_dir)
+        print(f"cached_interactions, file stats:  cache hit {hit:.3f}s "
+              f"(memory-mapped: {isinstance(cached.matrix.data.base, np.memmap)})")
+
+
+if __name__ == "__main__":
+    main()
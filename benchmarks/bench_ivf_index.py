@@ -0,0 +1,65 @@
+import argparse
+import time
+
+import numpy as np
+
+from als import AlternatingLeastSquares
+from benchmarks.fixtures import latent_interactions_df
+from interactions import build_interactions
+from ivf_index import IVFIndex
+from retrieval import recommend
+
+
+def per_query(func, users):
+    # (results, queries/sec) for func called on one user at a time
+    start = time.perf_counter()
+    results = [func(user)[0] for user in users]
+    return results, len(users) / (time.perf_counter() - start)
+
+
+def scanned(index, queries, n_probe):
+    # mean fraction of items a query scores: the sizes of the n_probe lists it probes
+    sizes = np.diff(index.offsets)
+    probed = np.argpartition(-(queries @ index.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+    return sizes[probed].sum(axis=1).mean() / len(index)
+
+
+def recall(approximate, exact):
+    return np.mean([len(np.intersect1d(found, truth)) / max(len(truth), 1) for found, truth in zip(approximate, exact)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF top-K vs exact scoring: Recall@K against exact and queries/sec")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--factors", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 16, 32, 64, 128])
+    args = parser.parse_args()
+
+    data = build_interactions(latent_interactions_df(args.rows))
+    model = AlternatingLeastSquares(n_factors=args.factors, iterations=args.iterations).fit(data.matrix, data.csc,
+                                                                                           verbose=False)
+    users = np.random.default_rng(0).choice(data.shape[0], args.users, replace=False)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(model.item_factors, n_lists=args.lists)
+    build_time = time.perf_counter() - start
+    print(f"{data.shape[0]:,} users x {data.shape[1]:,} items, {args.factors} ALS factors, top {args.k}; "
+          f"{index.n_lists} lists built in {build_time:.1f}s")
+
+    # one pass to fault the factors in before anything is timed
+    per_query(lambda u: recommend(u, model.user_factors, model.item_factors, data.matrix, args.k), users[:10])
+    exact, exact_qps = per_query(
+        lambda u: recommend(u, model.user_factors, model.item_factors, data.matrix, args.k), users)
+    print(f"  {'exact':<18}{'':>16}  {exact_qps:9,.0f} queries/sec")
+    for n_probe in args.probes:
+        found, qps = per_query(lambda u: index.recommend(u, model.user_factors, data.matrix, args.k, n_probe), users)
+        print(f"  {f'n_probe={n_probe}':<18}Recall@{args.k} {recall(found, exact):.3f}  {qps:9,.0f} queries/sec  "
+              f"({scanned(index, model.user_factors[users], n_probe):.2%} of items scored)")
+
+
+if __name__ == "__main__":
+    main()
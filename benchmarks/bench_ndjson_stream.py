@@ -0,0 +1,48 @@
+import argparse
+import gzip
+import time
+
+from benchmarks.fixtures import gzip_reader, make_review_gzip
+from ndjson_stream import iter_lines, parse_line
+
+
+def legacy_lines(decompressor):
+    buffer = ""
+    for chunk in iter(lambda: decompressor.read(8192), b''):
+        buffer += chunk.decode('utf-8', errors='ignore')
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            yield line
+
+
+def streaming_lines(decompressor):
+    return iter_lines(decompressor)
+
+
+def run(name, line_reader, compressed, raw_size, parse):
+    start = time.perf_counter()
+    n_lines = 0
+    with gzip.GzipFile(fileobj=gzip_reader(compressed)) as decompressor:
+        for line in line_reader(decompressor):
+            if parse:
+                parse_line(line)
+            n_lines += 1
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {elapsed:8.3f}s  {raw_size / elapsed / 1e6:8.1f} MB/s  {n_lines / elapsed:12,.0f} lines/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--parse", action="store_true")
+    args = parser.parse_args()
+
+    raw, compressed = make_review_gzip(args.lines)
+    print(f"Fixture: {args.lines} lines, {len(raw) / 1e6:.1f} MB raw, {len(compressed) / 1e6:.1f} MB gzip")
+
+    run("legacy", legacy_lines, compressed, len(raw), args.parse)
+    run("streaming", streaming_lines, compressed, len(raw), args.parse)
+
+
+if __name__ == "__main__":
+    main()
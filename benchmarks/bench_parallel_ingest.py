@@ -0,0 +1,47 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fixtures import serve_directory, write_review_gzip
+from load_review import read_category_files
+
+
+def run(file_urls, workers):
+    start = time.perf_counter()
+    results = {}
+    for filename, rows, progress, done in read_category_files(file_urls, {}, workers):
+        results.setdefault(filename, []).extend(r["user_id"] for r in rows)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        raw_bytes = 0
+        for i in range(args.files):
+            raw_bytes += write_review_gzip(os.path.join(directory, f"Category_{i}.jsonl.gz"), args.lines, seed=i)
+
+        with serve_directory(directory) as base_url:
+            file_urls = [f"{base_url}Category_{i}.jsonl.gz" for i in range(args.files)]
+
+            baseline, expected = run(file_urls, 1)
+            worker_counts = sorted({1, 2, 4, args.max_workers} - {0})
+            timings = {1: baseline}
+            for workers in worker_counts[1:]:
+                elapsed, results = run(file_urls, workers)
+                assert results == expected, "parallel results differ from the sequential run"
+                timings[workers] = elapsed
+
+    print(f"\n{args.files} files x {args.lines} lines, {raw_bytes / 1e6:.1f} MB raw, {os.cpu_count()} cores")
+    for workers, elapsed in timings.items():
+        print(f"workers={workers:<3} {elapsed:8.2f}s  {raw_bytes / elapsed / 1e6:8.1f} MB/s  speedup {baseline / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
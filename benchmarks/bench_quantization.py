@@ -0,0 +1,60 @@
+import argparse
+import time
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+from benchmarks.fixtures import latent_interactions_df
+from interactions import build_interactions
+from quantization import QuantizedFactors
+from retrieval import recommend, recommend_batch
+
+
+def overlap(found, exact):
+    # mean fraction of the float64 top-K each representation also returns
+    return np.mean([len(np.intersect1d(a, b)) / max(len(b), 1) for a, b in zip(found, exact)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized item factors: top-K overlap with float64, memory, latency")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--factors", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--k", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+
+    data = build_interactions(latent_interactions_df(args.rows))
+    svd = TruncatedSVD(n_components=args.factors, random_state=42)
+    # float64 factors, as the notebook's MatrixFactorizationRecommender(method='svd') holds them
+    user_factors = svd.fit_transform(data.matrix.astype(np.float64))
+    item_factors = svd.components_.T
+    users = np.random.default_rng(0).choice(data.shape[0], args.users, replace=False)
+    k = max(args.k)
+    print(f"{data.shape[0]:,} users x {data.shape[1]:,} items, {args.factors} SVD factors, {len(users):,} users")
+
+    representations = [
+        ("float64", item_factors),
+        ("float32", np.asfortranarray(item_factors, dtype=np.float32)),
+        ("float16", QuantizedFactors.quantize(item_factors, "float16")),
+        ("int8", QuantizedFactors.quantize(item_factors, "int8")),
+    ]
+    exact = None
+    for label, factors in representations:
+        recommend(users[0], user_factors, factors, data.matrix, k)
+        start = time.perf_counter()
+        found = [recommend(user, user_factors, factors, data.matrix, k)[0] for user in users]
+        latency = (time.perf_counter() - start) * 1000 / len(users)
+        start = time.perf_counter()
+        for block in range(0, len(users), args.batch):
+            recommend_batch(users[block:block + args.batch], user_factors, factors, data.matrix, k)
+        batched = (time.perf_counter() - start) * 1000 / len(users)
+        exact = exact if exact is not None else found
+        overlaps = "  ".join(f"top-{kk} overlap {overlap([f[:kk] for f in found], [e[:kk] for e in exact]):.3f}"
+                             for kk in sorted(args.k))
+        print(f"  {label:<8}{factors.nbytes / 1024 ** 2:8.1f} MB  recommend {latency:6.2f} ms/user  "
+              f"recommend_batch {batched:6.2f} ms/user  {overlaps}")
+
+
+if __name__ == "__main__":
+    main()
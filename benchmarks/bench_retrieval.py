@@ -0,0 +1,75 @@
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import latent_interactions_df
+from interactions import build_interactions
+from retrieval import recommend, recommend_batch
+
+
+def loop_recommend(user_idx, user_factors, item_factors, interaction_matrix, idx_to_item, n_recommendations=10):
+    # the notebook's original get_user_recommendations body
+    predicted_ratings = user_factors[user_idx] @ item_factors.T
+    rated_items = set(interaction_matrix[user_idx].nonzero()[1])
+    item_scores = []
+    for item_idx in range(len(predicted_ratings)):
+        if item_idx not in rated_items:
+            item_scores.append((idx_to_item[item_idx], predicted_ratings[item_idx]))
+    item_scores.sort(key=lambda x: x[1], reverse=True)
+    return item_scores[:n_recommendations]
+
+
+def latencies(func, users):
+    times = []
+    for user in users:
+        start = time.perf_counter()
+        func(user)
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user top-K latency: Python loop vs argpartition retrieval")
+    parser.add_argument("--rows", type=int, default=1500000)
+    parser.add_argument("--factors", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--loop-users", type=int, default=5)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+
+    data = build_interactions(latent_interactions_df(args.rows))
+    n_users, n_items = data.shape
+    rng = np.random.default_rng(0)
+    users = rng.choice(n_users, args.users, replace=False)
+    print(f"{n_users:,} users x {n_items:,} items, {args.factors} factors, top {args.k}")
+
+    # item_factors as TruncatedSVD (float64) and ALS (float32) return them: factor-major, i.e. Fortran order
+    svd_items = rng.standard_normal((args.factors, n_items)).T
+    layouts = [
+        ("float64 SVD", rng.standard_normal((n_users, args.factors)), svd_items),
+        ("float32 ALS", rng.standard_normal((n_users, args.factors)).astype(np.float32),
+         np.asfortranarray(svd_items, dtype=np.float32)),
+    ]
+    idx_to_item = dict(enumerate(data.item_index.decode(np.arange(n_items))))
+
+    for label, user_factors, item_factors in layouts:
+        old = latencies(lambda u: loop_recommend(u, user_factors, item_factors, data.matrix, idx_to_item, args.k),
+                        users[:args.loop_users])
+        new = latencies(lambda u: data.item_index.decode(
+            recommend(u, user_factors, item_factors, data.matrix, args.k)[0]), users)
+        start = time.perf_counter()
+        for block in range(0, len(users), args.batch):
+            codes, _ = recommend_batch(users[block:block + args.batch], user_factors, item_factors, data.matrix, args.k)
+            data.item_index.decode(codes.ravel())
+        batched = (time.perf_counter() - start) * 1000 / len(users)
+        print(f"\n{label}")
+        print(f"  Python loop        mean {old.mean():9.1f} ms/user  ({len(old)} users)")
+        print(f"  recommend          mean {new.mean():9.2f} ms/user  p50 {np.median(new):.2f}  "
+              f"p99 {np.percentile(new, 99):.2f}  ({len(new)} users)")
+        print(f"  recommend_batch    mean {batched:9.2f} ms/user  ({args.batch} users per block)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import gzip
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import psycopg2
+
+import db
+import load_review
+from benchmarks.fixtures import write_review_gzip
+from load_review import (CHECKPOINT_ROWS, ReviewSampler, create_ingest_tables, load_selected_rows, new_progress,
+                         stage_category_batch)
+from ndjson_stream import iter_lines, parse_line
+from user_registry import UserRegistry
+
+BENCH_DB = "bench_sampler_memory"
+ADMIN_DB = db.DB_NAME or "postgres"
+FILENAME = "reviews.jsonl"
+# users in the fixture; every fourth one is a returning user, whose reviews are selected first
+N_USERS = 50000
+
+
+def iter_reviews(path, max_rows):
+    with gzip.open(path, "rb") as f:
+        for rows_read, line in enumerate(iter_lines(f)):
+            if rows_read >= max_rows:
+                break
+            review = parse_line(line)
+            yield {
+                "user_id": review.get("user_id"),
+                "parent_asin": review.get("parent_asin"),
+                "asin": review.get("asin"),
+                "rating": review.get("rating"),
+                "title": review.get("title"),
+                "text": review.get("text"),
+                "images": review.get("images"),
+                "timestamp": review.get("timestamp"),
+                "verified_purchase": review.get("verified_purchase"),
+                "helpful_votes": review.get("helpful_vote", 0),
+                "filename": FILENAME,
+            }
+
+
+def returning_users():
+    return UserRegistry((f"U{i:027d}", i // 4) for i in range(0, N_USERS, 4))
+
+
+def admin_execute(*statements):
+    connection = psycopg2.connect(**{**db.connection_params(), "dbname": ADMIN_DB})
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    finally:
+        connection.close()
+
+
+def select_lists(path, max_rows, max_reviews):
+    # the selection before ReviewSampler: every row of the file held in memory, then trimmed
+    user_registry = returning_users()
+    priority_data = []
+    other_data = []
+    for review_data in iter_reviews(path, max_rows):
+        if review_data["user_id"] in user_registry:
+            priority_data.append(review_data)
+        else:
+            other_data.append(review_data)
+
+    final_data = priority_data.copy()
+    remaining_slots = max_reviews - len(final_data)
+    if remaining_slots > 0:
+        final_data.extend(other_data[:remaining_slots])
+    return final_data
+
+
+def select_staged(path, max_rows, max_reviews):
+    # the ingestion path parse_review_files runs: batches staged through ReviewSampler, then the selection read back
+    db.DB_NAME = BENCH_DB
+    load_review.MAX_REVIEWS = max_reviews
+    user_registry = returning_users()
+    sampler = ReviewSampler(max_reviews)
+    progress = new_progress()
+    with db.connection() as connection, connection.cursor() as cursor:
+        create_ingest_tables(connection, cursor)
+        batch = []
+        for review_data in iter_reviews(path, max_rows):
+            batch.append(review_data)
+            if len(batch) >= CHECKPOINT_ROWS:
+                progress["rows_read"] += len(batch)
+                stage_category_batch(FILENAME, batch, progress, sampler, user_registry, connection, cursor)
+                batch = []
+        progress["rows_read"] += len(batch)
+        progress["read_complete"] = True
+        stage_category_batch(FILENAME, batch, progress, sampler, user_registry, connection, cursor)
+        selected, _ = load_selected_rows(FILENAME, progress, cursor)
+    db.close_pool()
+    return selected
+
+
+def peak_rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(mode, path, max_rows, max_reviews):
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    selector = select_lists if mode == "lists" else select_staged
+    selected = selector(path, max_rows, max_reviews)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+    print(f"{mode:<8} selected={len(selected):<7} time={elapsed:6.2f}s  "
+          f"peak RSS={peak / 1024:8.1f} MB  (+{(peak - baseline) / 1024:.1f} MB over baseline)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=300000)
+    parser.add_argument("--max-reviews", type=int, default=50000)
+    parser.add_argument("--mode", choices=["lists", "staged"])
+    parser.add_argument("--fixture")
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args.fixture, args.lines, args.max_reviews)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = os.path.join(directory, "reviews.jsonl.gz")
+        write_review_gzip(fixture, args.lines, n_users=N_USERS)
+        admin_execute(f"DROP DATABASE IF EXISTS {BENCH_DB}", f"CREATE DATABASE {BENCH_DB}")
+        print("peak RSS is the Python process only; staged rows are held by PostgreSQL")
+        try:
+            for mode in ("lists", "staged"):
+                subprocess.run([sys.executable, "-m", "benchmarks.bench_sampler_memory", "--mode", mode,
+                                "--fixture", fixture, "--lines", str(args.lines),
+                                "--max-reviews", str(args.max_reviews)], check=True)
+        finally:
+            admin_execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+
+
+if __name__ == "__main__":
+    main()
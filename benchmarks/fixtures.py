@@ -0,0 +1,178 @@
+import gzip
+import io
+import json
+import os
+import random
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+START_TS = 1577836800000
+
+
+def synthetic_review(rng, n_users, n_items):
+    return {
+        "rating": float(rng.randint(1, 5)),
+        "title": "Synthetic review title",
+        "text": "Lorem ipsum dolor sit amet " * rng.randint(1, 20),
+        "images": [],
+        "asin": f"B{rng.randrange(n_items):09d}",
+        "parent_asin": f"B{rng.randrange(n_items):09d}",
+        "user_id": f"U{rng.randrange(n_users):027d}",
+        "timestamp": START_TS + rng.randrange(10 ** 11),
+        "helpful_vote": rng.randint(0, 5),
+        "verified_purchase": rng.random() < 0.9,
+    }
+
+
+def review_lines(n_lines, n_users=50000, n_items=100000, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n_lines):
+        yield json.dumps(synthetic_review(rng, n_users, n_items)).encode("utf-8") + b"\n"
+
+
+def make_review_gzip(n_lines, seed=0, **kwargs):
+    raw = b"".join(review_lines(n_lines, seed=seed, **kwargs))
+    return raw, gzip.compress(raw, compresslevel=6)
+
+
+def write_review_gzip(path, n_lines, seed=0, **kwargs):
+    raw, compressed = make_review_gzip(n_lines, seed=seed, **kwargs)
+    with open(path, "wb") as f:
+        f.write(compressed)
+    return len(raw)
+
+
+def synthetic_amazon_df(n_rows, n_users=250000, n_items=120000, n_files=33, missing_category=0.05, seed=0):
+    # shaped like the cleaned amazon_df: each item belongs to one category file, most items carry the
+    # file's main_category, some a neighbouring one, and a few are empty or missing
+    rng = np.random.default_rng(seed)
+    files = np.array([f"Category_{i:02d}.jsonl" for i in range(n_files)], dtype=object)
+    categories = np.array([f"Category {i:02d}" for i in range(n_files)], dtype=object)
+
+    item_file = rng.integers(0, n_files, n_items)
+    item_category = np.where(rng.random(n_items) < 0.9, item_file, (item_file + 1) % n_files)
+    item_main_category = categories[item_category]
+    damaged = rng.random(n_items)
+    item_main_category[damaged < missing_category] = ""
+    item_main_category[damaged < missing_category / 5] = None
+
+    users = rng.integers(0, n_users, n_rows)
+    items = rng.integers(0, n_items, n_rows)
+    item_ids = pd.Series(np.arange(n_items)).map("B{:09d}".format).to_numpy(dtype=object)
+    user_ids = pd.Series(np.arange(n_users)).map("U{:027d}".format).to_numpy(dtype=object)
+    return pd.DataFrame({
+        "user_id": user_ids[users],
+        "parent_asin": item_ids[items],
+        "asin": item_ids[items],
+        "filename": files[item_file[items]],
+        "main_category": item_main_category[items],
+        "rating": rng.integers(1, 6, n_rows).astype(float),
+        "review_timestamp": START_TS + rng.integers(0, 10 ** 11, n_rows),
+        "verified_purchase": rng.random(n_rows) < 0.9,
+        "helpful_vote": rng.integers(0, 6, n_rows),
+        "average_rating": np.round(rng.uniform(1, 5, n_items), 1)[items],
+        "price": np.round(rng.uniform(1, 200, n_items), 2)[items],
+        "store": np.array([f"Store {i % 5000}" for i in range(n_items)], dtype=object)[items],
+    })
+
+
+def latent_interactions_df(n_rows, n_users=192000, n_items=914000, n_groups=500, in_group=0.8, seed=0):
+    # interactions with structure a recommender can learn: every user has a taste group and mostly reviews
+    # (and rates highly) that group's items, with popularity skewed towards a few items per group
+    rng = np.random.default_rng(seed)
+    user_group = rng.integers(0, n_groups, n_users)
+    item_group = rng.integers(0, n_groups, n_items)
+    item_order = np.argsort(item_group, kind="stable")
+    group_sizes = np.bincount(item_group, minlength=n_groups)
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+    popularity = rng.permutation(n_items)
+
+    users = rng.integers(0, n_users, n_rows)
+    groups = user_group[users]
+    skew = rng.random(n_rows) ** 3
+    grouped = item_order[group_starts[groups] + (skew * group_sizes[groups]).astype(np.int64)]
+    liked = rng.random(n_rows) < in_group
+    items = np.where(liked, grouped, popularity[(rng.random(n_rows) ** 3 * n_items).astype(np.int64)])
+    ratings = np.where(liked, rng.integers(4, 6, n_rows), rng.integers(1, 6, n_rows)).astype(float)
+
+    item_ids = pd.Series(np.arange(n_items)).map("B{:09d}".format).to_numpy(dtype=object)
+    user_ids = pd.Series(np.arange(n_users)).map("U{:027d}".format).to_numpy(dtype=object)
+    return pd.DataFrame({
+        "user_id": user_ids[users],
+        "parent_asin": item_ids[items],
+        "rating": ratings,
+        "review_timestamp": START_TS + rng.integers(0, 10 ** 11, n_rows),
+    })
+
+
+def gzip_reader(compressed):
+    return io.BytesIO(compressed)
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, log=None, **kwargs):
+        self.log = log
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def log_request(self, code="-", size="-"):
+        if self.log is not None:
+            self.log.append((self.path, int(code), self.headers.get("Range"), self.headers.get("If-Range")))
+
+
+class _RangeHandler(_QuietHandler):
+    # SimpleHTTPRequestHandler has neither ETags nor ranges; this adds both for open-ended "bytes=N-" requests,
+    # honouring If-None-Match and If-Range against the ETag or Last-Modified
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        stat = os.stat(path)
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        last_modified = self.date_time_string(int(stat.st_mtime))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        requested = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range") or "")
+        if requested and self.headers.get("If-Range") in (None, etag, last_modified):
+            start = min(int(requested[1]), stat.st_size)
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(stat.st_size - start))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{stat.st_size - 1}/{stat.st_size}")
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            shutil.copyfileobj(f, self.wfile)
+
+
+@contextmanager
+def serve_directory(directory, ranges=False, log=None):
+    # yields the base URL of directory served on a free local port; ranges=True adds ETags and Range support,
+    # and log collects (path, status, Range, If-Range) for every request answered
+    handler = partial(_RangeHandler if ranges else _QuietHandler, directory=directory, log=log)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,67 @@
+import json
+
+COPY_BUFFER_SIZE = 1 << 16
+
+
+def strip_nul(value):
+    if isinstance(value, str):
+        return value.replace("\x00", "")
+    if isinstance(value, list):
+        return [strip_nul(item) for item in value]
+    if isinstance(value, dict):
+        return {strip_nul(key): strip_nul(item) for key, item in value.items()}
+    return value
+
+
+def json_text(value):
+    # jsonb rejects the \u0000 escape json.dumps writes for NUL, which the raw dataset occasionally contains, so
+    # NULs are dropped from the strings before encoding rather than from the encoded text
+    return json.dumps(strip_nul(value))
+
+
+def encode_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return "" if value != value else repr(value)
+    if isinstance(value, (dict, list)):
+        value = json_text(value)
+    value = str(value).replace("\x00", "")
+    return '"' + value.replace('"', '""') + '"'
+
+
+def encode_row(values):
+    return ",".join([encode_value(value) for value in values]) + "\n"
+
+
+class RowReader:
+    def __init__(self, rows):
+        self._lines = (encode_row(row) for row in rows)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            parts.append(line)
+            length += len(line)
+
+        data = "".join(parts)
+        if size < 0 or length <= size:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(cursor, table, columns, rows, size=COPY_BUFFER_SIZE):
+    query = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor.copy_expert(query, RowReader(rows), size=size)
+    return cursor.rowcount
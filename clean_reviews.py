@@ -0,0 +1,193 @@
+import argparse
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import db
+import db_reader
+from amazon_dataset import (DATASET_DIR, DATASET_PATH, PARTITION_ROW_GROUP_ROWS, PartitionedWriter, compact_schema,
+                            compact_table)
+from load_review import create_review_data_table
+
+CLEANED_DATASET_PATH = DATASET_PATH
+CLEANED_DATASET_DIR = DATASET_DIR
+ROW_GROUP_ROWS = 100000
+
+CLEAN_QUERY = """
+    WITH latest_reviews AS (
+        SELECT DISTINCT ON (user_id, parent_asin) *
+        FROM review_data
+        ORDER BY user_id, parent_asin, review_timestamp DESC NULLS LAST
+    ),
+    joined AS (
+        SELECT
+            r.rating, r.title AS title_review, r.review_text, r.images AS images_review,
+            r.asin, r.parent_asin, r.user_id, r.review_timestamp, r.verified_purchase,
+            r.helpful_vote, r.filename,
+            m.id, m.main_category, m.title AS title_meta, m.average_rating, m.rating_number,
+            m.features, m.description, m.price, m.images AS images_meta, m.videos, m.store,
+            m.categories, m.details, m.bought_together, m.created_at
+        FROM latest_reviews r
+        JOIN meta_data m ON m.parent_asin = r.parent_asin AND m.filename = r.filename
+        WHERE m.main_category IS NOT NULL
+    ),
+    category_counts AS (
+        SELECT filename, main_category, count(*) AS n
+        FROM joined
+        WHERE main_category <> ''
+        GROUP BY filename, main_category
+    ),
+    category_mode AS (
+        -- most frequent category per file, ties broken alphabetically like Series.mode()
+        SELECT DISTINCT ON (filename) filename, main_category
+        FROM category_counts
+        ORDER BY filename, n DESC, main_category
+    )
+    SELECT
+        j.rating,
+        COALESCE(j.title_review, '') AS title_review,
+        COALESCE(j.review_text, '') AS review_text,
+        j.images_review::text AS images_review,
+        j.asin,
+        j.parent_asin,
+        j.user_id,
+        j.review_timestamp,
+        j.verified_purchase,
+        j.helpful_vote,
+        j.filename,
+        j.id,
+        COALESCE(NULLIF(j.main_category, ''), c.main_category, j.main_category) AS main_category,
+        j.title_meta,
+        j.average_rating::double precision AS average_rating,
+        j.rating_number::integer AS rating_number,
+        j.features::text AS features,
+        j.description::text AS description,
+        j.price::double precision AS price,
+        j.images_meta::text AS images_meta,
+        j.videos::text AS videos,
+        j.store,
+        j.categories::text AS categories,
+        j.details::text AS details,
+        j.bought_together::text AS bought_together,
+        j.created_at,
+        to_timestamp(j.review_timestamp / 1000.0) AT TIME ZONE 'UTC' AS review_date,
+        extract(year FROM to_timestamp(j.review_timestamp / 1000.0) AT TIME ZONE 'UTC')::integer AS review_year
+    FROM joined j
+    LEFT JOIN category_mode c USING (filename)
+"""
+# grouped by partition ('' and NULL together) and sorted by user in byte order, as the Parquet statistics compare
+PARTITIONED_QUERY = f"""
+    SELECT * FROM ({CLEAN_QUERY}) AS cleaned
+    ORDER BY NULLIF(main_category, ''), user_id COLLATE "C", parent_asin COLLATE "C"
+"""
+
+
+def category_modes(df):
+    valid = df.loc[df["main_category"].notna() & (df["main_category"] != ""), ["filename", "main_category"]]
+    counts = valid.groupby(["filename", "main_category"], observed=True).size().reset_index(name="n")
+    # sort on the names, not the codes of a categorical column, whose categories need not be in order
+    counts["main_category"] = counts["main_category"].astype(str)
+    # most frequent category per file, ties broken alphabetically like Series.mode()
+    counts = counts.sort_values(["filename", "n", "main_category"], ascending=[True, False, True])
+    return counts.drop_duplicates("filename").set_index("filename")["main_category"]
+
+
+def repair_main_category(df, verbose=True):
+    # pandas counterpart of the category_mode step in CLEAN_QUERY, for frames not cleaned in PostgreSQL
+    missing = df["main_category"].isna() | (df["main_category"] == "")
+    if not missing.any():
+        return 0
+
+    modes = category_modes(df)
+    fill = df["filename"].map(modes)
+    repair = missing & fill.notna()
+    df.loc[repair, "main_category"] = fill[repair]
+
+    if verbose:
+        damaged_files = df.loc[missing, "filename"].unique()
+        for filename in damaged_files:
+            if filename in modes.index:
+                print(f"Fixed {filename}: {modes[filename]}")
+            else:
+                print(f"Warning: No valid main_category found for {filename}")
+    return int(repair.sum())
+
+
+def export_clean_dataset(dataset_dir=CLEANED_DATASET_DIR, row_group_rows=PARTITION_ROW_GROUP_ROWS):
+    writer = PartitionedWriter(dataset_dir, row_group_rows)
+    try:
+        for batch in db_reader.iter_copy_batches(PARTITIONED_QUERY):
+            if batch.num_rows:
+                writer.write(pa.Table.from_batches([batch]))
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def export_clean_file(path=CLEANED_DATASET_PATH, row_group_rows=ROW_GROUP_ROWS):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    written = 0
+    writer = None
+    pending = []
+    pending_rows = 0
+    try:
+        for batch in db_reader.iter_copy_batches(CLEAN_QUERY):
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, compact_schema(batch.schema))
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= row_group_rows:
+                writer.write_table(compact_table(pa.Table.from_batches(pending)), row_group_size=pending_rows)
+                written += pending_rows
+                pending, pending_rows = [], 0
+        if writer is None:
+            raise RuntimeError("cleaning query returned no schema")
+        if pending_rows:
+            writer.write_table(compact_table(pa.Table.from_batches(pending)), row_group_size=pending_rows)
+            written += pending_rows
+        writer.close()
+        writer = None
+        os.replace(tmp_path, path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Join, de-duplicate and clean reviews in PostgreSQL into Parquet")
+    parser.add_argument("--output", help=f"dataset directory to write (default {CLEANED_DATASET_DIR}), "
+                                         f"or the Parquet file with --single-file (default {CLEANED_DATASET_PATH})")
+    parser.add_argument("--single-file", action="store_true",
+                        help="write one unpartitioned Parquet file instead of the main_category partitions")
+    parser.add_argument("--row-group-rows", type=int,
+                        help=f"rows per Parquet row group (default {PARTITION_ROW_GROUP_ROWS}, "
+                             f"{ROW_GROUP_ROWS} with --single-file)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start_time = time.perf_counter()
+    try:
+        # CLEAN_QUERY relies on the typed review_data columns; a database loaded before they existed is migrated
+        with db.connection() as connection, connection.cursor() as cursor:
+            create_review_data_table(connection, cursor)
+        if args.single_file:
+            output = args.output or CLEANED_DATASET_PATH
+            written = export_clean_file(output, args.row_group_rows or ROW_GROUP_ROWS)
+        else:
+            output = args.output or CLEANED_DATASET_DIR
+            written = export_clean_dataset(output, args.row_group_rows or PARTITION_ROW_GROUP_ROWS)
+        print(f"Wrote {written} cleaned rows to {output} in {time.perf_counter() - start_time:.1f}s")
+    finally:
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import extensions, pool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_NAME = os.getenv("DBNAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+
+# psycopg2 closes connections handed back above minconn, so the pool is kept full
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+RETRIES = int(os.getenv("DB_RETRIES", 5))
+RETRY_BACKOFF = 0.5
+RETRY_MAX_DELAY = 30.0
+
+TRANSIENT_ERRORS = (
+    psycopg2.OperationalError,
+    psycopg2.InterfaceError,
+    psycopg2.errors.SerializationFailure,
+    psycopg2.errors.DeadlockDetected,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+_held = threading.local()
+
+
+def is_transient(error):
+    # a statement timeout is an OperationalError too, but running it again would just time out again
+    return isinstance(error, TRANSIENT_ERRORS) and not isinstance(error, psycopg2.errors.QueryCanceled)
+
+
+def retry(func, *args, retries=RETRIES, backoff=None, **kwargs):
+    backoff = RETRY_BACKOFF if backoff is None else backoff
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            delay = min(backoff * 2 ** attempt, RETRY_MAX_DELAY) * (1 + random.random())
+            print(f"Database call failed ({str(e).strip().splitlines()[0]}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def connection_params(statement_timeout=STATEMENT_TIMEOUT_MS):
+    return {
+        "dbname": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "options": f"-c statement_timeout={statement_timeout}",
+    }
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = pool.ThreadedConnectionPool(POOL_SIZE, POOL_SIZE, **connection_params())
+            print("Connected to PostgreSQL")
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+def _checkout():
+    connection_pool = get_pool()
+    connection = connection_pool.getconn()
+    if connection.closed:
+        connection_pool.putconn(connection, close=True)
+        connection = connection_pool.getconn()
+    return connection
+
+
+@contextmanager
+def connection():
+    """A pooled connection, rolled back if it is left mid-transaction and handed back to the pool afterwards.
+
+    At most POOL_SIZE connections are out at once; further callers wait for a free one. A thread must not open a
+    second connection while it holds one: once every thread held a slot and waited for another, none would ever be
+    freed. Nesting raises instead of risking that deadlock, so pass the open connection down to helpers.
+    """
+    if getattr(_held, "connection", None) is not None:
+        raise RuntimeError("db.connection() is already open in this thread; pass that connection down instead")
+    with _pool_slots:
+        conn = retry(_checkout)
+        _held.connection = conn
+        try:
+            yield conn
+        finally:
+            _held.connection = None
+            if not conn.closed and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            get_pool().putconn(conn, close=bool(conn.closed))
+
+
+@contextmanager
+def transaction(conn, stage, statement_timeout=None):
+    try:
+        if statement_timeout is not None:
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", (statement_timeout,))
+        yield conn
+        conn.commit()
+    except BaseException as e:
+        # any failure inside the block rolls back, not only database errors; a closed generator is not an error
+        if not isinstance(e, GeneratorExit):
+            print(f"Error {stage}: {e}")
+        if not conn.closed:
+            conn.rollback()
+        raise
+
+
+def run_transaction(stage, func, *args, statement_timeout=None, retries=RETRIES):
+    def attempt():
+        with connection() as conn, transaction(conn, stage, statement_timeout):
+            with conn.cursor() as cursor:
+                return func(cursor, *args)
+
+    return retry(attempt, retries=retries)
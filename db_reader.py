@@ -0,0 +1,153 @@
+import itertools
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import psycopg2.extras
+from psycopg2 import sql
+
+import db
+
+BATCH_ROWS = 50000
+COPY_BLOCK_SIZE = 16 * 1024 ** 2
+
+# PostgreSQL type OIDs -> Arrow types; json/jsonb are passed through as text
+ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    25: pa.string(),
+    114: pa.string(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1043: pa.string(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+    1700: pa.float64(),
+    3802: pa.string(),
+}
+NUMERIC_OID = 1700
+
+_cursor_ids = itertools.count()
+
+
+def arrow_schema(description):
+    return pa.schema([(column.name, ARROW_TYPES.get(column.type_code, pa.string())) for column in description])
+
+
+def column_converter(type_code):
+    if type_code == NUMERIC_OID:
+        return lambda value: float(value) if value is not None else None
+    if type_code not in ARROW_TYPES:
+        return lambda value: str(value) if value is not None else None
+    return None
+
+
+def record_batch(rows, schema, converters):
+    arrays = []
+    for i, (field, convert) in enumerate(zip(schema, converters)):
+        values = [row[i] for row in rows]
+        if convert is not None:
+            values = [convert(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.record_batch(arrays, schema=schema)
+
+
+def iter_record_batches(query, params=None, batch_rows=BATCH_ROWS):
+    with db.connection() as connection:
+        with connection.cursor(name=f"db_reader_{next(_cursor_ids)}") as cursor:
+            psycopg2.extras.register_default_jsonb(cursor, loads=lambda value: value)
+            psycopg2.extras.register_default_json(cursor, loads=lambda value: value)
+            cursor.itersize = batch_rows
+            cursor.execute(query, params)
+
+            rows = cursor.fetchmany(batch_rows)
+            schema = arrow_schema(cursor.description)
+            converters = [column_converter(column.type_code) for column in cursor.description]
+            if not rows:
+                yield pa.RecordBatch.from_pylist([], schema=schema)
+            while rows:
+                yield record_batch(rows, schema, converters)
+                rows = cursor.fetchmany(batch_rows)
+
+
+def _copy_to_pipe(cursor, copy_query, write_fd, errors):
+    try:
+        with open(write_fd, "wb") as pipe:
+            cursor.copy_expert(copy_query, pipe)
+    except Exception as e:
+        errors.append(e)
+
+
+def iter_copy_batches(query, params=None, block_size=COPY_BLOCK_SIZE):
+    with db.connection() as connection:
+        with connection.cursor() as cursor:
+            select = cursor.mogrify(query, params).decode("utf-8")
+            cursor.execute(f"SELECT * FROM ({select}) AS copy_source LIMIT 0")
+            schema = arrow_schema(cursor.description)
+
+            read_fd, write_fd = os.pipe()
+            errors = []
+            writer = threading.Thread(
+                target=_copy_to_pipe,
+                args=(cursor, f"COPY ({select}) TO STDOUT WITH (FORMAT csv)", write_fd, errors),
+                daemon=True
+            )
+            writer.start()
+            try:
+                with open(read_fd, "rb") as pipe:
+                    try:
+                        reader = pa_csv.open_csv(
+                            pipe,
+                            read_options=pa_csv.ReadOptions(column_names=schema.names, block_size=block_size),
+                            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                            convert_options=pa_csv.ConvertOptions(
+                                column_types=schema,
+                                true_values=["t"],
+                                false_values=["f"],
+                                strings_can_be_null=True,
+                                quoted_strings_can_be_null=False,
+                            ),
+                        )
+                    except pa.ArrowInvalid:
+                        # an empty result (or a failed COPY) leaves nothing for the reader to open
+                        reader = None
+                    if reader is not None:
+                        yield from reader
+                    elif not errors:
+                        writer.join()
+                        if not errors:
+                            yield pa.RecordBatch.from_pylist([], schema=schema)
+            except pa.ArrowInvalid:
+                if not errors:
+                    raise
+            finally:
+                # closing the read end first makes an abandoned COPY fail fast instead of blocking on the pipe
+                writer.join()
+            if errors:
+                raise errors[0]
+
+
+def select_query(table, columns=None, where=None):
+    projection = sql.SQL(", ").join(map(sql.Identifier, columns)) if columns else sql.SQL("*")
+    query = sql.SQL("SELECT {} FROM {}").format(projection, sql.Identifier(table))
+    if where:
+        query = sql.SQL("{} WHERE {}").format(query, sql.SQL(where))
+    return query
+
+
+def iter_table_batches(table, columns=None, where=None, params=None, batch_rows=BATCH_ROWS):
+    return iter_record_batches(select_query(table, columns, where), params, batch_rows)
+
+
+def iter_table_frames(table, columns=None, where=None, params=None, batch_rows=BATCH_ROWS):
+    for batch in iter_table_batches(table, columns, where, params, batch_rows):
+        yield batch.to_pandas()
+
+
+def read_table(table, columns=None, where=None, params=None, batch_rows=BATCH_ROWS):
+    batches = list(iter_table_batches(table, columns, where, params, batch_rows))
+    return pa.Table.from_batches(batches).to_pandas()
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 200 * 1024 ** 3))
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", 7 * 24 * 3600))
+CACHE_FLUSH_BYTES = 64 * 1024 ** 2
+READ_SIZE = 1 << 20
+
+
+class DownloadCache:
+    def __init__(self, cache_dir, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock_path = os.path.join(cache_dir, "index.lock")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.network_requests = 0
+
+    @contextmanager
+    def _locked_index(self):
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.index_path) as f:
+                        index = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    index = {}
+                yield index
+
+                tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f, indent=1)
+                os.replace(tmp_path, self.index_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _blob_path(self, entry):
+        suffix = "" if entry["complete"] else ".part"
+        return os.path.join(self.blob_dir, entry["key"] + suffix)
+
+    def _get(self, url, headers=None):
+        self.network_requests += 1
+        headers = {"Accept-Encoding": "identity", **(headers or {})}
+        response = requests.get(url, stream=True, headers=headers)
+        response.raise_for_status()
+        return response
+
+    def _new_entry(self, url, response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        key = hashlib.sha256(f"{url}\n{etag}\n{last_modified}".encode("utf-8")).hexdigest()
+        now = time.time()
+        return {
+            "key": key,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": 0,
+            "complete": False,
+            "validated_at": now,
+            "last_used": now,
+        }
+
+    def _remove_files(self, entry):
+        for complete in (True, False):
+            path = self._blob_path(entry | {"complete": complete})
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _validate(self, url):
+        with self._locked_index() as index:
+            entry = index.get(url)
+            if entry is not None and not os.path.exists(self._blob_path(entry)) and entry["size"]:
+                del index[url]
+                entry = None
+            if entry is not None:
+                entry["last_used"] = time.time()
+
+        if entry is not None and time.time() - entry["validated_at"] < self.max_age:
+            return entry, None
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self._get(url, headers)
+        if entry is not None and response.status_code == 304:
+            response.close()
+            with self._locked_index() as index:
+                if url in index:
+                    index[url]["validated_at"] = time.time()
+            return entry, None
+
+        if entry is not None:
+            print(f"Cached copy of {url} is out of date, downloading again")
+            self._remove_files(entry)
+        entry = self._new_entry(url, response)
+        with self._locked_index() as index:
+            index[url] = entry
+        return entry, response
+
+    def open(self, url, offset=0):
+        entry, response = self._validate(url)
+
+        part_path = self._blob_path(entry)
+        if not entry["complete"]:
+            with open(part_path, "ab") as f:
+                f.truncate(entry["size"])
+
+        return CachedReader(self, url, entry, offset, response)
+
+    def read_bytes(self, url):
+        with self.open(url) as reader:
+            return reader.read()
+
+    def discard(self, url):
+        with self._locked_index() as index:
+            entry = index.pop(url, None)
+            if entry is not None:
+                self._remove_files(entry)
+
+    def _commit(self, url, entry):
+        with self._locked_index() as index:
+            current = index.get(url)
+            if current is None or current["key"] != entry["key"]:
+                return
+            if entry["complete"] and not current["complete"]:
+                os.replace(self._blob_path(current), self._blob_path(entry))
+            index[url] = entry
+            self._evict(index, keep=url)
+
+    def _evict(self, index, keep):
+        total = sum(entry["size"] for entry in index.values())
+        for url in sorted(index, key=lambda u: index[u]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            entry = index.pop(url)
+            self._remove_files(entry)
+            total -= entry["size"]
+            print(f"Evicted {url} from download cache ({entry['size'] / 1024 ** 2:.1f} MB)")
+
+
+class CachedReader:
+    def __init__(self, cache, url, entry, offset, response=None):
+        self.cache = cache
+        self.url = url
+        self.entry = dict(entry)
+        self.position = offset
+        self._response = response
+        self._local = None
+        self._writer = None
+        self._unflushed = 0
+
+        if offset < self.entry["size"] or self.entry["complete"]:
+            self._local = open(self.cache._blob_path(self.entry), "rb")
+            self._local.seek(offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start_remote(self):
+        size = self.entry["size"]
+        if self._response is None:
+            headers = {}
+            if size:
+                headers["Range"] = f"bytes={size}-"
+                validator = self.entry["etag"] or self.entry["last_modified"]
+                if validator:
+                    headers["If-Range"] = validator
+            self._response = self.cache._get(self.url, headers)
+
+        if size and self._response.status_code != 206:
+            headers = self._response.headers
+            if (headers.get("ETag"), headers.get("Last-Modified")) != (self.entry["etag"], self.entry["last_modified"]):
+                self.cache.discard(self.url)
+                raise IOError(f"{self.url} changed on the server while it was partially cached")
+            self._skip_remote(size)
+        self._writer = open(self.cache._blob_path(self.entry), "ab")
+        if self.position > size:
+            self._skip_remote(self.position - size, cache_bytes=True)
+
+    def _skip_remote(self, count, cache_bytes=False):
+        while count > 0:
+            data = self._response.raw.read(min(count, READ_SIZE))
+            if not data:
+                raise EOFError(f"{self.url} ended before byte {self.position}")
+            if cache_bytes:
+                self._write(data)
+            count -= len(data)
+
+    def _write(self, data):
+        self._writer.write(data)
+        self.entry["size"] += len(data)
+        self._unflushed += len(data)
+        if self._unflushed >= CACHE_FLUSH_BYTES:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self.cache._commit(self.url, self.entry)
+            self._unflushed = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(READ_SIZE), b""))
+
+        if self._local is not None:
+            data = self._local.read(size)
+            if data or self.entry["complete"]:
+                self.position += len(data)
+                return data
+            self._local.close()
+            self._local = None
+
+        if self.entry["complete"]:
+            return b""
+        if self._writer is None:
+            self._start_remote()
+
+        data = self._response.raw.read(size)
+        if data:
+            self._write(data)
+            self.position += len(data)
+        else:
+            self.entry["complete"] = True
+        return data
+
+    def close(self):
+        if self._local is not None:
+            self._local.close()
+            self._local = None
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+        if self._writer is not None:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._writer.close()
+            self._writer = None
+        self.entry["last_used"] = time.time()
+        self.cache._commit(self.url, self.entry)
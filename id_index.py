@@ -0,0 +1,155 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+KEYS_FILE = "keys.npy"
+TABLE_FILE = "table.npy"
+META_FILE = "index.json"
+
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+
+
+def hash_keys(keys):
+    # FNV-1a over the fixed-width byte columns, vectorised across all keys at once
+    width = keys.dtype.itemsize
+    data = keys.view(np.uint8).reshape(len(keys), width)
+    hashes = np.full(len(keys), FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in range(width):
+            hashes ^= data[:, column]
+            hashes *= FNV_PRIME
+    return hashes
+
+
+def table_size(n_keys):
+    # power of two with at most 50% load, so linear probes stay short
+    return 1 << max(int(2 * n_keys - 1).bit_length(), 4)
+
+
+def build_table(keys):
+    size = table_size(len(keys))
+    mask = np.uint64(size - 1)
+    table = np.zeros(size, dtype=np.int32)
+    slots = (hash_keys(keys) & mask).astype(np.int64)
+    pending = np.arange(len(keys))
+    while len(pending):
+        candidate_slots = slots[pending]
+        free = np.flatnonzero(table[candidate_slots] == 0)
+        claimed, first = np.unique(candidate_slots[free], return_index=True)
+        winners = free[first]
+        table[claimed] = pending[winners] + 1
+        placed = np.zeros(len(pending), dtype=bool)
+        placed[winners] = True
+        pending = pending[~placed]
+        slots[pending] = (slots[pending] + 1) & (size - 1)
+    return table
+
+
+def as_bytes(ids):
+    ids = np.asarray(ids, dtype=object)
+    try:
+        return ids.astype(bytes)
+    except UnicodeEncodeError:
+        return pd.Series(ids).str.encode("utf-8").to_numpy().astype(bytes)
+
+
+class IdIndex:
+    """Sorted string ids <-> dense int32 codes, kept in numpy arrays that can be memory-mapped.
+
+    Codes are positions in the byte-wise sorted key array, so they match the sorted categorical codes
+    amazon_dataset.load_interactions produces for the same ids.
+    """
+
+    def __init__(self, keys, table):
+        self.keys = keys
+        self.table = table
+
+    @classmethod
+    def build(cls, ids):
+        if isinstance(getattr(ids, "dtype", None), pd.CategoricalDtype):
+            uniques = ids.cat.categories
+        else:
+            uniques = pd.unique(np.asarray(ids, dtype=object))
+        uniques = np.asarray(uniques, dtype=object)
+        keys = np.unique(as_bytes(uniques[pd.notna(uniques)]))
+        return cls(keys, build_table(keys))
+
+    @classmethod
+    def factorize(cls, ids):
+        """(index, codes) for ids in one hashing pass over the rows; codes are -1 for missing ids."""
+        if isinstance(getattr(ids, "dtype", None), pd.CategoricalDtype):
+            index = cls.build(ids)
+            return index, index.encode(ids)
+        positions, uniques = pd.factorize(ids if isinstance(ids, pd.Series) else np.asarray(ids, dtype=object))
+        values = as_bytes(uniques)
+        # sorting the distinct ids as bytes is cheaper than probing the table for each of them
+        order = np.argsort(values, kind="stable")
+        rank = np.empty(len(values) + 1, dtype=np.int32)
+        rank[order] = np.arange(len(values), dtype=np.int32)
+        rank[-1] = -1
+        keys = values[order]
+        return cls(keys, build_table(keys)), rank[positions]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _lookup(self, queries):
+        size = len(self.table)
+        slots = (hash_keys(queries) & np.uint64(size - 1)).astype(np.int64)
+        codes = np.full(len(queries), -1, dtype=np.int32)
+        pending = np.arange(len(queries))
+        while len(pending):
+            entries = self.table[slots[pending]].astype(np.int64) - 1
+            present = entries >= 0
+            matched = present & (self.keys[np.maximum(entries, 0)] == queries[pending])
+            codes[pending[matched]] = entries[matched]
+            pending = pending[present & ~matched]
+            slots[pending] = (slots[pending] + 1) & (size - 1)
+        return codes
+
+    def encode(self, ids):
+        """int32 codes for ids; -1 where an id is not in the index."""
+        if isinstance(getattr(ids, "dtype", None), pd.CategoricalDtype):
+            category_codes = self.encode(ids.cat.categories)
+            codes = np.asarray(ids.cat.codes)
+            return np.where(codes >= 0, category_codes[np.maximum(codes, 0)], -1).astype(np.int32)
+
+        # hash each distinct id once, then broadcast back to every row
+        positions, uniques = pd.factorize(np.asarray(ids, dtype=object), use_na_sentinel=True)
+        values = as_bytes(uniques)
+        unique_codes = np.full(len(uniques), -1, dtype=np.int32)
+        # ids longer than every key cannot be in the index, and would be truncated by the cast below
+        fits = np.char.str_len(values) <= self.keys.dtype.itemsize
+        if len(self.keys) and fits.any():
+            unique_codes[fits] = self._lookup(values[fits].astype(self.keys.dtype))
+        return np.where(positions >= 0, unique_codes[np.maximum(positions, 0)], -1).astype(np.int32)
+
+    def decode(self, codes):
+        """ids for int32 codes as an object array; None for negative codes."""
+        codes = np.asarray(codes, dtype=np.int64)
+        ids = np.empty(len(codes), dtype=object)
+        valid = codes >= 0
+        ids[valid] = np.char.decode(self.keys[codes[valid]], "utf-8")
+        ids[~valid] = None
+        return ids
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, KEYS_FILE), self.keys)
+        np.save(os.path.join(directory, TABLE_FILE), self.table)
+        with open(os.path.join(directory, META_FILE), "w") as f:
+            json.dump({"n_keys": len(self.keys), "key_width": self.keys.dtype.itemsize}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mmap_mode = "r" if mmap else None
+        keys = np.load(os.path.join(directory, KEYS_FILE), mmap_mode=mmap_mode)
+        table = np.load(os.path.join(directory, TABLE_FILE), mmap_mode=mmap_mode)
+        return cls(keys, table)
+
+    @classmethod
+    def exists(cls, directory):
+        return all(os.path.exists(os.path.join(directory, name)) for name in (KEYS_FILE, TABLE_FILE))
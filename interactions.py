@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from id_index import IdIndex
+
+CACHE_DIR = "interaction_cache"
+CACHE_VERSION = 1
+DUPLICATE_POLICIES = ("latest", "mean", "max")
+WEIGHTINGS = ("rating", "linear", "log")
+CONFIDENCE_ALPHA = 40.0
+CONFIDENCE_EPSILON = 1.0
+
+MATRIX_FILES = ("data", "indices", "indptr")
+META_FILE = "interactions.json"
+
+
+def combine_duplicates(keys, values, timestamps=None, policy="latest"):
+    """Collapse repeated (user, item) keys into one value each, sorted by key."""
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"unknown duplicate policy {policy!r}; expected one of {DUPLICATE_POLICIES}")
+    if policy == "latest" and timestamps is not None:
+        # missing timestamps count as oldest, like NULLS LAST in the cleaning query
+        timestamps = np.nan_to_num(np.asarray(timestamps, dtype=np.float64), nan=-np.inf)
+        order = np.lexsort((timestamps, keys))
+    else:
+        order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else np.empty(0, np.int64)
+    if policy == "latest":
+        ends = np.append(starts[1:], len(keys)) - 1
+        combined = values[ends]
+    elif policy == "max":
+        combined = np.maximum.reduceat(values, starts) if len(keys) else values
+    else:
+        counts = np.diff(np.append(starts, len(keys)))
+        combined = (np.add.reduceat(values.astype(np.float64), starts) / counts).astype(values.dtype) if len(keys) else values
+    return keys[starts], combined
+
+
+def confidence_weights(values, weighting="linear", alpha=CONFIDENCE_ALPHA, epsilon=CONFIDENCE_EPSILON):
+    # the C - 1 part of Hu, Koren & Volinsky's implicit confidence, so absent pairs stay implicit zeros
+    if weighting == "rating":
+        return values
+    if weighting == "linear":
+        return (alpha * values).astype(values.dtype)
+    if weighting == "log":
+        return (alpha * np.log1p(values / epsilon)).astype(values.dtype)
+    raise ValueError(f"unknown weighting {weighting!r}; expected one of {WEIGHTINGS}")
+
+
+class Interactions:
+    """User x item matrix in CSR and CSC form, with the IdIndex for each axis.
+
+    Rows are user codes and columns item codes, so user_index.decode/item_index.decode map positions
+    back to ids. save/load keep each array as its own .npy file so load can memory-map them.
+    """
+
+    def __init__(self, matrix, user_index, item_index, csc=None, meta=None):
+        self.matrix = matrix
+        self.csc = csc if csc is not None else matrix.tocsc()
+        self.user_index = user_index
+        self.item_index = item_index
+        self.meta = meta or {}
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for prefix, matrix in (("csr", self.matrix), ("csc", self.csc)):
+            for name in MATRIX_FILES:
+                np.save(os.path.join(directory, f"{prefix}_{name}.npy"), getattr(matrix, name))
+        self.user_index.save(os.path.join(directory, "users"))
+        self.item_index.save(os.path.join(directory, "items"))
+        with open(os.path.join(directory, META_FILE), "w") as f:
+            json.dump({**self.meta, "shape": list(self.shape), "nnz": int(self.matrix.nnz)}, f, indent=1)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        shape = tuple(meta["shape"])
+        arrays = {
+            prefix: [np.load(os.path.join(directory, f"{prefix}_{name}.npy"), mmap_mode=mmap_mode) for name in MATRIX_FILES]
+            for prefix in ("csr", "csc")
+        }
+        return cls(
+            sp.csr_matrix(tuple(arrays["csr"]), shape=shape, copy=False),
+            IdIndex.load(os.path.join(directory, "users"), mmap),
+            IdIndex.load(os.path.join(directory, "items"), mmap),
+            csc=sp.csc_matrix(tuple(arrays["csc"]), shape=shape, copy=False),
+            meta=meta,
+        )
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, META_FILE))
+
+
+def build_interactions(df, user_col="user_id", item_col="parent_asin", rating_col="rating", time_col="review_timestamp",
+                       duplicates="latest", weighting="rating", alpha=CONFIDENCE_ALPHA, epsilon=CONFIDENCE_EPSILON):
+    valid = df[user_col].notna() & df[item_col].notna() & df[rating_col].notna()
+    if not valid.all():
+        df = df.loc[valid]
+    user_index, users = IdIndex.factorize(df[user_col])
+    item_index, items = IdIndex.factorize(df[item_col])
+    values = df[rating_col].to_numpy(dtype=np.float32)
+    timestamps = df[time_col].to_numpy(dtype=np.float64, na_value=np.nan) if time_col in df.columns else None
+
+    keys = users.astype(np.int64) * len(item_index) + items
+    keys, values = combine_duplicates(keys, values, timestamps, duplicates)
+    values = confidence_weights(values, weighting, alpha, epsilon)
+
+    # keys are sorted by (user, item), which is already CSR order: no COO pass that would sum duplicates
+    rows, columns = np.divmod(keys, max(len(item_index), 1))
+    indptr = np.zeros(len(user_index) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(user_index)), out=indptr[1:])
+    matrix = sp.csr_matrix((values, columns.astype(np.int32), indptr), shape=(len(user_index), len(item_index)))
+    meta = {"duplicates": duplicates, "weighting": weighting, "rows": int(len(df)), "duplicates_dropped": int(len(df) - len(keys))}
+    return Interactions(matrix, user_index, item_index, meta=meta)
+
+
+def frame_digest(df, columns):
+    return hashlib.sha256(pd.util.hash_pandas_object(df[columns], index=False).to_numpy().tobytes()).hexdigest()
+
+
+def files_digest(path):
+    # names, sizes and mtimes of a dataset on disk: much cheaper than hashing a frame read from it unmodified
+    if os.path.isfile(path):
+        paths = [path]
+    else:
+        paths = sorted(os.path.join(root, name) for root, _, files in os.walk(path) for name in files)
+    if not paths:
+        # os.walk yields nothing for a missing path, which would otherwise hash to the same key as any empty dataset
+        raise FileNotFoundError(f"no dataset files found at {path}")
+    entries = []
+    for file_path in paths:
+        stat = os.stat(file_path)
+        entries.append([os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()
+
+
+def dataset_key(digest, columns, **params):
+    key = {"version": CACHE_VERSION, "digest": digest, "columns": columns, **params}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+def cached_interactions(df, cache_dir=CACHE_DIR, source=None, user_col="user_id", item_col="parent_asin",
+                        rating_col="rating", time_col="review_timestamp", mmap=True, **params):
+    """build_interactions, reusing the saved matrices when this exact data was built before.
+
+    The cache is keyed by a hash of df's columns, or of the files under source when df is that dataset read
+    unfiltered, plus the build parameters.
+    """
+    columns = [c for c in (user_col, item_col, rating_col, time_col) if c in df.columns]
+    params = {"duplicates": "latest", "weighting": "rating", "alpha": CONFIDENCE_ALPHA,
+              "epsilon": CONFIDENCE_EPSILON, **params}
+    digest = files_digest(source) if source is not None else frame_digest(df, columns)
+    directory = os.path.join(cache_dir, dataset_key(digest, columns, **params))
+    if Interactions.exists(directory):
+        print(f"Loaded interaction matrix from {directory}")
+        return Interactions.load(directory, mmap)
+
+    interactions = build_interactions(df, user_col, item_col, rating_col, time_col, **params)
+    tmp_dir = f"{directory}.{os.getpid()}.tmp"
+    try:
+        interactions.save(tmp_dir)
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # another process may have cached the same data first
+        if not Interactions.exists(directory):
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"Saved interaction matrix to {directory}")
+    return Interactions.load(directory, mmap) if mmap else interactions
@@ -0,0 +1,148 @@
+import json
+import os
+
+import numpy as np
+
+from retrieval import top_k
+
+CENTROIDS_FILE = "centroids.npy"
+OFFSETS_FILE = "offsets.npy"
+ITEMS_FILE = "items.npy"
+FACTORS_FILE = "factors.npy"
+META_FILE = "ivf.json"
+
+N_PROBE = 32
+TRAIN_POINTS_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+ASSIGN_BLOCK_ROWS = 65536
+
+
+def augment(item_factors):
+    """Unit-norm items with an extra coordinate sqrt(M^2 - |x|^2), M the largest item norm, divided by M.
+
+    A query q augmented with 0 scores every item exactly as q . x / M, so nearest neighbours by cosine among the
+    augmented items are the maximum-inner-product items: MIPS becomes a search the k-means quantizer can cluster.
+    """
+    item_factors = np.asarray(item_factors)
+    norms = np.einsum("ij,ij->i", item_factors, item_factors)
+    max_norm = np.sqrt(norms.max()) if len(norms) else 1.0
+    extra = np.sqrt(np.maximum(max_norm ** 2 - norms, 0))
+    augmented = np.empty((item_factors.shape[0], item_factors.shape[1] + 1), dtype=item_factors.dtype)
+    augmented[:, :-1] = item_factors
+    augmented[:, -1] = extra
+    return augmented / (max_norm or 1.0)
+
+
+def assign(vectors, centroids, block_rows=ASSIGN_BLOCK_ROWS):
+    # nearest centroid by inner product, in blocks so the scores matrix stays small
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_rows):
+        lists[start:start + block_rows] = np.argmax(vectors[start:start + block_rows] @ centroids.T, axis=1)
+    return lists
+
+
+def spherical_kmeans(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Unit-norm centroids for unit-norm vectors, Lloyd iterations on cosine similarity."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        lists = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, lists, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # reseed empty lists on random points rather than leave dead centroids
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        norms[empty] = 1
+        centroids = sums / norms[:, None]
+    return centroids
+
+
+class IVFIndex:
+    """Approximate top-K by inner product over item factors: an inverted file on a k-means coarse quantizer.
+
+    Items are augmented to unit norm (see augment) and clustered into n_lists lists; their factors are stored
+    grouped by list, so a query scores the n_probe lists whose centroids it matches best, each one a contiguous
+    slice, instead of every item. All arrays are .npy files and can be memory-mapped on load.
+    """
+
+    def __init__(self, centroids, offsets, items, factors, n_probe=N_PROBE):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.items = items
+        self.factors = factors
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, item_factors, n_lists=None, n_probe=N_PROBE, train_points=None, iterations=KMEANS_ITERATIONS,
+              seed=0):
+        item_factors = np.asarray(item_factors)
+        n_items = item_factors.shape[0]
+        n_lists = min(n_lists or max(1, int(np.sqrt(n_items))), n_items)
+        augmented = augment(item_factors)
+        rng = np.random.default_rng(seed)
+        train_points = min(train_points or n_lists * TRAIN_POINTS_PER_LIST, n_items)
+        sample = augmented[np.sort(rng.choice(n_items, train_points, replace=False))]
+        centroids = spherical_kmeans(sample, n_lists, iterations, seed)
+
+        lists = assign(augmented, centroids)
+        items = np.argsort(lists, kind="stable").astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=n_lists), out=offsets[1:])
+        # queries are augmented with 0, so only the factor part of a centroid matters when probing
+        return cls(np.ascontiguousarray(centroids[:, :-1]), offsets, items,
+                   np.ascontiguousarray(item_factors[items]), n_probe)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def n_lists(self):
+        return len(self.offsets) - 1
+
+    def search(self, query, k=10, n_probe=None, exclude=None):
+        """(item codes, scores) of the approximately k best items for query, best first; exclude is an array of
+        item codes to leave out, such as the ones the user has already seen."""
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        probed, _ = top_k(self.centroids @ query, n_probe)
+        starts, ends = self.offsets[probed], self.offsets[probed + 1]
+        lengths = ends - starts
+        before = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) + np.repeat(starts - before, lengths)
+        scores = self.factors[positions] @ query
+        n_excluded = 0 if exclude is None else len(exclude)
+        # at most n_excluded of the best k + n_excluded candidates can be excluded, so only those are checked
+        best, best_scores = top_k(scores, k + n_excluded)
+        best_items = self.items[positions[best]]
+        keep = np.isfinite(best_scores)
+        if n_excluded:
+            keep &= ~np.isin(best_items, exclude)
+        return best_items[keep][:k], best_scores[keep][:k]
+
+    def recommend(self, user_code, user_factors, interactions, k=10, n_probe=None):
+        """retrieval.recommend through the index: the k best items the user has not interacted with."""
+        seen = interactions.indices[interactions.indptr[user_code]:interactions.indptr[user_code + 1]]
+        return self.search(user_factors[user_code], k, n_probe, seen)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, CENTROIDS_FILE), self.centroids)
+        np.save(os.path.join(directory, OFFSETS_FILE), self.offsets)
+        np.save(os.path.join(directory, ITEMS_FILE), self.items)
+        np.save(os.path.join(directory, FACTORS_FILE), self.factors)
+        with open(os.path.join(directory, META_FILE), "w") as f:
+            json.dump({"n_items": len(self.items), "n_lists": self.n_lists, "n_probe": self.n_probe}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(directory, name), mmap_mode=mmap_mode)
+                  for name in (CENTROIDS_FILE, OFFSETS_FILE, ITEMS_FILE, FACTORS_FILE)]
+        return cls(*arrays, n_probe=meta["n_probe"])
+
+    @classmethod
+    def exists(cls, directory):
+        return all(os.path.exists(os.path.join(directory, name))
+                   for name in (CENTROIDS_FILE, OFFSETS_FILE, ITEMS_FILE, FACTORS_FILE, META_FILE))
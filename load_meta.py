@@ -1,75 +1,157 @@
-import os
-import gzip
-import psycopg2
+import argparse
+import ast
+import hashlib
+import math
+import time
 import requests
-import pandas as pd
-from io import BytesIO
 from bs4 import BeautifulSoup
 import json
-from dotenv import load_dotenv
+import db
+from bulk_copy import copy_rows, json_text
+from download_cache import DownloadCache
+from ndjson_stream import iter_gzip_lines, parse_line
 
 BASE_URL = "https://amazon-reviews-2023.github.io/"
+DATA_DIR = "amazon_data"
+dataset_cache = DownloadCache(DATA_DIR)
 
-load_dotenv()
+META_COLUMNS = [
+    "filename", "main_category", "title", "average_rating", "rating_number",
+    "features", "description", "price", "images", "videos", "store", "categories",
+    "details", "parent_asin", "bought_together"
+]
 
-DB_NAME = os.getenv("DBNAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
+META_NUMERIC_COLUMNS = {"average_rating": float, "rating_number": int, "price": float}
+META_JSON_COLUMNS = {"features", "description", "images", "videos", "categories", "details", "bought_together"}
 
+META_BATCH_ROWS = 10000
 
-
-def connect_to_database():
-    try:
-        connection = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = connection.cursor()
-        print("Connected to PostgreSQL")
-        return connection, cursor
-    except (Exception, psycopg2.DatabaseError) as error:
-        print("Error while connecting to PostgreSQL", error)
-        return None, None
-
-
-def create_meta_data_table():
-    connection, cursor = connect_to_database()
-    if not connection:
-        return False
-
-    try:
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS meta_data (
+META_TABLE_COLUMNS = """
             id SERIAL PRIMARY KEY,
             filename TEXT,
             main_category TEXT,
             title TEXT,
-            average_rating TEXT,
-            rating_number TEXT,
-            features TEXT,
-            description TEXT,
-            price TEXT,
-            images TEXT,
-            videos TEXT,
+            average_rating REAL,
+            rating_number INTEGER,
+            features JSONB,
+            description JSONB,
+            price NUMERIC,
+            images JSONB,
+            videos JSONB,
             store TEXT,
-            categories TEXT,
-            details TEXT,
+            categories JSONB,
+            details JSONB,
             parent_asin TEXT,
-            bought_together TEXT,
+            bought_together JSONB,
+            content_hash TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+"""
+
+
+def parse_number(value, cast):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip().lstrip("$").replace(",", "")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number):
+        return None
+    return int(number) if cast is int else number
+
+
+def meta_value(column, value):
+    if column in META_JSON_COLUMNS:
+        return json_text(value) if value is not None else None
+    if column in META_NUMERIC_COLUMNS:
+        return parse_number(value, META_NUMERIC_COLUMNS[column])
+    return str(value) if value is not None else ''
+
+
+def legacy_meta_value(column, text):
+    if column in META_JSON_COLUMNS:
+        if not text:
+            return None
+        try:
+            return json_text(ast.literal_eval(text))
+        except (ValueError, SyntaxError):
+            return json_text(text)
+    if column in META_NUMERIC_COLUMNS:
+        return parse_number(text, META_NUMERIC_COLUMNS[column]) if text else None
+    return text
+
+
+def migrate_meta_data_types(connection, cursor):
+    cursor.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'meta_data' AND column_name = 'average_rating'
+    """)
+    row = cursor.fetchone()
+    if row is None or row[0] != "text":
+        return False
 
+    print("Migrating meta_data to typed columns...")
+    cursor.execute(f"CREATE TABLE meta_data_typed ({META_TABLE_COLUMNS})")
+
+    columns = ["id"] + META_COLUMNS + ["created_at"]
+    legacy_rows = connection.cursor(name="meta_data_legacy")
+    legacy_rows.itersize = META_BATCH_ROWS
+    legacy_rows.execute(f"SELECT {', '.join(columns)} FROM meta_data")
+
+    migrated = 0
+    while True:
+        batch = legacy_rows.fetchmany(META_BATCH_ROWS)
+        if not batch:
+            break
+        rows = (
+            (row_id, *[legacy_meta_value(column, value) for column, value in zip(META_COLUMNS, values)], created_at)
+            for row_id, *values, created_at in batch
+        )
+        migrated += copy_rows(cursor, "meta_data_typed", columns, rows)
+    legacy_rows.close()
+
+    cursor.execute("""
+        SELECT setval(pg_get_serial_sequence('meta_data_typed', 'id'), COALESCE(MAX(id), 0) + 1, false)
+        FROM meta_data_typed;
+        DROP TABLE meta_data;
+        ALTER TABLE meta_data_typed RENAME TO meta_data;
+        ALTER INDEX meta_data_typed_pkey RENAME TO meta_data_pkey;
+        ALTER SEQUENCE meta_data_typed_id_seq RENAME TO meta_data_id_seq;
+    """)
+    print(f"Migrated {migrated} meta_data rows")
+    return True
+
+
+def create_meta_data_table(connection, cursor):
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS meta_data ({META_TABLE_COLUMNS});
+
+        ALTER TABLE meta_data ADD COLUMN IF NOT EXISTS content_hash TEXT;
+        """)
+        migrate_meta_data_types(connection, cursor)
+
+        cursor.execute("SELECT to_regclass('idx_meta_parent_filename_unique')")
+        needs_unique_index = cursor.fetchone()[0] is None
+        if needs_unique_index:
+            cursor.execute("""
+                DELETE FROM meta_data a USING meta_data b
+                WHERE a.parent_asin = b.parent_asin AND a.filename = b.filename AND a.id < b.id
+            """)
+            if cursor.rowcount:
+                print(f"Removed {cursor.rowcount} duplicate (parent_asin, filename) rows from meta_data")
+            cursor.execute("""
+                CREATE UNIQUE INDEX idx_meta_parent_filename_unique ON meta_data(parent_asin, filename);
+                DROP INDEX IF EXISTS idx_meta_parent_filename;
+            """)
+
+        cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_meta_parent_asin ON meta_data(parent_asin);
         CREATE INDEX IF NOT EXISTS idx_meta_filename ON meta_data(filename);
-        CREATE INDEX IF NOT EXISTS idx_meta_parent_filename ON meta_data(parent_asin, filename);
-        """
+        """)
 
-        cursor.execute(create_table_query)
         connection.commit()
         print("meta_data table created successfully")
         return True
@@ -78,110 +160,115 @@ def create_meta_data_table():
         print(f"Error creating meta_data table: {e}")
         connection.rollback()
         return False
-    finally:
-        cursor.close()
-        connection.close()
 
 
-def insert_meta_data_to_db(meta_df):
-    if meta_df.empty:
-        print("No meta data to insert")
-        return False
+def meta_row(product, filename):
+    values = (filename,) + tuple(meta_value(column, product.get(column)) for column in META_COLUMNS[1:])
+    content_hash = hashlib.md5(json.dumps(values).encode("utf-8")).hexdigest()
+    return values + (content_hash,)
 
-    connection, cursor = connect_to_database()
-    if not connection:
-        return False
 
+def upsert_staged_meta(cursor):
+    columns = META_COLUMNS + ["content_hash"]
+    cursor.execute(f"""
+        WITH upserted AS (
+            INSERT INTO meta_data ({', '.join(columns)})
+            SELECT DISTINCT ON (parent_asin) {', '.join(columns)} FROM meta_staging
+            ORDER BY parent_asin, filename, staged_seq DESC
+            ON CONFLICT (parent_asin, filename) DO UPDATE SET
+                {', '.join(f"{column} = EXCLUDED.{column}" for column in columns)}
+            WHERE meta_data.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT
+            count(*) FILTER (WHERE inserted),
+            count(*) FILTER (WHERE NOT inserted),
+            (SELECT count(DISTINCT parent_asin) FROM meta_staging)
+        FROM upserted
+    """)
+    inserted, updated, staged = cursor.fetchone()
+    return inserted, updated, staged - inserted - updated
+
+
+def insert_meta_data_to_db(meta_files, connection, cursor, incremental=True):
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
     try:
-        cursor.execute("DELETE FROM meta_data")
-        print("Cleared existing meta_data table")
-
-        insert_query = """
-            INSERT INTO meta_data 
-            (filename, main_category, title, average_rating, rating_number, 
-             features, description, price, images, videos, store, categories, 
-             details, parent_asin, bought_together) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        data_tuples = []
-        for _, row in meta_df.iterrows():
-            data_tuples.append((
-                str(row['filename']) if row['filename'] is not None else '',
-                str(row['main_category']) if row['main_category'] is not None else '',
-                str(row['title']) if row['title'] is not None else '',
-                str(row['average_rating']) if row['average_rating'] is not None else '',
-                str(row['rating_number']) if row['rating_number'] is not None else '',
-                str(row['features']) if row['features'] is not None else '',
-                str(row['description']) if row['description'] is not None else '',
-                str(row['price']) if row['price'] is not None else '',
-                str(row['images']) if row['images'] is not None else '',
-                str(row['videos']) if row['videos'] is not None else '',
-                str(row['store']) if row['store'] is not None else '',
-                str(row['categories']) if row['categories'] is not None else '',
-                str(row['details']) if row['details'] is not None else '',
-                str(row['parent_asin']) if row['parent_asin'] is not None else '',
-                str(row['bought_together']) if row['bought_together'] is not None else ''
-            ))
-
-        batch_size = 1000
-        total_inserted = 0
-
-        for i in range(0, len(data_tuples), batch_size):
-            batch = data_tuples[i:i + batch_size]
-            cursor.executemany(insert_query, batch)
-            connection.commit()
-            total_inserted += len(batch)
-
-            if total_inserted % 10000 == 0:
-                print(f"Inserted {total_inserted} records...")
-
-        print(f"Successfully inserted {total_inserted} meta data records into database")
-        return True
+        cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS meta_staging AS
+            SELECT {', '.join(META_COLUMNS)}, content_hash FROM meta_data WITH NO DATA;
+
+            -- the order rows were staged in, so the last copy of a product read from the file wins
+            ALTER TABLE meta_staging ADD COLUMN IF NOT EXISTS staged_seq BIGINT GENERATED ALWAYS AS IDENTITY;
+        """)
+
+        for filename, batches in meta_files:
+            cursor.execute("SAVEPOINT meta_file")
+            try:
+                cursor.execute("TRUNCATE meta_staging")
+                for batch in batches:
+                    copy_rows(cursor, "meta_staging", META_COLUMNS + ["content_hash"], batch)
+
+                inserted, updated, unchanged = upsert_staged_meta(cursor)
+                deleted = 0
+                if not incremental:
+                    cursor.execute("""
+                        DELETE FROM meta_data m
+                        WHERE m.filename = %s
+                          AND NOT EXISTS (SELECT 1 FROM meta_staging s WHERE s.parent_asin = m.parent_asin)
+                    """, (filename,))
+                    deleted = cursor.rowcount
+                cursor.execute("RELEASE SAVEPOINT meta_file")
+            except Exception as e:
+                print(f"Error processing {filename}: {e}")
+                cursor.execute("ROLLBACK TO SAVEPOINT meta_file")
+                continue
+
+            print(f"{filename}: {inserted} inserted, {updated} updated, {unchanged} unchanged"
+                  + (f", {deleted} deleted" if deleted else ""))
+            counts["inserted"] += inserted
+            counts["updated"] += updated
+            counts["unchanged"] += unchanged
+            counts["deleted"] += deleted
+
+        connection.commit()
+        return counts
 
     except Exception as e:
         print(f"Error inserting meta data: {e}")
         connection.rollback()
-        return False
-    finally:
-        cursor.close()
-        connection.close()
-
+        return counts
 
 
-def create_product_dict_from_db():
-    connection, cursor = connect_to_database()
-    if not connection:
-        return {}
+def missing_wanted_asins(cursor, wanted_asins):
+    cursor.execute(
+        "SELECT filename, parent_asin FROM meta_data WHERE filename = ANY(%s)",
+        (list(wanted_asins),)
+    )
+    missing = {filename: set(asins) for filename, asins in wanted_asins.items()}
+    for filename, parent_asin in cursor.fetchall():
+        missing[filename].discard(parent_asin)
+    return missing
 
-    try:
-        cursor.execute("SELECT DISTINCT parent_asin, filename FROM review_data")
-        results = cursor.fetchall()
-
-        product_dict = {}
-        for parent_asin, filename in results:
-            if filename not in product_dict:
-                product_dict[filename] = set()
-            product_dict[filename].add(parent_asin)
 
-        return product_dict
-    finally:
-        cursor.close()
-        connection.close()
+def build_wanted_asins(cursor):
+    cursor.execute("SELECT DISTINCT parent_asin, filename FROM review_data")
 
+    wanted_asins = {}
+    for parent_asin, filename in cursor.fetchall():
+        if filename not in wanted_asins:
+            wanted_asins[filename] = set()
+        wanted_asins[filename].add(parent_asin)
+    return wanted_asins
 
-user_product_dict = create_product_dict_from_db()
-print(f"Files in dict: {list(user_product_dict.keys())}")
-
-
-print("Creating meta_data table...")
-create_meta_data_table()
 
 def get_all_files():
-    response = requests.get(BASE_URL)
-    response.raise_for_status()
+    try:
+        page = dataset_cache.read_bytes(BASE_URL)
+    except requests.RequestException:
+        print("Index page not loaded")
+        return []
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = BeautifulSoup(page, "html.parser")
     tables = soup.find_all("table")
     table = tables[1]
     links = []
@@ -196,101 +283,104 @@ def get_all_files():
     return links
 
 
-print("Fetching file list...")
-files = get_all_files()
-meta_files = [f for f in files if 'meta_categories' in f.lower()]
+def meta_filename(file_url):
+    return file_url.split("/")[-1].replace(".gz", "").replace('meta_', '')
+
+
+def iter_meta_batches(file_url, filename, wanted_asins, batch_rows=META_BATCH_ROWS):
+    print(f"Downloading {file_url} ...")
+    print(f"Looking for {len(wanted_asins)} products from {filename}")
 
-print("Meta files found:", len(meta_files))
+    batch = []
+    products_found = 0
+    with dataset_cache.open(file_url) as raw:
+        for line in iter_gzip_lines(raw):
+            if line.strip():
+                try:
+                    product = parse_line(line)
+                except json.JSONDecodeError:
+                    continue
 
-def parse_meta_files(meta_files, user_product_dict):
-    all_dfs = []
+                if product.get("parent_asin") in wanted_asins:
+                    products_found += 1
+                    batch.append(meta_row(product, filename))
+                    if len(batch) >= batch_rows:
+                        yield batch
+                        batch = []
+
+    if batch:
+        yield batch
+    print(f"{filename} loaded, products found: {products_found}")
+
+
+def stream_meta(meta_files, wanted_asins, batch_rows=META_BATCH_ROWS):
     for file_url in meta_files:
-        filename = file_url.split("/")[-1].replace(".gz", "")
-        filename = filename.replace('meta_', '')
+        filename = meta_filename(file_url)
 
-        if filename not in user_product_dict:
+        if filename not in wanted_asins:
             print(f"Skipping {filename} - no matching products in review data")
             continue
 
-        print(f"Downloading {file_url} ...")
-        print(f"Looking for {len(user_product_dict[filename])} products from {filename}")
+        yield filename, iter_meta_batches(file_url, filename, wanted_asins[filename], batch_rows)
 
-        try:
-            response = requests.get(file_url, stream=True)
-            response.raise_for_status()
-
-            data = []
-            products_found = 0
-
-            with gzip.open(BytesIO(response.content), 'rt', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        product = json.loads(line)
-                        parent_asin = product.get("parent_asin")
-
-                        if parent_asin in user_product_dict[filename]:
-                            products_found += 1
-                            data.append({
-                                "filename": filename,
-                                "main_category": product.get("main_category"),
-                                "title": product.get("title"),
-                                "average_rating": product.get("average_rating"),
-                                "rating_number": product.get("rating_number"),
-                                "features": product.get("features"),
-                                "description": product.get("description"),
-                                "price": product.get("price"),
-                                "images": product.get("images"),
-                                "videos": product.get("videos"),
-                                "store": product.get("store"),
-                                "categories": product.get("categories"),
-                                "details": product.get("details"),
-                                "parent_asin": parent_asin,
-                                "bought_together": product.get("bought_together"),
-                            })
-                    except json.JSONDecodeError:
-                        continue
-
-            df = pd.DataFrame(data)
-            print(f"{filename} loaded, shape: {df.shape}, products found: {products_found}")
-
-            if not df.empty:
-                all_dfs.append(df)
-
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
-            continue
 
-    if all_dfs:
-        meta_df = pd.concat(all_dfs, ignore_index=True)
-        return meta_df
-    else:
-        return pd.DataFrame()
+def load_meta(connection, cursor, wanted_asins=None, files=None, batch_rows=META_BATCH_ROWS, incremental=True):
+    start_time = time.perf_counter()
+    if not create_meta_data_table(connection, cursor):
+        return None
 
+    if wanted_asins is None:
+        wanted_asins = build_wanted_asins(cursor)
+    print(f"Files with wanted products: {list(wanted_asins.keys())}")
 
+    if files is None:
+        print("Fetching file list...")
+        files = get_all_files()
+    meta_files = [f for f in files if 'meta_categories' in f.lower()]
+    print("Meta files found:", len(meta_files))
 
-meta_df = parse_meta_files(meta_files, user_product_dict)
-print("Meta DF shape:", meta_df.shape)
+    if incremental:
+        missing = missing_wanted_asins(cursor, wanted_asins)
+        for filename in sorted(wanted_asins):
+            if not missing[filename]:
+                print(f"Skipping {filename} - all {len(wanted_asins[filename])} wanted products already loaded")
+        meta_files = [f for f in meta_files if missing.get(meta_filename(f), True)]
 
-if meta_df.empty:
-    print("No meta data loaded. Exiting.")
-    exit()
+    print("Upserting meta data into database...")
+    counts = insert_meta_data_to_db(stream_meta(meta_files, wanted_asins, batch_rows), connection, cursor, incremental)
+    elapsed = time.perf_counter() - start_time
+    print(f"Meta data: {counts['inserted']} inserted, {counts['updated']} updated, "
+          f"{counts['unchanged']} unchanged, {counts['deleted']} deleted in {elapsed:.1f}s")
+    return counts
 
-print("=== DEBUGGING PARENT_ASIN ===")
-print(f"Meta DF shape: {meta_df.shape}")
-print(f"Parent_asin nulls in parsed data: {meta_df['parent_asin'].isnull().sum()}")
-print(f"Parent_asin empty strings: {(meta_df['parent_asin'] == '').sum()}")
 
-unique_nullish = meta_df[meta_df['parent_asin'].isnull() | (meta_df['parent_asin'] == '')]['parent_asin'].unique()
-print(f"Unique null-ish values: {unique_nullish}")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load Amazon product metadata for reviewed products into PostgreSQL")
+    parser.add_argument("--batch-rows", type=int, default=META_BATCH_ROWS,
+                        help="number of matched products sent to the database per COPY")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="re-read every category and delete rows that are no longer wanted, "
+                             "instead of skipping categories with nothing missing")
+    return parser.parse_args(argv)
 
-print(f"Sample parent_asins: {meta_df['parent_asin'].dropna().head(10).tolist()}")
 
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        with db.connection() as connection, connection.cursor() as cursor:
+            counts = load_meta(connection, cursor, batch_rows=args.batch_rows, incremental=not args.full_refresh)
+            if counts is None:
+                print("Failed to load meta data")
+    except Exception as e:
+        print(f"Error in main: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        db.close_pool()
+
+    print("Done!")
 
-print("Inserting meta data into database...")
-insert_success = insert_meta_data_to_db(meta_df)
-if insert_success:
-    print("Meta data successfully inserted into database")
-else:
-    print("Failed to insert meta data into database")
 
-print("Done!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
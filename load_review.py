@@ -1,55 +1,43 @@
-import gzip
+import argparse
 import os
+import pickle
 import datetime
 import requests
 import pandas as pd
 from bs4 import BeautifulSoup
 import json
-from dotenv import load_dotenv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import psycopg2
-
-load_dotenv()
-
-DB_NAME = os.getenv("DBNAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
+import db
+from bulk_copy import copy_rows, json_text
+from download_cache import DownloadCache
+from load_meta import load_meta, parse_number
+from ndjson_stream import iter_gzip_member_lines, parse_line
+from parquet_sink import REVIEW_DATASET_DIR, write_review_partition
+from user_registry import load_user_registry
 
 BASE_URL = "https://amazon-reviews-2023.github.io/"
 DATA_DIR = "amazon_data"
 os.makedirs(DATA_DIR, exist_ok=True)
+dataset_cache = DownloadCache(DATA_DIR)
+SPILL_DIR = os.path.join(DATA_DIR, "spill")
 
 MAX_REVIEWS = 50000
 MAX_ROWS_TO_READ = 300000
 start_date = datetime.datetime(2020, 1, 1).timestamp() * 1000
 
 
-def connect_to_database():
-    try:
-        connection = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = connection.cursor()
-        print("Connected to PostgreSQL")
-        return connection, cursor
-    except (Exception, psycopg2.DatabaseError) as error:
-        print("Error while connecting to PostgreSQL", error)
-
-
 def get_all_files():
-    response = requests.get(BASE_URL)
-    if response.status_code == 200:
+    try:
+        page = dataset_cache.read_bytes(BASE_URL)
         print("Index page loaded")
-    else:
+    except requests.RequestException:
         print("Index page not loaded")
         return []
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = BeautifulSoup(page, "html.parser")
     tables = soup.find_all("table")
     table = tables[1]
     links = []
@@ -64,164 +52,433 @@ def get_all_files():
     return links
 
 
-def get_existing_users(cursor):
-    try:
-        cursor.execute("SELECT DISTINCT user_id FROM review_data ")
-        existing_users = [row[0] for row in cursor.fetchall()]
-        return existing_users
-    except psycopg2.Error:
-        return []
+REVIEW_COLUMNS = [
+    "user_id", "parent_asin", "asin", "rating", "title", "review_text", "images",
+    "review_timestamp", "verified_purchase", "helpful_vote", "filename"
+]
+
+REVIEW_TABLE_COLUMNS = """
+            user_id TEXT,
+            parent_asin TEXT,
+            asin TEXT,
+            rating DOUBLE PRECISION,
+            title TEXT,
+            review_text TEXT,
+            images JSONB,
+            review_timestamp BIGINT,
+            verified_purchase BOOLEAN,
+            helpful_vote INTEGER,
+            filename TEXT
+"""
+
+REVIEW_NUMERIC_COLUMNS = {"rating": float, "review_timestamp": int, "helpful_vote": int}
+BOOLEAN_TEXT = {"t": True, "true": True, "f": False, "false": False}
+REVIEW_BATCH_ROWS = 10000
+
+
+def legacy_review_value(column, text):
+    # review_data used to be all TEXT: numbers as their str(), booleans as 't'/'f' or 'true'/'false', images as JSON
+    if text is None:
+        return None
+    if column == "images":
+        try:
+            return json_text(json.loads(text))
+        except json.JSONDecodeError:
+            return json_text(text)
+    if column in REVIEW_NUMERIC_COLUMNS:
+        return parse_number(text, REVIEW_NUMERIC_COLUMNS[column])
+    if column == "verified_purchase":
+        return BOOLEAN_TEXT.get(text.strip().lower())
+    return text
+
+
+def migrate_review_data_types(connection, cursor):
+    cursor.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'review_data' AND column_name = 'review_timestamp'
+    """)
+    row = cursor.fetchone()
+    if row is None or row[0] != "text":
+        return False
+
+    print("Migrating review_data to typed columns...")
+    cursor.execute(f"CREATE TABLE review_data_typed ({REVIEW_TABLE_COLUMNS})")
+
+    legacy_rows = connection.cursor(name="review_data_legacy")
+    legacy_rows.itersize = REVIEW_BATCH_ROWS
+    legacy_rows.execute(f"SELECT {', '.join(REVIEW_COLUMNS)} FROM review_data")
+
+    migrated = 0
+    while True:
+        batch = legacy_rows.fetchmany(REVIEW_BATCH_ROWS)
+        if not batch:
+            break
+        rows = ([legacy_review_value(column, value) for column, value in zip(REVIEW_COLUMNS, values)]
+                for values in batch)
+        migrated += copy_rows(cursor, "review_data_typed", REVIEW_COLUMNS, rows)
+    legacy_rows.close()
+
+    cursor.execute("""
+        DROP TABLE review_data;
+        ALTER TABLE review_data_typed RENAME TO review_data;
+    """)
+    print(f"Migrated {migrated} review_data rows")
+    return True
+
+
+def create_review_data_table(connection, cursor):
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS review_data ({REVIEW_TABLE_COLUMNS})")
+    migrate_review_data_types(connection, cursor)
+    connection.commit()
+
+
+def create_ingest_tables(connection, cursor):
+    create_review_data_table(connection, cursor)
+    cursor.execute("SELECT to_regclass('ingest_progress')")
+    first_run = cursor.fetchone()[0] is None
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_progress (
+            filename TEXT PRIMARY KEY,
+            restart_offset BIGINT DEFAULT 0,
+            restart_line BIGINT DEFAULT 0,
+            lines_read BIGINT DEFAULT 0,
+            rows_read BIGINT DEFAULT 0,
+            priority_rows INTEGER DEFAULT 0,
+            other_rows INTEGER DEFAULT 0,
+            read_complete BOOLEAN DEFAULT FALSE,
+            completed BOOLEAN DEFAULT FALSE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS review_staging (
+            user_id TEXT,
+            parent_asin TEXT,
+            asin TEXT,
+            rating DOUBLE PRECISION,
+            title TEXT,
+            review_text TEXT,
+            images TEXT,
+            review_timestamp BIGINT,
+            verified_purchase BOOLEAN,
+            helpful_vote INTEGER,
+            filename TEXT,
+            seq BIGINT,
+            is_priority BOOLEAN
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_review_staging_file ON review_staging(filename, is_priority, seq);
+    """)
+    connection.commit()
+
+    if first_run:
+        try:
+            cursor.execute("""
+                INSERT INTO ingest_progress (filename, read_complete, completed)
+                SELECT DISTINCT filename, TRUE, TRUE FROM review_data
+                ON CONFLICT (filename) DO NOTHING
+            """)
+            connection.commit()
+            print(f"Marked {cursor.rowcount} previously loaded files as completed")
+        except psycopg2.Error:
+            connection.rollback()
+
+
+def get_ingest_progress(cursor):
+    cursor.execute(f"SELECT filename, completed, {', '.join(PROGRESS_FIELDS)} FROM ingest_progress")
+    completed = set()
+    progress_by_file = {}
+    for filename, is_completed, *values in cursor.fetchall():
+        if is_completed:
+            completed.add(filename)
+        else:
+            progress_by_file[filename] = dict(zip(PROGRESS_FIELDS, values))
+    return completed, progress_by_file
+
+
+PROGRESS_FIELDS = [
+    "restart_offset", "restart_line", "lines_read", "rows_read",
+    "priority_rows", "other_rows", "read_complete"
+]
+
+CHECKPOINT_ROWS = 10000
+
+
+def new_progress():
+    return {field: 0 for field in PROGRESS_FIELDS} | {"read_complete": False}
+
+
+def review_row(review_data):
+    return (
+        review_data['user_id'],
+        review_data['parent_asin'],
+        review_data['asin'],
+        review_data['rating'],
+        review_data['title'],
+        review_data['text'],
+        review_data['images'],
+        review_data['timestamp'],
+        review_data['verified_purchase'],
+        review_data['helpful_votes'],
+        review_data['filename']
+    )
+
+
+def save_progress(filename, progress, cursor, completed=False):
+    values = [progress[field] for field in PROGRESS_FIELDS]
+    cursor.execute(f"""
+        INSERT INTO ingest_progress (filename, {', '.join(PROGRESS_FIELDS)}, completed, updated_at)
+        VALUES (%s, {', '.join(['%s'] * len(PROGRESS_FIELDS))}, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (filename) DO UPDATE SET
+            {', '.join(f"{field} = EXCLUDED.{field}" for field in PROGRESS_FIELDS)},
+            completed = EXCLUDED.completed,
+            updated_at = EXCLUDED.updated_at
+    """, [filename, *values, completed])
+
+
+class ReviewSampler:
+    def __init__(self, max_rows, priority_rows=0, other_rows=0):
+        self.max_rows = max_rows
+        self.priority_rows = priority_rows
+        self.other_rows = other_rows
+
+    @property
+    def other_slots(self):
+        return max(self.max_rows - self.priority_rows, 0)
+
+    def offer(self, is_priority):
+        if is_priority:
+            if self.priority_rows >= self.max_rows:
+                return False
+            self.priority_rows += 1
+            return True
+
+        if self.other_rows >= self.other_slots:
+            return False
+        self.other_rows += 1
+        return True
+
+
+def stage_category_batch(filename, rows, progress, sampler, user_registry, connection, cursor):
+    staged = []
+    seq = progress["rows_read"] - len(rows)
+    for review_data in rows:
+        is_priority = review_data["user_id"] in user_registry
+        if sampler.offer(is_priority):
+            staged.append(review_row(review_data) + (seq, is_priority))
+        seq += 1
+    progress["priority_rows"] = sampler.priority_rows
+    progress["other_rows"] = sampler.other_rows
+
+    with db.transaction(connection, f"checkpointing {filename}"):
+        copy_rows(cursor, "review_staging", REVIEW_COLUMNS + ["seq", "is_priority"], staged)
+        save_progress(filename, progress, cursor)
+
+
+def load_selected_rows(filename, progress, cursor):
+    select_query = f"""
+        SELECT {', '.join(REVIEW_COLUMNS)} FROM review_staging
+        WHERE filename = %s AND is_priority = %s
+        ORDER BY seq
+        LIMIT %s
+    """
+    cursor.execute(select_query, (filename, True, progress["priority_rows"]))
+    selected = cursor.fetchall()
+    priority_count = len(selected)
+    remaining_slots = max(MAX_REVIEWS - priority_count, 0)
+    cursor.execute(select_query, (filename, False, remaining_slots))
+    selected.extend(cursor.fetchall())
+
+    final_data = []
+    for (user_id, parent_asin, asin, rating, title, text, images, ts,
+         verified_purchase, helpful_votes, filename) in selected:
+        final_data.append({
+            "user_id": user_id,
+            "parent_asin": parent_asin,
+            "asin": asin,
+            "rating": rating,
+            "title": title,
+            "text": text,
+            "images": json.loads(images) if images is not None else None,
+            "timestamp": ts,
+            "verified_purchase": verified_purchase,
+            "helpful_votes": helpful_votes,
+            "filename": filename
+        })
+    return final_data, priority_count
+
+
+def save_category_data(records, filename, progress, user_registry, connection, cursor):
+    with db.transaction(connection, f"inserting {filename}"):
+        inserted = copy_rows(cursor, "review_data", REVIEW_COLUMNS, (review_row(r) for r in records))
+        user_registry.save(cursor)
+        cursor.execute("DELETE FROM review_staging WHERE filename = %s", (filename,))
+        save_progress(filename, progress, cursor, completed=True)
+    print(f"Successfully inserted {inserted} records")
+
+
+def category_filename(file_url):
+    return file_url.split("/")[-1].replace(".gz", "")
+
+
+def iter_category_batches(file_url, progress=None, batch_rows=CHECKPOINT_ROWS):
+    filename = category_filename(file_url)
+    progress = dict(progress) if progress else new_progress()
+
+    if progress["read_complete"]:
+        yield filename, [], progress, True
+        return
 
+    print(f"Streaming {file_url} ...")
+    offset = progress["restart_offset"]
+    line_number = progress["restart_line"]
+    reader = dataset_cache.open(file_url, offset)
+    if progress["lines_read"]:
+        print(f"Resuming {filename} from byte {offset}, {progress['lines_read'] - line_number} lines to skip")
 
-def get_completed_categories(cursor):
-    try:
-        cursor.execute("SELECT DISTINCT filename FROM review_data")
-        completed = [row[0] for row in cursor.fetchall()]
-        return completed
-    except psycopg2.Error:
-        return []
+    rows = []
 
+    print(f"Reading first {MAX_ROWS_TO_READ} rows from file...")
 
-def save_category_data(df, connection, cursor):
-    df_renamed = df.rename(columns={
-        'text': 'review_text',
-        'timestamp': 'review_timestamp',
-        'helpful_votes': 'helpful_vote'
-    })
+    try:
+        for line, restart_offset in iter_gzip_member_lines(reader, offset):
+            if restart_offset is not None:
+                progress["restart_offset"] = restart_offset
+                progress["restart_line"] = line_number
+
+            line_number += 1
+            if line_number <= progress["lines_read"]:
+                continue
+
+            if progress["rows_read"] >= MAX_ROWS_TO_READ:
+                break
+            progress["lines_read"] = line_number
+
+            if line.strip():
+                try:
+                    review = parse_line(line)
+                    ts = review.get("timestamp", 0)
+
+                    if ts >= start_date:
+                        progress["rows_read"] += 1
+
+                        rows.append({
+                            "user_id": review.get("user_id"),
+                            "parent_asin": review.get("parent_asin"),
+                            "asin": review.get("asin"),
+                            "rating": review.get("rating"),
+                            "title": review.get("title"),
+                            "text": review.get("text"),
+                            "images": review.get("images"),
+                            "timestamp": ts,
+                            "verified_purchase": review.get("verified_purchase"),
+                            "helpful_votes": review.get("helpful_vote", 0),
+                            "filename": filename
+                        })
+
+                        if progress["rows_read"] % 50000 == 0:
+                            print(f"Processed {progress['rows_read']} valid rows so far...")
+
+                        if len(rows) >= batch_rows:
+                            yield filename, rows, progress, False
+                            rows = []
+
+                except json.JSONDecodeError:
+                    continue
+    finally:
+        reader.close()
 
-    insert_query = """
-        INSERT INTO review_data 
-        (user_id, parent_asin, asin, rating, title, review_text, images, 
-         review_timestamp, verified_purchase, helpful_vote, filename) 
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
+    print(f"Read {progress['rows_read']} valid rows from {progress['lines_read']} total lines")
+    progress["read_complete"] = True
+    yield filename, rows, progress, True
 
-    data_tuples = []
-    for _, row in df_renamed.iterrows():
-        images_value = row['images']
-        if isinstance(images_value, (dict, list)):
-            images_json = json.dumps(images_value)
-        elif images_value is None:
-            images_json = None
-        else:
-            images_json = str(images_value)
-
-        data_tuples.append((
-            row['user_id'],
-            row['parent_asin'],
-            row['asin'],
-            row['rating'],
-            row['title'],
-            row['review_text'],
-            images_json,
-            row['review_timestamp'],
-            row['verified_purchase'],
-            row['helpful_vote'],
-            row['filename']
-        ))
 
+def spill_category_file(file_url, progress=None):
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    spill_path = os.path.join(SPILL_DIR, f"{category_filename(file_url)}.{os.getpid()}.pickle")
     try:
-        cursor.executemany(insert_query, data_tuples)
-        connection.commit()
-        print(f"Successfully inserted {len(data_tuples)} records")
-    except psycopg2.Error as e:
-        print(f"Error inserting data: {e}")
-        connection.rollback()
+        with open(spill_path, "wb") as f:
+            for batch in iter_category_batches(file_url, progress):
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        os.remove(spill_path)
+        raise
+    return spill_path
 
 
-def parse_review_files(review_files, connection, cursor):
-    all_dfs = []
-    user_product_dict = {}
-    global_users = get_existing_users(cursor)
-    completed_filenames = get_completed_categories(cursor)
+def iter_spilled_batches(spill_path):
+    try:
+        with open(spill_path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
+    finally:
+        os.remove(spill_path)
 
-    for file_url in review_files:
-        filename = file_url.split("/")[-1].replace(".gz", "")
 
-        if filename in completed_filenames:
-            print(f"Skipping {filename} - already processed")
-            continue
+def read_category_files(review_files, progress_by_file, workers=1):
+    if workers <= 1:
+        for file_url in review_files:
+            yield from iter_category_batches(file_url, progress_by_file.get(category_filename(file_url)))
+        return
 
-        print(f"Streaming {file_url} ...")
-        print(f"Previous users tracked: {len(global_users)}")
+    def submit(url):
+        return executor.submit(spill_category_file, url, progress_by_file.get(category_filename(url)))
 
-        response = requests.get(file_url, stream=True)
-        response.raise_for_status()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending_urls = iter(review_files)
+        in_flight = deque(submit(url) for url in islice(pending_urls, workers))
 
-        priority_data = []
-        other_data = []
-        file_users = set()
-        rows_read = 0
-        lines_processed = 0
+        try:
+            while in_flight:
+                spill_path = in_flight.popleft().result()
+                next_url = next(pending_urls, None)
+                if next_url is not None:
+                    in_flight.append(submit(next_url))
+                yield from iter_spilled_batches(spill_path)
+        finally:
+            # a failed worker or a consumer that stopped early leaves spills nobody will read
+            for future in in_flight:
+                if not future.cancel() and future.exception() is None:
+                    os.remove(future.result())
 
-        print(f"Reading first {MAX_ROWS_TO_READ} rows from file...")
 
-        decompressor = gzip.GzipFile(fileobj=response.raw)
+def parse_review_files(review_files, connection, cursor, workers=1, dataset_dir=REVIEW_DATASET_DIR):
+    total_rows = 0
+    user_product_dict = {}
+    create_ingest_tables(connection, cursor)
+    user_registry = load_user_registry(connection, cursor)
+    completed_filenames, progress_by_file = get_ingest_progress(cursor)
 
-        buffer = ""
-        try:
-            for chunk in iter(lambda: decompressor.read(8192), b''):
-                if rows_read >= MAX_ROWS_TO_READ:
-                    break
+    pending_files = []
+    for file_url in review_files:
+        filename = category_filename(file_url)
 
-                buffer += chunk.decode('utf-8', errors='ignore')
-
-                while '\n' in buffer and rows_read < MAX_ROWS_TO_READ:
-                    line, buffer = buffer.split('\n', 1)
-
-                    if line.strip():
-                        lines_processed += 1
-                        try:
-                            review = json.loads(line)
-                            ts = review.get("timestamp", 0)
-                            user_id = review.get("user_id")
-
-                            if ts >= start_date:
-                                rows_read += 1
-
-                                review_data = {
-                                    "user_id": user_id,
-                                    "parent_asin": review.get("parent_asin"),
-                                    "asin": review.get("asin"),
-                                    "rating": review.get("rating"),
-                                    "title": review.get("title"),
-                                    "text": review.get("text"),
-                                    "images": review.get("images"),
-                                    "timestamp": ts,
-                                    "verified_purchase": review.get("verified_purchase"),
-                                    "helpful_votes": review.get("helpful_vote", 0),
-                                    "filename": filename
-                                }
-
-                                if user_id in global_users:
-                                    priority_data.append(review_data)
-                                    file_users.add(user_id)
-                                else:
-                                    other_data.append(review_data)
-
-                                if rows_read % 50000 == 0:
-                                    print(f"Processed {rows_read} valid rows so far...")
-
-                        except json.JSONDecodeError:
-                            continue
-        finally:
-            decompressor.close()
-            response.close()
+        if filename in completed_filenames:
+            print(f"Skipping {filename} - already processed")
+            continue
+        pending_files.append(file_url)
 
-        print(f"Read {rows_read} valid rows from {lines_processed} total lines")
+    if workers > 1:
+        print(f"Reading {len(pending_files)} files with {workers} worker processes")
 
-        final_data = priority_data.copy()
-        remaining_slots = MAX_REVIEWS - len(final_data)
-        print(f"File: {filename} Existing users: {len(final_data)}")
+    sampler = None
+    for filename, rows, progress, done in read_category_files(pending_files, progress_by_file, workers):
+        if sampler is None:
+            sampler = ReviewSampler(MAX_REVIEWS, progress["priority_rows"], progress["other_rows"])
+        stage_category_batch(filename, rows, progress, sampler, user_registry, connection, cursor)
+        if not done:
+            continue
 
-        if remaining_slots > 0:
-            for review_data in other_data:
-                if len(final_data) >= MAX_REVIEWS:
-                    break
-                final_data.append(review_data)
-                file_users.add(review_data["user_id"])
+        print(f"Previous users tracked: {len(user_registry)}")
+
+        final_data, priority_count = load_selected_rows(filename, progress, cursor)
+        print(f"File: {filename} Existing users: {priority_count}")
 
-        global_users.extend([user for user in file_users if user not in global_users])
+        for review_data in final_data:
+            user_registry.add(review_data["user_id"])
 
         user_product_dict[filename] = set()
         for review_data in final_data:
@@ -229,71 +486,72 @@ def parse_review_files(review_files, connection, cursor):
 
         df = pd.DataFrame(final_data)
         print(f"{filename} loaded, shape: {df.shape}")
-        print(f"Priority users included: {len(priority_data)}")
-        print(f"New users added: {len(final_data) - len(priority_data)}")
-        print(f"Total global users: {len(global_users)}")
+        print(f"Priority users included: {priority_count}")
+        print(f"New users added: {len(final_data) - priority_count}")
+        print(f"Total global users: {len(user_registry)}")
         print(df.head())
 
-        if not df.empty:
-            save_category_data(df, connection, cursor)
-            print(f"Saved {filename} to database")
+        written = write_review_partition(final_data, filename, dataset_dir)
+        print(f"Wrote {written} rows to {dataset_dir}/filename={filename}")
+        total_rows += written
 
-        all_dfs.append(df)
+        save_category_data(final_data, filename, progress, user_registry, connection, cursor)
+        print(f"Saved {filename} to database")
+        sampler = None
 
-    if all_dfs:
-        return pd.concat(all_dfs, ignore_index=True), user_product_dict
-    else:
-        return pd.DataFrame(), user_product_dict
+    return total_rows, user_product_dict
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load Amazon review categories into PostgreSQL")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes that download and parse category files in parallel; "
+                             "only worth raising on a multi-core machine, on one core it is slower than the default")
+    parser.add_argument("--with-meta", action="store_true",
+                        help="load product metadata for the newly ingested categories in the same run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     print("Starting main function...")
 
     print("Getting all files...")
     files = get_all_files()
     print(f"Found {len(files)} total files")
 
-    print("Connecting to database...")
-    connection, cursor = connect_to_database()
+    print("Filtering for review files...")
+    review_files = [f for f in files if 'review_categories' in f.lower()]
+    print(f"Found {len(review_files)} review files:")
+    for f in review_files:
+        print(f"  - {f}")
 
-    if not connection:
-        print("Failed to connect to database - exiting")
+    if not review_files:
+        print("No review files found! Check the filtering logic.")
         return
 
+    print("Connecting to database...")
     try:
-        print("Filtering for review files...")
-        review_files = [f for f in files if 'review_categories' in f.lower()]
-        print(f"Found {len(review_files)} review files:")
-        for f in review_files:
-            print(f"  - {f}")
-
-        if not review_files:
-            print("No review files found! Check the filtering logic.")
-            return
-
-        print("Starting to parse review files...")
-        review_df, user_product_dict = parse_review_files(review_files, connection, cursor)
+        with db.connection() as connection, connection.cursor() as cursor:
+            print("Starting to parse review files...")
+            total_rows, user_product_dict = parse_review_files(review_files, connection, cursor, args.workers)
 
-        print(f'Review df shape: {review_df.shape}')
-        if not review_df.empty:
-            print(f'Review df head:\n{review_df.head()}')
+            if total_rows:
+                print(f"Wrote {total_rows} reviews to {REVIEW_DATASET_DIR}/")
+            else:
+                print("No new data to process")
 
-            review_df.to_parquet("amazon_review2_only.parquet", index=False, engine='pyarrow')
-            print("review_df.to_parquet saved")
-        else:
-            print("No new data to process")
+            if args.with_meta and user_product_dict:
+                print("Loading product metadata...")
+                load_meta(connection, cursor, user_product_dict, files)
 
     except Exception as e:
         print(f"Error in main: {e}")
         import traceback
         traceback.print_exc()
     finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+        db.close_pool()
         print("Database connection closed")
 
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,57 @@
+from sklearn.decomposition import TruncatedSVD
+
+from als import AlternatingLeastSquares
+from ivf_index import IVFIndex
+from quantization import QuantizedFactors
+
+
+class MatrixFactorizationRecommender:
+    def __init__(self, n_factors=50, method='svd', **als_params):
+        # method='als' trains implicit-feedback ALS (see als.py for regularization, alpha, weighting, iterations, n_threads)
+        if method not in ('svd', 'als'):
+            raise ValueError(f"unknown method {method!r}; expected 'svd' or 'als'")
+        self.n_factors = n_factors
+        self.method = method
+        self.als_params = als_params
+        self.svd = None
+        self.als = None
+        self.user_factors = None
+        self.item_factors = None
+        self.index = None
+
+    def fit(self, interaction_matrix, csc=None):
+        if self.method == 'als':
+            self.als = AlternatingLeastSquares(n_factors=self.n_factors, **self.als_params)
+            self.als.fit(interaction_matrix, csc)
+            self.user_factors = self.als.user_factors
+            self.item_factors = self.als.item_factors
+        else:
+            self.svd = TruncatedSVD(n_components=self.n_factors, random_state=42)
+
+            self.user_factors = self.svd.fit_transform(interaction_matrix)
+            self.item_factors = self.svd.components_.T
+
+        print(f"Trained {self.method.upper()} with {self.n_factors} factors")
+        print(f"User factors shape: {self.user_factors.shape}")
+        print(f"Item factors shape: {self.item_factors.shape}")
+
+        return self
+
+    def build_index(self, n_lists=None, n_probe=32, directory=None):
+        # approximate top-K over item_factors (see ivf_index.py); reloaded memory-mapped from directory if saved there
+        if directory is not None and IVFIndex.exists(directory):
+            self.index = IVFIndex.load(directory)
+            self.index.n_probe = n_probe
+        else:
+            self.index = IVFIndex.build(self.item_factors, n_lists=n_lists, n_probe=n_probe)
+            if directory is not None:
+                self.index.save(directory)
+        print(f"Built IVF index with {self.index.n_lists} lists, probing {self.index.n_probe}")
+        return self.index
+
+    def quantize(self, dtype='int8'):
+        # replaces item_factors with float16 or per-item-scaled int8 codes (see quantization.py)
+        before = self.item_factors.nbytes
+        self.item_factors = QuantizedFactors.quantize(self.item_factors, dtype)
+        print(f"Quantized item factors to {dtype}: {before / 1024**2:.1f} MB -> {self.item_factors.nbytes / 1024**2:.1f} MB")
+        return self
@@ -0,0 +1,89 @@
+import gzip
+import json
+import zlib
+
+READ_SIZE = 1 << 20
+
+
+def iter_lines(fileobj, read_size=READ_SIZE):
+    pending = []
+    while True:
+        chunk = fileobj.read(read_size)
+        if not chunk:
+            break
+
+        lines = chunk.split(b"\n")
+        if len(lines) == 1:
+            pending.append(chunk)
+            continue
+
+        if pending:
+            pending.append(lines[0])
+            lines[0] = b"".join(pending)
+        tail = lines.pop()
+        pending = [tail] if tail else []
+
+        yield from lines
+
+    if pending:
+        yield b"".join(pending)
+
+
+def iter_gzip_lines(raw, read_size=READ_SIZE):
+    with gzip.GzipFile(fileobj=raw) as decompressor:
+        yield from iter_lines(decompressor, read_size)
+
+
+def parse_line(line):
+    try:
+        return json.loads(line)
+    except UnicodeDecodeError:
+        return json.loads(line.decode("utf-8", errors="ignore"))
+
+
+def iter_gzip_member_lines(raw, offset=0, read_size=READ_SIZE):
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    member_started = False
+    position = offset
+    restart_offset = offset
+    pending = []
+
+    while True:
+        data = raw.read(read_size)
+        if not data:
+            break
+
+        while data:
+            output = decompressor.decompress(data)
+            member_started = True
+            if decompressor.eof:
+                unused = decompressor.unused_data
+                position += len(data) - len(unused)
+                data = unused
+            else:
+                position += len(data)
+                data = b""
+
+            lines = output.split(b"\n")
+            if len(lines) > 1:
+                if pending:
+                    pending.append(lines[0])
+                    lines[0] = b"".join(pending)
+                tail = lines.pop()
+                pending = [tail] if tail else []
+                for line in lines:
+                    yield line, restart_offset
+                    restart_offset = None
+            elif output:
+                pending.append(output)
+
+            if decompressor.eof:
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                member_started = False
+                if not pending:
+                    restart_offset = position
+
+    if member_started and not decompressor.eof:
+        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+    if pending:
+        yield b"".join(pending), restart_offset
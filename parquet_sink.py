@@ -0,0 +1,69 @@
+import json
+import os
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+REVIEW_DATASET_DIR = "amazon_review2_only"
+ROW_GROUP_ROWS = 10000
+
+REVIEW_SCHEMA = pa.schema([
+    ("user_id", pa.string()),
+    ("parent_asin", pa.string()),
+    ("asin", pa.string()),
+    ("rating", pa.float64()),
+    ("title", pa.string()),
+    ("review_text", pa.string()),
+    ("images", pa.string()),
+    ("review_timestamp", pa.int64()),
+    ("verified_purchase", pa.bool_()),
+    ("helpful_vote", pa.int32()),
+])
+
+
+def partition_dir(dataset_dir, column, value):
+    return os.path.join(dataset_dir, f"{column}={value}")
+
+
+def review_batch(records):
+    columns = {
+        "user_id": [r["user_id"] for r in records],
+        "parent_asin": [r["parent_asin"] for r in records],
+        "asin": [r["asin"] for r in records],
+        "rating": [r["rating"] for r in records],
+        "title": [r["title"] for r in records],
+        "review_text": [r["text"] for r in records],
+        "images": [json.dumps(r["images"]) if r["images"] is not None else None for r in records],
+        "review_timestamp": [r["timestamp"] for r in records],
+        "verified_purchase": [r["verified_purchase"] for r in records],
+        "helpful_vote": [r["helpful_votes"] for r in records],
+    }
+    return pa.record_batch(
+        [pa.array(columns[field.name], type=field.type) for field in REVIEW_SCHEMA],
+        schema=REVIEW_SCHEMA
+    )
+
+
+def write_review_partition(records, filename, dataset_dir=REVIEW_DATASET_DIR, batch_rows=ROW_GROUP_ROWS):
+    out_dir = partition_dir(dataset_dir, "filename", filename)
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, "part-0.parquet")
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+
+    records = iter(records)
+    written = 0
+    try:
+        with pq.ParquetWriter(tmp_path, REVIEW_SCHEMA) as writer:
+            while True:
+                batch = list(islice(records, batch_rows))
+                if not batch:
+                    break
+                writer.write_batch(review_batch(batch), row_group_size=len(batch))
+                written += len(batch)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
@@ -0,0 +1,98 @@
+import json
+import os
+
+import numpy as np
+
+CODES_FILE = "codes.npy"
+SCALES_FILE = "scales.npy"
+META_FILE = "quantized.json"
+
+QUANTIZED_DTYPES = ("float16", "int8")
+BLOCK_ITEMS = 4096
+
+
+class QuantizedFactors:
+    """Item factors stored as float16 or int8 codes with one float32 scale per item, scored without ever
+    materialising the float factors.
+
+    Codes are kept factor-major (n_factors x n_items). score dequantizes BLOCK_ITEMS items at a time into a float32
+    buffer that stays in cache, takes the dot products with BLAS, and applies the per-item scales to the scores:
+    x . q = scale * (codes . q), so int8 scoring reads an eighth of the bytes float64 factors do.
+    """
+
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, item_factors, dtype="int8"):
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"unknown dtype {dtype!r}; expected one of {QUANTIZED_DTYPES}")
+        item_factors = np.asarray(item_factors)
+        # symmetric per-item scale: each item's largest magnitude maps to 127, or to 1 for float16, which keeps
+        # small factors such as TruncatedSVD's out of float16's slow and imprecise subnormal range
+        scales = (np.abs(item_factors).max(axis=1) / (127 if dtype == "int8" else 1)).astype(np.float32)
+        scaled = item_factors / np.where(scales > 0, scales, 1)[:, None]
+        codes = np.rint(scaled).astype(np.int8) if dtype == "int8" else scaled.astype(np.float16)
+        return cls(np.ascontiguousarray(codes.T), scales)
+
+    def __len__(self):
+        return self.codes.shape[1]
+
+    @property
+    def shape(self):
+        return self.codes.shape[1], self.codes.shape[0]
+
+    @property
+    def dtype(self):
+        # the dtype scores come back in
+        return np.dtype(np.float32)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def dequantize(self):
+        """float32 (n_items, n_factors) factors, factor-major like the ones they were quantized from."""
+        return (self.codes.astype(np.float32) * self.scales).T
+
+    def __array__(self, dtype=None, copy=None):
+        factors = self.dequantize()
+        return factors if dtype is None else factors.astype(dtype)
+
+    def score(self, queries, block_items=BLOCK_ITEMS):
+        """queries @ factors.T: (n_items,) scores for one query vector, (n_queries, n_items) for a block of them."""
+        queries = np.asarray(queries, dtype=np.float32)
+        n_factors, n_items = self.codes.shape
+        scores = np.empty(queries.shape[:-1] + (n_items,), dtype=np.float32)
+        buffer = np.empty((n_factors, min(block_items, n_items)), dtype=np.float32)
+        for start in range(0, n_items, block_items):
+            block = self.codes[:, start:start + block_items]
+            dequantized = buffer[:, :block.shape[1]]
+            np.copyto(dequantized, block, casting="unsafe")
+            end = start + block.shape[1]
+            if queries.ndim == 1:
+                np.dot(queries, dequantized, out=scores[start:end])
+            else:
+                # a column slice of a block's scores is not contiguous, so dot cannot write it in place
+                scores[:, start:end] = queries @ dequantized
+        scores *= self.scales
+        return scores
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, CODES_FILE), self.codes)
+        np.save(os.path.join(directory, SCALES_FILE), self.scales)
+        with open(os.path.join(directory, META_FILE), "w") as f:
+            json.dump({"n_items": len(self), "n_factors": self.shape[1], "dtype": str(self.codes.dtype)}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mmap_mode = "r" if mmap else None
+        codes = np.load(os.path.join(directory, CODES_FILE), mmap_mode=mmap_mode)
+        scales = np.load(os.path.join(directory, SCALES_FILE), mmap_mode=mmap_mode)
+        return cls(codes, scales)
+
+    @classmethod
+    def exists(cls, directory):
+        return all(os.path.exists(os.path.join(directory, name)) for name in (CODES_FILE, SCALES_FILE, META_FILE))
@@ -0,0 +1,59 @@
+import numpy as np
+
+from quantization import QuantizedFactors
+
+
+def top_k(scores, k):
+    """(indices, scores) of the k largest scores along the last axis, best first.
+
+    argpartition picks the candidates in linear time, so only k values are ever sorted.
+    """
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        empty = np.empty(scores.shape[:-1] + (0,))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+    candidates = np.argpartition(scores, -k, axis=-1)[..., -k:]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1), np.take_along_axis(candidate_scores, order, axis=-1)
+
+
+def score_items(queries, item_factors):
+    """queries @ item_factors.T: (n_items,) scores for one query vector, (n_queries, n_items) for a block of them."""
+    if isinstance(item_factors, QuantizedFactors):
+        return item_factors.score(queries)
+    # float64 user factors against float32 items would upcast the whole item matrix on every call
+    queries = queries.astype(item_factors.dtype, copy=False)
+    return item_factors @ queries if queries.ndim == 1 else queries @ item_factors.T
+
+
+def mask_seen(scores, interactions, user_codes):
+    # -inf on every item in each user's CSR row, read straight from indptr/indices
+    if scores.ndim == 1:
+        scores[interactions.indices[interactions.indptr[user_codes]:interactions.indptr[user_codes + 1]]] = -np.inf
+        return scores
+    starts, ends = interactions.indptr[user_codes], interactions.indptr[user_codes + 1]
+    lengths = ends - starts
+    before = np.cumsum(lengths) - lengths
+    positions = np.arange(lengths.sum()) + np.repeat(starts - before, lengths)
+    scores[np.repeat(np.arange(len(user_codes)), lengths), interactions.indices[positions]] = -np.inf
+    return scores
+
+
+def recommend(user_code, user_factors, item_factors, interactions, k=10):
+    """Item codes and scores of the k best items the user has not interacted with."""
+    scores = score_items(user_factors[user_code], item_factors)
+    mask_seen(scores, interactions, user_code)
+    items, item_scores = top_k(scores, k)
+    keep = np.isfinite(item_scores)
+    return items[keep], item_scores[keep]
+
+
+def recommend_batch(user_codes, user_factors, item_factors, interactions, k=10):
+    """recommend for many users at once: (n_users, k) item codes and scores, -1 and -inf where a user has
+    fewer than k unseen items."""
+    user_codes = np.asarray(user_codes)
+    scores = score_items(user_factors[user_codes], item_factors)
+    mask_seen(scores, interactions, user_codes)
+    items, item_scores = top_k(scores, k)
+    return np.where(np.isfinite(item_scores), items, -1), item_scores
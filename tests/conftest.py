@@ -0,0 +1,56 @@
+import os
+import uuid
+
+import psycopg2
+import pytest
+
+import db
+
+
+@pytest.fixture
+def pg_connect():
+    """connect(name) opens a connection whose search_path is a throwaway schema for name, in the TEST_DBNAME
+    database reached with the usual DB_* settings; connections for the same name share a schema, whose
+    connection parameters connect.params(name) returns. Skipped when TEST_DBNAME is not set."""
+    dbname = os.getenv("TEST_DBNAME")
+    if not dbname:
+        pytest.skip("TEST_DBNAME is not set")
+    params = db.connection_params() | {"dbname": dbname}
+    run_id = uuid.uuid4().hex[:8]
+    schemas = {}
+    connections = []
+
+    def schema_params(name="main"):
+        schema = schemas.get(name)
+        if schema is None:
+            schema = schemas[name] = f"test_{run_id}_{name}"
+            with psycopg2.connect(**params) as connection, connection.cursor() as cursor:
+                cursor.execute(f"CREATE SCHEMA {schema}")
+            connection.close()
+        return params | {"options": f"{params['options']} -c search_path={schema}"}
+
+    def connect(name="main"):
+        connection = psycopg2.connect(**schema_params(name))
+        connections.append(connection)
+        return connection
+
+    connect.params = schema_params
+    yield connect
+
+    for connection in connections:
+        connection.close()
+    if schemas:
+        with psycopg2.connect(**params) as connection, connection.cursor() as cursor:
+            for schema in schemas.values():
+                cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+        connection.close()
+
+
+@pytest.fixture
+def pg_pool(pg_connect, monkeypatch):
+    """db's shared pool, connected to pg_connect's "main" schema, for code that opens its own connections."""
+    params = pg_connect.params()
+    monkeypatch.setattr(db, "connection_params", lambda statement_timeout=db.STATEMENT_TIMEOUT_MS: params)
+    db.close_pool()
+    yield db.get_pool()
+    db.close_pool()
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from als import AlternatingLeastSquares, solve_block
+from matrix_factorization import MatrixFactorizationRecommender
+
+
+def random_weights(n_rows, n_columns, density, seed):
+    rng = np.random.default_rng(seed)
+    weights = sp.random(n_rows, n_columns, density=density, format="csr", random_state=seed, dtype=np.float64)
+    weights.data = rng.uniform(1, 40, weights.nnz)
+    return weights
+
+
+def normal_equations(weights, Y, regularization):
+    # (A_u, b_u) of every row: A_u = YtY + Y^T diag(w) Y + regularization * I, b_u = Y^T (1 + w) over observed items
+    for u in range(weights.shape[0]):
+        w = weights[u].toarray().ravel()
+        yield Y.T @ Y + Y.T @ (w[:, None] * Y) + regularization * np.eye(Y.shape[1]), Y.T @ ((1 + w) * (w > 0))
+
+
+def exact_solution(weights, Y, regularization):
+    return np.array([np.linalg.solve(A, b) for A, b in normal_equations(weights, Y, regularization)])
+
+
+def test_block_cg_converges_to_the_normal_equations():
+    n_factors = 6
+    weights = random_weights(40, 30, 0.2, seed=0)
+    Y = np.random.default_rng(1).standard_normal((30, n_factors))
+    expected = exact_solution(weights, Y, 0.1)
+    # conjugate gradient is exact after n_factors steps, up to rounding
+    solved = solve_block(weights, np.zeros((40, n_factors)), Y, Y.T @ Y, 0.1, cg_steps=n_factors + 2)
+    assert np.allclose(solved, expected, rtol=1e-6, atol=1e-8)
+
+
+def test_warm_started_steps_reduce_the_error():
+    weights = random_weights(20, 50, 0.1, seed=2)
+    Y = np.random.default_rng(3).standard_normal((50, 10))
+    expected = exact_solution(weights, Y, 0.5)
+    systems = list(normal_equations(weights, Y, 0.5))
+    X = np.zeros((20, 10))
+    errors = []
+    for _ in range(4):
+        X = solve_block(weights, X, Y, Y.T @ Y, 0.5, cg_steps=1)
+        # each warm-started step lowers every row's error in the norm of its own system
+        errors.append([(x - e) @ A @ (x - e) for x, e, (A, _) in zip(X, expected, systems)])
+    errors = np.array(errors)
+    assert np.all(np.diff(errors, axis=0) <= 1e-9)
+    assert errors[-1].sum() < errors[0].sum() / 2
+
+
+def test_empty_rows_solve_to_zero():
+    weights = sp.csr_matrix((3, 8))
+    Y = np.random.default_rng(4).standard_normal((8, 4))
+    assert np.all(solve_block(weights, np.zeros((3, 4)), Y, Y.T @ Y, 0.1, 3) == 0)
+
+
+def grouped_ratings(n_users=60, n_items=40, seed=5):
+    # two taste groups: users rate half of their own group's items and none of the other group's
+    rng = np.random.default_rng(seed)
+    user_group = np.arange(n_users) % 2
+    item_group = np.arange(n_items) % 2
+    ratings = np.zeros((n_users, n_items), dtype=np.float32)
+    for u in range(n_users):
+        own = np.flatnonzero(item_group == user_group[u])
+        chosen = rng.choice(own, len(own) // 2, replace=False)
+        ratings[u, chosen] = rng.integers(3, 6, len(chosen))
+    return sp.csr_matrix(ratings), user_group, item_group
+
+
+def test_fit_ranks_positives_above_other_group_items():
+    matrix, user_group, item_group = grouped_ratings()
+    model = AlternatingLeastSquares(n_factors=4, iterations=10, n_threads=2, block_rows=16).fit(matrix, verbose=False)
+    assert model.user_factors.dtype == np.float32 and model.item_factors.flags.f_contiguous
+    scores = model.user_factors @ model.item_factors.T
+    dense = matrix.toarray()
+    for u in range(matrix.shape[0]):
+        positives = scores[u, dense[u] > 0]
+        negatives = scores[u, item_group != user_group[u]]
+        assert positives.min() > negatives.max()
+
+
+def test_csc_argument_gives_the_same_factors():
+    matrix, _, _ = grouped_ratings(20, 12, seed=6)
+    params = dict(n_factors=3, iterations=3, n_threads=1)
+    plain = AlternatingLeastSquares(**params).fit(matrix, verbose=False)
+    with_csc = AlternatingLeastSquares(**params).fit(matrix, matrix.tocsc(), verbose=False)
+    assert np.allclose(plain.item_factors, with_csc.item_factors)
+
+
+def test_recommender_method_switch():
+    matrix, _, _ = grouped_ratings(30, 20, seed=7)
+    als = MatrixFactorizationRecommender(n_factors=3, method="als", iterations=2, n_threads=1).fit(matrix)
+    assert als.als is not None and als.svd is None
+    assert als.als.iterations == 2
+    assert als.user_factors is als.als.user_factors and als.item_factors.shape == (20, 3)
+
+    svd = MatrixFactorizationRecommender(n_factors=3).fit(matrix)
+    assert svd.svd is not None and svd.als is None
+    assert svd.user_factors.shape == (30, 3) and svd.item_factors.shape == (20, 3)
+
+    with pytest.raises(ValueError):
+        MatrixFactorizationRecommender(method="nmf")
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from amazon_dataset import ensure_partitioned, load_interactions, read_frame, write_interactions, write_partitioned
+from benchmarks.fixtures import synthetic_amazon_df
+from id_index import IdIndex
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    df = synthetic_amazon_df(5000, n_users=800, n_items=600, n_files=5, seed=3)
+    path = str(tmp_path / "amazon_df")
+    write_partitioned(df, path, row_group_rows=512)
+    return df, path
+
+
+def assert_codes_match(frame, full):
+    users = dict(zip(full["user_id"].astype(str), full["user_idx"]))
+    items = dict(zip(full["parent_asin"].astype(str), full["item_idx"]))
+    assert frame["user_idx"].tolist() == [users[u] for u in frame["user_id"].astype(str)]
+    assert frame["item_idx"].tolist() == [items[i] for i in frame["parent_asin"].astype(str)]
+
+
+@pytest.mark.parametrize("filters", [
+    [("main_category", "=", "Category 02")],
+    [("rating", ">=", 4.0)],
+    [("user_id", "in", ["U000000000000000000000000007", "U000000000000000000000000799"])],
+])
+def test_filtered_codes_agree_with_a_full_read(dataset, filters):
+    df, path = dataset
+    columns = ["user_id", "parent_asin", "user_idx", "item_idx"]
+    full = load_interactions(columns, path=path)
+    filtered = load_interactions(columns, filters=filters, path=path)
+    assert 0 < len(filtered) < len(full)
+    assert_codes_match(filtered, full)
+    # and with the codes an IdIndex over the dataset's ids gives, as the README promises
+    assert np.array_equal(filtered["user_idx"], IdIndex.build(df["user_id"]).encode(filtered["user_id"]))
+
+
+def test_codes_only_read_with_filters(dataset):
+    _, path = dataset
+    full = load_interactions(["user_id", "parent_asin", "user_idx", "item_idx"], path=path)
+    filtered = load_interactions(["user_idx", "item_idx"], filters=[("main_category", "=", "Category 04")], path=path)
+    assert list(filtered.columns) == ["user_idx", "item_idx"]
+    assert set(filtered["user_idx"]) <= set(full["user_idx"])
+    assert filtered["user_idx"].max() > filtered["user_idx"].nunique()
+
+
+def test_codes_from_given_indexes(dataset):
+    df, path = dataset
+    users = IdIndex.build(df["user_id"].iloc[:100])
+    frame = load_interactions(["user_id", "user_idx"], filters=[("rating", "=", 5.0)], path=path,
+                              indexes={"user_idx": users})
+    assert np.array_equal(frame["user_idx"], users.encode(frame["user_id"]))
+    assert (frame["user_idx"] == -1).any()
+
+
+def test_default_partition_reads_back_as_empty_category(dataset):
+    df, path = dataset
+    missing = int((df["main_category"].isna() | (df["main_category"] == "")).sum())
+    assert missing
+    frame = read_frame(["user_id", "main_category"], path=path)
+    compact = load_interactions(["main_category"], path=path)
+    filtered = load_interactions(["main_category"], filters=[("rating", ">=", 3.0)], path=path)
+    for categories in (frame["main_category"], compact["main_category"], filtered["main_category"]):
+        assert not categories.isna().any()
+    assert (frame["main_category"] == "").sum() == (compact["main_category"] == "").sum() == missing
+    assert "" in filtered["main_category"].cat.categories
+
+
+def test_partitions_are_built_once_from_the_single_file(tmp_path):
+    df = synthetic_amazon_df(3000, n_users=500, n_items=400, n_files=4, seed=5)
+    source = str(tmp_path / "amazon_df.parquet")
+    write_interactions(df, source)
+    path = str(tmp_path / "amazon_df")
+
+    assert ensure_partitioned(path, source) == path
+    frame = read_frame(["user_id", "parent_asin", "rating"], path=path)
+    expected = df[["user_id", "parent_asin", "rating"]].sort_values(["user_id", "parent_asin", "rating"])
+    assert frame.sort_values(["user_id", "parent_asin", "rating"]).to_numpy().tolist() == expected.to_numpy().tolist()
+
+    built = {p: p.stat().st_mtime_ns for p in (tmp_path / "amazon_df").rglob("*.parquet")}
+    ensure_partitioned(path, source)
+    assert {p: p.stat().st_mtime_ns for p in (tmp_path / "amazon_df").rglob("*.parquet")} == built
+
+
+def test_missing_single_file_points_at_the_cleaning_stage(tmp_path):
+    with pytest.raises(FileNotFoundError, match="clean_reviews"):
+        ensure_partitioned(str(tmp_path / "amazon_df"), str(tmp_path / "amazon_df.parquet"))
@@ -0,0 +1,104 @@
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+import scipy.sparse as sp
+
+from batch_scoring import block_users, export_recommendations, load_recommendations, score_blocks
+from id_index import IdIndex
+from retrieval import recommend
+
+N_USERS, N_ITEMS, K = 101, 60, 5
+# 0.05 MB over three threads of 60 float32 scores plus int64 indices per user: blocks of 24 users, the last of 5
+BUDGET_MB, THREADS, BLOCK = 0.05, 3, 24
+
+
+@pytest.fixture
+def model():
+    rng = np.random.default_rng(0)
+    user_factors = rng.standard_normal((N_USERS, 8)).astype(np.float32)
+    item_factors = rng.standard_normal((N_ITEMS, 8)).astype(np.float32)
+    seen = sp.random(N_USERS, N_ITEMS, density=0.2, format="lil", random_state=1, dtype=np.float32)
+    seen[7, :] = 1  # a user who has seen every item
+    seen[8, 3:] = 1  # and one with fewer than K unseen items left
+    seen = seen.tocsr()
+    user_index = IdIndex.build([f"U{u:04d}" for u in range(N_USERS)])
+    item_index = IdIndex.build([f"B{i:04d}" for i in range(N_ITEMS)])
+    return user_factors, item_factors, seen, user_index, item_index
+
+
+def test_block_size_follows_the_memory_budget():
+    assert block_users(N_ITEMS, 4, THREADS, BUDGET_MB) == BLOCK
+    assert block_users(10 ** 9, 8, 64, 1) == 1
+
+
+def test_blocks_cover_every_user_in_order(model):
+    user_factors, item_factors, seen, _, _ = model
+    blocks = list(score_blocks(user_factors, item_factors, seen, K, THREADS, BUDGET_MB))
+    sizes = [len(users) for users, _, _ in blocks]
+    assert sizes == [BLOCK] * (N_USERS // BLOCK) + [N_USERS % BLOCK]
+    assert np.concatenate([users for users, _, _ in blocks]).tolist() == list(range(N_USERS))
+
+
+def expected_rows(model, user_codes):
+    user_factors, item_factors, seen, user_index, item_index = model
+    rows = []
+    for user in user_codes:
+        items, scores = recommend(user, user_factors, item_factors, seen, K)
+        user_id = user_index.decode([user])[0]
+        rows += [(user_id, rank, item_id, score)
+                 for rank, (item_id, score) in enumerate(zip(item_index.decode(items), scores), 1)]
+    return rows
+
+
+def exported_rows(path):
+    table = pq.read_table(path)
+    return list(zip(*(table.column(name).to_pylist() for name in ("user_id", "rank", "parent_asin", "score"))))
+
+
+def assert_same_rows(rows, expected):
+    assert [row[:3] for row in rows] == [row[:3] for row in expected]
+    assert np.allclose([row[3] for row in rows], [row[3] for row in expected], rtol=1e-6)
+
+
+@pytest.mark.parametrize("user_codes", [None, np.array([3, 7, 8, 50, 100])])
+def test_export_matches_per_user_recommend(model, tmp_path, user_codes):
+    path = str(tmp_path / "user_recommendations.parquet")
+    written = export_recommendations(*model, path=path, k=K, n_threads=THREADS, memory_budget_mb=BUDGET_MB,
+                                     user_codes=user_codes)
+    expected = expected_rows(model, range(N_USERS) if user_codes is None else user_codes)
+    rows = exported_rows(path)
+    assert written == len(rows) == len(expected)
+    assert_same_rows(rows, expected)
+    assert "U0007" not in {row[0] for row in rows}
+    assert len([row for row in rows if row[0] == "U0008"]) == 3
+
+
+def test_failed_export_leaves_no_partial_file(model, tmp_path):
+    path = tmp_path / "user_recommendations.parquet"
+    user_factors, item_factors, seen, user_index, _ = model
+    with pytest.raises(IndexError):
+        # an item index too short for the factors fails while writing
+        export_recommendations(user_factors, item_factors, seen, user_index, IdIndex.build(["B0000"]),
+                               path=str(path), k=K)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_load_recommendations_round_trip(model, tmp_path, pg_pool):
+    path = str(tmp_path / "user_recommendations.parquet")
+    export_recommendations(*model, path=path, k=K, n_threads=THREADS, memory_budget_mb=BUDGET_MB)
+    assert load_recommendations(path) == len(exported_rows(path))
+    # loading again swaps in a fresh table rather than appending
+    copied = load_recommendations(path)
+
+    connection = pg_pool.getconn()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT user_id, rank, parent_asin, score FROM user_recommendations ORDER BY user_id, rank")
+            rows = cursor.fetchall()
+            cursor.execute("SELECT count(*) FROM pg_tables WHERE tablename = 'user_recommendations_staging'")
+            assert cursor.fetchone()[0] == 0
+        connection.rollback()
+    finally:
+        pg_pool.putconn(connection)
+    assert len(rows) == copied
+    assert_same_rows(rows, exported_rows(path))
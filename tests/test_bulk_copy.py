@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from bulk_copy import copy_rows, encode_value, json_text
+
+TRICKY_VALUES = [
+    "C:\\u0000x",
+    ["\\u0000"],
+    {"path": "C:\\\\u0000", "nul\x00key": "a\x00b"},
+    ["plain", {"nested": ["x\x00y", 1, None, True]}],
+]
+
+
+def test_json_text_drops_nul_characters_only():
+    assert json.loads(json_text("C:\\u0000x")) == "C:\\u0000x"
+    assert json.loads(json_text(["\\u0000"])) == ["\\u0000"]
+    assert json.loads(json_text({"nul\x00key": "a\x00b"})) == {"nulkey": "ab"}
+    assert json.loads(json_text(["x", {"n": ["x\x00y", 1, None, True]}])) == ["x", {"n": ["xy", 1, None, True]}]
+    assert "\\u0000" not in json_text(["\x00"])
+
+
+def test_encode_value_writes_json_for_lists_and_dicts():
+    assert encode_value(["a\x00", "\\u0000"]) == '"[""a"", ""\\\\u0000""]"'
+    assert encode_value(None) == ""
+    assert encode_value(True) == "t"
+
+
+@pytest.mark.parametrize("value", TRICKY_VALUES)
+def test_tricky_values_copy_into_jsonb(pg_connect, value):
+    connection = pg_connect()
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE documents (body JSONB)")
+        # lists and dicts are encoded by copy_rows; a bare string is encoded by the caller, as meta_value does
+        assert copy_rows(cursor, "documents", ["body"], [(json_text(value) if isinstance(value, str) else value,)]) == 1
+        cursor.execute("SELECT body FROM documents")
+        assert cursor.fetchone()[0] == json.loads(json_text(value))
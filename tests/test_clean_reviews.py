@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from benchmarks.bench_category_repair import repair_loop
+from benchmarks.fixtures import synthetic_amazon_df
+from clean_reviews import repair_main_category
+
+
+def frame(filenames, categories):
+    return pd.DataFrame({"filename": filenames, "main_category": categories, "rating": range(len(filenames))})
+
+
+def test_missing_categories_take_the_file_mode():
+    df = frame(["Books.jsonl"] * 5 + ["Toys.jsonl"] * 2,
+               ["Books", "Books", "Kindle", "", None, "Toys", None])
+    assert repair_main_category(df, verbose=False) == 3
+    assert df["main_category"].tolist() == ["Books", "Books", "Kindle", "Books", "Books", "Toys", "Toys"]
+
+
+def test_ties_break_alphabetically():
+    df = frame(["Books.jsonl"] * 5, ["Zines", "Audible", "Zines", "Audible", ""])
+    assert repair_main_category(df, verbose=False) == 1
+    assert df["main_category"].iloc[-1] == "Audible"
+
+
+def test_files_without_a_valid_category_are_left_alone(capsys):
+    df = frame(["Books.jsonl", "Books.jsonl", "Gift_Cards.jsonl", "Gift_Cards.jsonl"],
+               ["Books", None, None, ""])
+    assert repair_main_category(df) == 1
+    assert df["main_category"].iloc[1] == "Books"
+    assert df["main_category"].iloc[2:].isna().tolist() == [True, False]
+    out = capsys.readouterr().out
+    assert "Fixed Books.jsonl: Books" in out
+    assert "Warning: No valid main_category found for Gift_Cards.jsonl" in out
+
+
+def test_nothing_to_repair():
+    df = frame(["Books.jsonl"], ["Books"])
+    assert repair_main_category(df) == 0
+
+
+def test_categorical_columns_keep_their_dtype():
+    df = frame(["Books.jsonl"] * 5 + ["Toys.jsonl"] * 2,
+               ["Zines", "Audible", "Zines", "Audible", None, None, ""])
+    # categories deliberately out of alphabetical order, as a dictionary-encoded Parquet column can be
+    df["main_category"] = pd.Categorical(df["main_category"], categories=["Zines", "", "Audible"])
+    df["filename"] = df["filename"].astype("category")
+    assert repair_main_category(df, verbose=False) == 1
+    assert isinstance(df["main_category"].dtype, pd.CategoricalDtype)
+    assert df["main_category"].iloc[4] == "Audible"
+    assert df["main_category"].iloc[5:].isna().tolist() == [True, False]
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_matches_the_notebook_loop(seed):
+    df = synthetic_amazon_df(20000, n_users=2000, n_items=1000, n_files=7, missing_category=0.2, seed=seed)
+    expected = df.copy()
+    repair_loop(expected)
+    repair_main_category(df, verbose=False)
+    assert df["main_category"].equals(expected["main_category"])
@@ -0,0 +1,258 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import psycopg2
+import psycopg2.errors
+import pytest
+from psycopg2 import extensions, pool
+
+import db
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=None):
+        self.connection.statements.append((query, params))
+        self.connection.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+
+
+class FakeConnection:
+    def __init__(self, closed=0):
+        self.closed = closed
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakePool:
+    """Hands out at most size connections at once and raises PoolError beyond that, like ThreadedConnectionPool."""
+
+    def __init__(self, size, connections=()):
+        self.size = size
+        self.closed = False
+        self.idle = list(connections)
+        self.checked_out = 0
+        self.peak = 0
+        self.returned = []
+        self.lock = threading.Lock()
+
+    def getconn(self):
+        with self.lock:
+            if self.checked_out >= self.size:
+                raise pool.PoolError("connection pool exhausted")
+            self.checked_out += 1
+            self.peak = max(self.peak, self.checked_out)
+            return self.idle.pop(0) if self.idle else FakeConnection()
+
+    def putconn(self, connection, close=False):
+        with self.lock:
+            self.checked_out -= 1
+            self.returned.append((connection, close))
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    fake = FakePool(db.POOL_SIZE)
+    monkeypatch.setattr(db, "_pool", fake)
+    return fake
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(db.time, "sleep", delays.append)
+    return delays
+
+
+def failing(errors, result="done"):
+    # a callable that raises the given errors on its first calls, then returns result
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    func.calls = calls
+    return func
+
+
+def test_retry_backs_off_on_transient_errors(sleeps):
+    func = failing([psycopg2.OperationalError("server closed the connection"), psycopg2.InterfaceError("closed")])
+    assert db.retry(func, retries=3, backoff=0.5) == "done"
+    assert len(func.calls) == 3
+    assert len(sleeps) == 2
+    assert 0.5 <= sleeps[0] <= 1.0 and 1.0 <= sleeps[1] <= 2.0
+
+
+def test_retry_gives_up_after_retries(sleeps):
+    func = failing([psycopg2.OperationalError("down")] * 5)
+    with pytest.raises(psycopg2.OperationalError):
+        db.retry(func, retries=2, backoff=0.1)
+    assert len(func.calls) == 3
+    assert len(sleeps) == 2
+
+
+@pytest.mark.parametrize("error", [
+    psycopg2.errors.QueryCanceled("canceling statement due to statement timeout"),
+    psycopg2.ProgrammingError("syntax error"),
+    ValueError("not a database error"),
+])
+def test_retry_does_not_repeat_permanent_errors(sleeps, error):
+    func = failing([error])
+    with pytest.raises(type(error)):
+        db.retry(func, retries=3)
+    assert len(func.calls) == 1
+    assert sleeps == []
+
+
+def test_connection_params_set_default_statement_timeout():
+    assert db.connection_params(2500)["options"] == "-c statement_timeout=2500"
+    assert db.connection_params()["options"] == f"-c statement_timeout={db.STATEMENT_TIMEOUT_MS}"
+
+
+def test_transaction_sets_local_statement_timeout_and_commits():
+    connection = FakeConnection()
+    with db.transaction(connection, "testing", statement_timeout=1500):
+        pass
+    assert connection.statements == [("SET LOCAL statement_timeout = %s", (1500,))]
+    assert connection.commits == 1
+
+
+def test_transaction_rolls_back_database_errors():
+    connection = FakeConnection()
+    with pytest.raises(psycopg2.DataError):
+        with db.transaction(connection, "testing"):
+            raise psycopg2.DataError("bad value")
+    assert (connection.commits, connection.rollbacks, connection.statements) == (0, 1, [])
+
+
+@pytest.mark.parametrize("error", [ValueError("bad row"), KeyError("missing"), KeyboardInterrupt()])
+def test_transaction_rolls_back_any_failure(capsys, error):
+    connection = FakeConnection()
+    with pytest.raises(type(error)):
+        with db.transaction(connection, "testing"):
+            raise error
+    assert (connection.commits, connection.rollbacks) == (0, 1)
+    assert capsys.readouterr().out.startswith("Error testing:")
+
+
+def test_transaction_rolls_back_when_its_generator_is_closed():
+    connection = FakeConnection()
+
+    def rows():
+        with db.transaction(connection, "testing"):
+            yield 1
+            yield 2
+
+    batches = rows()
+    next(batches)
+    batches.close()
+    assert (connection.commits, connection.rollbacks) == (0, 1)
+
+
+def test_run_transaction_retries_on_operational_error(fake_pool, sleeps):
+    attempts = []
+
+    def work(cursor, value):
+        attempts.append(cursor.connection)
+        cursor.execute("UPDATE t SET v = %s", (value,))
+        if len(attempts) == 1:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        return value * 2
+
+    assert db.run_transaction("testing", work, 21, statement_timeout=800, retries=2) == 42
+    assert len(attempts) == 2 and len(sleeps) == 1
+    first, second = attempts
+    assert first.rollbacks == 1 and first.commits == 0
+    assert second.commits == 1
+    assert second.statements[0] == ("SET LOCAL statement_timeout = %s", (800,))
+    assert fake_pool.checked_out == 0
+
+
+def test_connection_rolls_back_and_returns_on_error(fake_pool):
+    with pytest.raises(RuntimeError):
+        with db.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            raise RuntimeError("caller failed")
+    assert connection.rollbacks == 1
+    assert fake_pool.returned == [(connection, False)]
+    assert fake_pool.checked_out == 0
+
+
+def test_closed_connection_is_replaced_on_checkout(monkeypatch):
+    stale = FakeConnection(closed=2)
+    fake = FakePool(db.POOL_SIZE, [stale])
+    monkeypatch.setattr(db, "_pool", fake)
+    with db.connection() as connection:
+        assert connection is not stale
+    assert fake.returned == [(stale, True), (connection, False)]
+
+
+def test_checkouts_never_exceed_pool_size(fake_pool):
+    threads = db.POOL_SIZE * 4
+    start = threading.Barrier(threads)
+    errors = []
+
+    def worker():
+        try:
+            start.wait()
+            for _ in range(5):
+                with db.connection():
+                    time.sleep(0.002)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    assert errors == []
+    assert fake_pool.peak == db.POOL_SIZE
+    assert fake_pool.checked_out == 0
+
+
+def test_nested_connection_raises_instead_of_waiting(fake_pool):
+    with db.connection() as outer:
+        with pytest.raises(RuntimeError, match="already open in this thread"):
+            with db.connection():
+                pass
+        # other threads can still check out a connection while this one holds its own
+        others = []
+
+        def other_thread():
+            with db.connection() as connection:
+                others.append(connection)
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        assert others and others[0] is not outer
+    with db.connection():
+        pass
+    assert fake_pool.checked_out == 0
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from benchmarks.fixtures import serve_directory
+from download_cache import DownloadCache
+
+
+@pytest.fixture
+def served(tmp_path):
+    directory = tmp_path / "served"
+    directory.mkdir()
+    payload = os.urandom(3 * 1024 ** 2 + 17)
+    (directory / "Books.jsonl.gz").write_bytes(payload)
+    return directory, payload
+
+
+def part_files(cache_dir):
+    return [name for name in os.listdir(os.path.join(cache_dir, "blobs")) if name.endswith(".part")]
+
+
+@pytest.mark.parametrize("ranges", [False, True])
+def test_second_run_reads_from_cache_without_network(tmp_path, served, ranges):
+    directory, payload = served
+    cache_dir = str(tmp_path / "cache")
+    log = []
+    with serve_directory(str(directory), ranges=ranges, log=log) as base_url:
+        url = base_url + "Books.jsonl.gz"
+        first = DownloadCache(cache_dir)
+        assert first.read_bytes(url) == payload
+        assert first.network_requests == 1
+        assert [status for _, status, _, _ in log] == [200]
+
+        # a fresh cache object, as the next run of the loader would create
+        second = DownloadCache(cache_dir)
+        assert second.read_bytes(url) == payload
+        with second.open(url, offset=1000) as reader:
+            assert reader.read(500) == payload[1000:1500]
+        assert second.network_requests == 0
+        assert len(log) == 1
+    assert not part_files(cache_dir)
+
+
+def test_expired_entry_is_revalidated_without_a_transfer(tmp_path, served):
+    directory, payload = served
+    cache_dir = str(tmp_path / "cache")
+    log = []
+    with serve_directory(str(directory), ranges=True, log=log) as base_url:
+        url = base_url + "Books.jsonl.gz"
+        assert DownloadCache(cache_dir).read_bytes(url) == payload
+
+        cache = DownloadCache(cache_dir, max_age=0)
+        assert cache.read_bytes(url) == payload
+        assert cache.network_requests == 1
+        assert [status for _, status, _, _ in log] == [200, 304]
+
+
+def test_truncated_part_file_resumes_with_range_request(tmp_path, served):
+    directory, payload = served
+    cache_dir = str(tmp_path / "cache")
+    log = []
+    with serve_directory(str(directory), ranges=True, log=log) as base_url:
+        url = base_url + "Books.jsonl.gz"
+        interrupted = DownloadCache(cache_dir)
+        with interrupted.open(url) as reader:
+            head = reader.read(1024 ** 2)
+        [part] = part_files(cache_dir)
+        part_path = os.path.join(cache_dir, "blobs", part)
+        assert os.path.getsize(part_path) == len(head)
+        # bytes a killed process wrote after its last commit, which the cache must not trust
+        with open(part_path, "ab") as f:
+            f.write(b"\0" * 4096)
+
+        resumed = DownloadCache(cache_dir)
+        assert resumed.read_bytes(url) == payload
+        assert resumed.network_requests == 1
+        path, status, requested, if_range = log[-1]
+        assert (status, requested) == (206, f"bytes={len(head)}-")
+        assert if_range is not None
+        assert not part_files(cache_dir)
+
+        assert DownloadCache(cache_dir).read_bytes(url) == payload
+        assert len(log) == 2
+
+
+def test_file_changed_on_server_discards_partial_copy(tmp_path, served):
+    directory, payload = served
+    cache_dir = str(tmp_path / "cache")
+    log = []
+    with serve_directory(str(directory), ranges=True, log=log) as base_url:
+        url = base_url + "Books.jsonl.gz"
+        with DownloadCache(cache_dir).open(url) as reader:
+            reader.read(1024 ** 2)
+
+        changed = os.urandom(len(payload))
+        (directory / "Books.jsonl.gz").write_bytes(changed)
+        os.utime(directory / "Books.jsonl.gz", (1e9, 1e9))
+
+        cache = DownloadCache(cache_dir)
+        with pytest.raises(IOError), cache.open(url) as reader:
+            reader.read()
+        # the If-Range validator no longer matched, so the server sent the whole new file instead of a range
+        assert log[-1][1] == 200
+        assert not part_files(cache_dir)
+
+        assert DownloadCache(cache_dir).read_bytes(url) == changed
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from id_index import IdIndex, table_size
+
+IDS = ["B0C1", "A9", "AGZZXSMMS4WRHHJRBUJZI4FZDHKQ", "B0C1", "A10", "Zz"]
+
+
+def test_build_encode_decode_round_trip():
+    index = IdIndex.build(IDS)
+    distinct = sorted(set(IDS))
+    assert len(index) == len(distinct)
+    # codes are positions among the byte-wise sorted distinct ids
+    assert index.encode(distinct).tolist() == list(range(len(distinct)))
+    assert index.decode(index.encode(IDS)).tolist() == IDS
+
+
+def test_unknown_and_missing_ids_encode_to_minus_one():
+    index = IdIndex.build(IDS)
+    assert index.encode(["A9", "nope", None, "", "B0C"]).tolist() == [index.encode(["A9"])[0], -1, -1, -1, -1]
+    assert index.decode([-1, 0]).tolist() == [None, "A10"]
+
+
+def test_ids_longer_than_the_key_width():
+    index = IdIndex.build(["abc", "abd"])
+    # a longer id must not be truncated into a match for one of the keys
+    assert index.encode(["abcd", "abdabd", "abc"]).tolist() == [-1, -1, 0]
+
+
+def test_non_ascii_ids():
+    ids = ["café", "cafe", "日本", "naïve", "café"]
+    index = IdIndex.build(ids)
+    assert index.decode(index.encode(ids)).tolist() == ids
+    expected = sorted(range(len(ids)), key=lambda i: ids[i].encode("utf-8"))
+    assert np.argsort(index.encode(ids)).tolist() == expected
+    assert index.encode(["caf", "日"]).tolist() == [-1, -1]
+
+
+def test_categorical_input_matches_plain_input():
+    index = IdIndex.build(IDS)
+    categorical = pd.Series(IDS + [None], dtype="category")
+    assert IdIndex.build(categorical).keys.tolist() == index.keys.tolist()
+    assert index.encode(categorical).tolist() == index.encode(IDS).tolist() + [-1]
+
+
+def test_factorize_with_duplicates():
+    ids = pd.Series(["b", "a", "b", None, "c", "a"])
+    index, codes = IdIndex.factorize(ids)
+    assert index.decode(np.arange(len(index))).tolist() == ["a", "b", "c"]
+    assert codes.tolist() == [1, 0, 1, -1, 2, 0]
+    assert codes.tolist() == index.encode(ids).tolist()
+
+
+@pytest.mark.parametrize("n_ids", [1, 17, 5000])
+def test_table_stays_at_most_half_full(n_ids):
+    ids = [f"U{i:027d}" for i in range(n_ids)]
+    index = IdIndex.build(ids)
+    assert len(index.table) == table_size(n_ids) >= 2 * n_ids
+    assert np.count_nonzero(index.table) == n_ids
+    assert index.encode(ids).tolist() == list(range(n_ids))
+
+
+def test_save_then_memory_mapped_load(tmp_path):
+    rng = np.random.default_rng(0)
+    ids = [f"B{value:09d}" for value in rng.integers(0, 10 ** 6, 3000)] + ["ü-id"]
+    index = IdIndex.build(ids)
+    index.save(str(tmp_path / "items"))
+    assert IdIndex.exists(str(tmp_path / "items"))
+
+    loaded = IdIndex.load(str(tmp_path / "items"), mmap=True)
+    assert isinstance(loaded.keys, np.memmap) and isinstance(loaded.table, np.memmap)
+    queries = ids + ["missing"]
+    assert loaded.encode(queries).tolist() == index.encode(queries).tolist()
+    assert loaded.decode(np.arange(len(loaded))).tolist() == index.decode(np.arange(len(index))).tolist()
+
+
+def test_empty_index():
+    index = IdIndex.build([])
+    assert len(index) == 0
+    assert index.encode(["a"]).tolist() == [-1]
@@ -0,0 +1,135 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from interactions import Interactions, build_interactions, cached_interactions, confidence_weights, files_digest
+
+# (u1, i1) and (u2, i1) and (u2, i2) are each reviewed twice, in an order where latest, mean and max disagree
+REVIEWS = pd.DataFrame({
+    "user_id": ["u1", "u1", "u1", "u2", "u2", "u2", "u2"],
+    "parent_asin": ["i1", "i1", "i2", "i1", "i1", "i2", "i2"],
+    "rating": [5.0, 3.0, 2.0, 5.0, 1.0, 4.0, 2.0],
+    "review_timestamp": [2, 1, 1, 1, 2, 3, 1],
+})
+
+
+@pytest.mark.parametrize("duplicates, expected", [
+    ("latest", [[5, 2], [1, 4]]),
+    ("mean", [[4, 2], [3, 3]]),
+    ("max", [[5, 2], [5, 4]]),
+])
+def test_duplicate_policies(duplicates, expected):
+    interactions = build_interactions(REVIEWS, duplicates=duplicates)
+    assert interactions.matrix.toarray().tolist() == expected
+    assert interactions.csc.toarray().tolist() == expected
+    assert interactions.user_index.decode([0, 1]).tolist() == ["u1", "u2"]
+    assert interactions.item_index.decode([0, 1]).tolist() == ["i1", "i2"]
+    assert interactions.meta["duplicates_dropped"] == 3
+
+
+def test_unknown_duplicate_policy():
+    with pytest.raises(ValueError):
+        build_interactions(REVIEWS, duplicates="sum")
+
+
+def test_latest_treats_missing_timestamps_as_oldest():
+    df = pd.DataFrame({"user_id": ["u", "u"], "parent_asin": ["i", "i"], "rating": [1.0, 4.0],
+                       "review_timestamp": [10, None]})
+    assert build_interactions(df).matrix.toarray().tolist() == [[1]]
+
+
+def test_rows_missing_an_id_or_rating_are_dropped():
+    df = pd.concat([REVIEWS, pd.DataFrame({"user_id": [None, "u3"], "parent_asin": ["i1", "i3"],
+                                           "rating": [5.0, None], "review_timestamp": [9, 9]})])
+    interactions = build_interactions(df)
+    assert interactions.shape == (2, 2)
+    assert interactions.meta["rows"] == len(REVIEWS)
+
+
+def test_confidence_weights():
+    values = np.array([1, 4], dtype=np.float32)
+    assert confidence_weights(values, "rating") is values
+    assert confidence_weights(values, "linear", alpha=2).tolist() == [2, 8]
+    log = confidence_weights(values, "log", alpha=10, epsilon=2)
+    assert log.dtype == np.float32
+    assert np.allclose(log, 10 * np.log1p(values / 2))
+    with pytest.raises(ValueError):
+        confidence_weights(values, "square")
+
+
+def test_weighting_is_applied_after_combining_duplicates():
+    interactions = build_interactions(REVIEWS, duplicates="max", weighting="linear", alpha=10)
+    assert interactions.matrix.toarray().tolist() == [[50, 20], [50, 40]]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_round_trip(tmp_path, mmap):
+    interactions = build_interactions(REVIEWS, duplicates="mean")
+    interactions.save(str(tmp_path / "saved"))
+    loaded = Interactions.load(str(tmp_path / "saved"), mmap=mmap)
+    assert (loaded.matrix != interactions.matrix).nnz == 0
+    assert (loaded.csc != interactions.csc).nnz == 0
+    assert loaded.user_index.encode(["u2", "u1", "zz"]).tolist() == [1, 0, -1]
+    assert loaded.item_index.decode([1, 0]).tolist() == ["i2", "i1"]
+    assert loaded.meta["duplicates"] == "mean" and loaded.meta["nnz"] == 4
+    # memory-mapped arrays are read-only views of the files
+    assert loaded.matrix.data.flags.writeable != mmap
+
+
+def cache_entries(cache_dir):
+    return sorted(os.listdir(cache_dir))
+
+
+def test_cached_interactions_hits_until_the_data_changes(tmp_path, capsys):
+    cache_dir = str(tmp_path / "cache")
+    first = cached_interactions(REVIEWS, cache_dir)
+    second = cached_interactions(REVIEWS.copy(), cache_dir)
+    assert "Loaded interaction matrix" in capsys.readouterr().out
+    assert len(cache_entries(cache_dir)) == 1
+    assert second.matrix.toarray().tolist() == first.matrix.toarray().tolist() == [[5, 2], [1, 4]]
+
+    changed = REVIEWS.assign(rating=REVIEWS["rating"].replace(1.0, 2.0))
+    rebuilt = cached_interactions(changed, cache_dir)
+    assert "Saved interaction matrix" in capsys.readouterr().out
+    assert rebuilt.matrix.toarray().tolist() == [[5, 2], [2, 4]]
+    # a different build parameter is a different entry too
+    cached_interactions(REVIEWS, cache_dir, duplicates="max")
+    assert len(cache_entries(cache_dir)) == 3
+
+
+def test_cached_interactions_keyed_by_source_files(tmp_path, capsys):
+    cache_dir = str(tmp_path / "cache")
+    source = tmp_path / "amazon_df.parquet"
+    REVIEWS.to_parquet(source, index=False)
+    cached_interactions(REVIEWS, cache_dir, source=str(source))
+    cached_interactions(REVIEWS, cache_dir, source=str(source))
+    assert capsys.readouterr().out.count("Loaded interaction matrix") == 1
+
+    REVIEWS.iloc[:-1].to_parquet(source, index=False)
+    os.utime(source, ns=(1, 1))
+    cached_interactions(REVIEWS.iloc[:-1], cache_dir, source=str(source))
+    assert "Loaded interaction matrix" not in capsys.readouterr().out
+    assert len(cache_entries(cache_dir)) == 2
+
+
+def test_files_digest_tracks_file_changes(tmp_path):
+    part = tmp_path / "main_category=Books" / "part-0.parquet"
+    part.parent.mkdir()
+    part.write_bytes(b"first")
+    digest = files_digest(str(tmp_path))
+    assert files_digest(str(tmp_path)) == digest
+    assert files_digest(str(part)) != digest
+
+    part.write_bytes(b"second")
+    os.utime(part, ns=(1, 1))
+    assert files_digest(str(tmp_path)) != digest
+
+
+def test_files_digest_rejects_missing_or_empty_paths(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        files_digest(str(tmp_path / "amazon_df"))
+    (tmp_path / "empty" / "main_category=Books").mkdir(parents=True)
+    with pytest.raises(FileNotFoundError):
+        files_digest(str(tmp_path / "empty"))
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from ivf_index import N_PROBE, IVFIndex, augment
+
+
+def random_factors(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    # item norms spread over an order of magnitude, so inner product and cosine rankings differ
+    return (rng.standard_normal((n, dim)) * rng.uniform(0.2, 2.0, (n, 1))).astype(np.float32)
+
+
+def brute_force(query, items, k, exclude=()):
+    scores = items @ query
+    scores[list(exclude)] = -np.inf
+    order = np.argsort(-scores, kind="stable")[:k]
+    return order, scores[order]
+
+
+def test_augment_turns_inner_products_into_cosines():
+    items = random_factors(500)
+    augmented = augment(items)
+    assert np.allclose(np.linalg.norm(augmented, axis=1), 1, atol=1e-5)
+    query = np.random.default_rng(1).standard_normal(16).astype(np.float32)
+    max_norm = np.linalg.norm(items, axis=1).max()
+    assert np.allclose(augmented[:, :-1] @ query, items @ query / max_norm, atol=1e-5)
+
+
+def test_probing_every_list_is_exact():
+    items = random_factors(2000)
+    index = IVFIndex.build(items, n_lists=40)
+    queries = random_factors(20, seed=2)
+    for query in queries:
+        found, scores = index.search(query, k=10, n_probe=index.n_lists)
+        expected, expected_scores = brute_force(query, items, 10)
+        assert found.tolist() == expected.tolist()
+        assert np.allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_recall_at_the_default_probe_count():
+    items = random_factors(20000, seed=3)
+    index = IVFIndex.build(items)
+    assert index.n_probe == N_PROBE < index.n_lists
+    hits = 0
+    queries = random_factors(100, seed=4)
+    for query in queries:
+        found, _ = index.search(query, k=10)
+        hits += len(np.intersect1d(found, brute_force(query, items, 10)[0]))
+    assert hits / (10 * len(queries)) >= 0.9
+
+
+@pytest.mark.parametrize("scale", [0.01, 1.0, 50.0])
+def test_results_do_not_depend_on_the_user_norm(scale):
+    items = random_factors(3000, seed=5)
+    index = IVFIndex.build(items, n_lists=50, n_probe=10)
+    query = random_factors(1, seed=6)[0]
+    found, scores = index.search(query * scale, k=20)
+    reference, reference_scores = index.search(query, k=20)
+    assert found.tolist() == reference.tolist()
+    assert np.allclose(scores, reference_scores * scale, rtol=1e-4)
+    # the best item by inner product, not the best-aligned one, comes first when every list is probed
+    exact, _ = index.search(query * scale, k=1, n_probe=index.n_lists)
+    assert exact[0] == np.argmax(items @ query)
+
+
+def test_search_excludes_seen_items():
+    items = random_factors(1000, seed=7)
+    index = IVFIndex.build(items, n_lists=20)
+    query = random_factors(1, seed=8)[0]
+    best, _ = brute_force(query, items, 5)
+    found, _ = index.search(query, k=10, n_probe=index.n_lists, exclude=best)
+    assert found.tolist() == brute_force(query, items, 10, exclude=best)[0].tolist()
+
+
+def test_save_load_round_trip(tmp_path):
+    items = random_factors(1500, seed=9)
+    index = IVFIndex.build(items, n_probe=7)
+    index.save(str(tmp_path / "ivf"))
+    assert IVFIndex.exists(str(tmp_path / "ivf"))
+    loaded = IVFIndex.load(str(tmp_path / "ivf"), mmap=True)
+    assert loaded.n_probe == 7 and len(loaded) == len(items)
+    query = random_factors(1, seed=10)[0]
+    assert loaded.search(query, k=10)[0].tolist() == index.search(query, k=10)[0].tolist()
@@ -0,0 +1,36 @@
+import load_meta
+
+
+def product(parent_asin, title, **fields):
+    return {"parent_asin": parent_asin, "title": title, "main_category": "Books", **fields}
+
+
+def test_last_duplicate_product_in_a_file_wins(pg_connect):
+    connection = pg_connect()
+    with connection.cursor() as cursor:
+        assert load_meta.create_meta_data_table(connection, cursor)
+        # the duplicates straddle a batch boundary and come both before and after the other products
+        batches = [
+            [load_meta.meta_row(product(f"B{i}", f"first {i}"), "Books.jsonl") for i in range(50)],
+            [load_meta.meta_row(product(f"B{i}", f"second {i}"), "Books.jsonl") for i in range(0, 50, 2)],
+            [load_meta.meta_row(product("B0", "last 0"), "Books.jsonl")],
+        ]
+        counts = load_meta.insert_meta_data_to_db([("Books.jsonl", batches)], connection, cursor)
+        assert counts["inserted"] == 50
+
+        cursor.execute("SELECT parent_asin, title FROM meta_data")
+        titles = dict(cursor.fetchall())
+    assert titles["B0"] == "last 0"
+    assert all(titles[f"B{i}"] == (f"second {i}" if i % 2 == 0 else f"first {i}") for i in range(1, 50))
+
+
+def test_migration_ignores_legacy_meta_data_in_other_schemas(pg_connect):
+    legacy = pg_connect("legacy")
+    with legacy.cursor() as cursor:
+        cursor.execute("CREATE TABLE meta_data (id SERIAL PRIMARY KEY, average_rating TEXT)")
+    legacy.commit()
+
+    connection = pg_connect()
+    with connection.cursor() as cursor:
+        assert load_meta.create_meta_data_table(connection, cursor)
+        assert not load_meta.migrate_meta_data_types(connection, cursor)
@@ -0,0 +1,225 @@
+import copy
+import gzip
+
+import pyarrow.dataset as ds
+import pytest
+
+import load_review
+from benchmarks.bench_parallel_ingest import run as read_in_parallel
+from benchmarks.fixtures import review_lines, serve_directory, write_review_gzip
+from download_cache import DownloadCache
+
+MEMBER_LINES = 1000
+
+
+def multi_member_gzip(n_lines, seed=0, **kwargs):
+    # one gzip member per MEMBER_LINES lines, so a resumed read can restart from a member offset
+    lines = list(review_lines(n_lines, seed=seed, **kwargs))
+    return b"".join(gzip.compress(b"".join(lines[start:start + MEMBER_LINES]))
+                    for start in range(0, n_lines, MEMBER_LINES))
+
+
+class FlakyReader:
+    def __init__(self, data, fail_after=None, chunk_size=4096):
+        self.data = data
+        self.fail_after = fail_after
+        self.chunk_size = chunk_size
+        self.position = 0
+
+    def read(self, size=-1):
+        if self.fail_after is not None and self.position >= self.fail_after:
+            raise ConnectionError("connection reset by peer")
+        size = self.chunk_size if size is None or size < 0 else min(size, self.chunk_size)
+        data = self.data[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+class FlakyCache:
+    """Stands in for DownloadCache: serves in-memory files from any byte offset, as a Range request would, and
+    fails a file's reader once fail_after[url] bytes of it have been read."""
+
+    def __init__(self, files, fail_after=None):
+        self.files = files
+        self.fail_after = fail_after or {}
+        self.opened = []
+
+    def open(self, url, offset=0):
+        self.opened.append((url, offset))
+        return FlakyReader(self.files[url][offset:], self.fail_after.get(url))
+
+
+def read_batches(file_url, progress=None, batch_rows=2000):
+    # what a checkpointing consumer keeps: the rows of every batch it received and the progress saved with them
+    rows = []
+    try:
+        for _, batch, batch_progress, _ in load_review.iter_category_batches(file_url, progress, batch_rows):
+            rows.extend(batch)
+            progress = copy.deepcopy(batch_progress)
+    except ConnectionError:
+        return rows, progress, False
+    return rows, progress, True
+
+
+@pytest.mark.parametrize("fail_fraction", [0.1, 0.45, 0.9])
+def test_resumed_read_matches_uninterrupted_read(monkeypatch, fail_fraction):
+    url = "http://example.test/Books.jsonl.gz"
+    data = multi_member_gzip(12000)
+
+    monkeypatch.setattr(load_review, "dataset_cache", FlakyCache({url: data}))
+    expected_rows, expected_progress, finished = read_batches(url)
+    assert finished
+
+    cache = FlakyCache({url: data}, fail_after={url: int(len(data) * fail_fraction)})
+    monkeypatch.setattr(load_review, "dataset_cache", cache)
+    rows, progress, finished = read_batches(url)
+    assert not finished
+
+    cache.fail_after = {}
+    resumed_rows, progress, finished = read_batches(url, progress)
+    assert finished
+    assert rows + resumed_rows == expected_rows
+    assert progress == expected_progress
+    if rows:
+        # with a checkpoint to go back to, the resumed read starts at a gzip member instead of byte 0
+        assert cache.opened[-1][1] > 0
+
+
+def ingest(connection, review_files, cache, dataset_dir):
+    load_review.dataset_cache = cache
+    with connection.cursor() as cursor:
+        return load_review.parse_review_files(review_files, connection, cursor, dataset_dir=str(dataset_dir))
+
+
+def ingested_state(connection, dataset_dir):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT * FROM review_data ORDER BY filename, user_id, parent_asin, review_timestamp, asin")
+        reviews = cursor.fetchall()
+        cursor.execute("SELECT user_idx, user_id FROM users ORDER BY user_idx")
+        users = cursor.fetchall()
+        cursor.execute("SELECT count(*) FROM review_staging")
+        staged = cursor.fetchone()[0]
+    dataset = ds.dataset(str(dataset_dir), partitioning="hive").to_table().to_pylist()
+    return reviews, users, staged, sorted(dataset, key=lambda row: sorted(row.items(), key=str))
+
+
+@pytest.mark.parametrize("fail_file, fail_fraction", [(0, 0.6), (1, 0.3), (1, 0.9)])
+def test_interrupted_ingestion_resumes_to_the_same_result(pg_connect, monkeypatch, tmp_path, fail_file, fail_fraction):
+    monkeypatch.setattr(load_review, "MAX_REVIEWS", 7000)
+    monkeypatch.setattr(load_review, "dataset_cache", None)
+    urls = [f"http://example.test/Category_{i}.jsonl.gz" for i in range(2)]
+    files = {url: multi_member_gzip(25000, seed=i, n_users=3000) for i, url in enumerate(urls)}
+
+    def prepare(name):
+        connection = pg_connect(name)
+        with connection.cursor() as cursor:
+            # users from an earlier run, whose reviews are selected first
+            cursor.execute("""
+                CREATE TABLE users (user_idx INTEGER PRIMARY KEY, user_id TEXT NOT NULL UNIQUE);
+                INSERT INTO users SELECT i, 'U' || lpad(i::text, 27, '0') FROM generate_series(0, 299) AS i;
+            """)
+        connection.commit()
+        return connection
+
+    clean = prepare("clean")
+    ingest(clean, urls, FlakyCache(files), tmp_path / "clean")
+
+    interrupted = prepare("interrupted")
+    fail_url = urls[fail_file]
+    with pytest.raises(ConnectionError):
+        ingest(interrupted, urls, FlakyCache(files, {fail_url: int(len(files[fail_url]) * fail_fraction)}),
+               tmp_path / "interrupted")
+    with interrupted.cursor() as cursor:
+        cursor.execute("SELECT restart_offset FROM ingest_progress WHERE filename = %s",
+                       (load_review.category_filename(fail_url),))
+        checkpoint = cursor.fetchone()
+    interrupted.close()
+
+    resumed = pg_connect("interrupted")
+    cache = FlakyCache(files)
+    ingest(resumed, urls, cache, tmp_path / "interrupted")
+
+    assert ingested_state(resumed, tmp_path / "interrupted") == ingested_state(clean, tmp_path / "clean")
+    # completed files are skipped and the interrupted one restarts from its last checkpoint
+    assert cache.opened == [(fail_url, checkpoint[0] if checkpoint else 0)] + [(url, 0) for url in urls[fail_file + 1:]]
+
+
+def test_parallel_read_matches_sequential_read(monkeypatch, tmp_path):
+    monkeypatch.setattr(load_review, "dataset_cache", DownloadCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(load_review, "SPILL_DIR", str(tmp_path / "spill"))
+    served = tmp_path / "served"
+    served.mkdir()
+    for i in range(3):
+        write_review_gzip(served / f"Category_{i}.jsonl.gz", 3000, seed=i)
+
+    with serve_directory(str(served)) as base_url:
+        urls = [f"{base_url}Category_{i}.jsonl.gz" for i in range(3)]
+        _, sequential = read_in_parallel(urls, 1)
+        _, parallel = read_in_parallel(urls, 2)
+
+    assert parallel == sequential
+    assert sorted(sequential) == [f"Category_{i}.jsonl" for i in range(3)]
+    assert all(len(user_ids) == 3000 for user_ids in sequential.values())
+
+
+@pytest.mark.parametrize("stop", ["early", "missing_file"])
+def test_parallel_read_leaves_no_spill_files(monkeypatch, tmp_path, stop):
+    monkeypatch.setattr(load_review, "dataset_cache", DownloadCache(str(tmp_path / "cache")))
+    spill_dir = tmp_path / "spill"
+    monkeypatch.setattr(load_review, "SPILL_DIR", str(spill_dir))
+    served = tmp_path / "served"
+    served.mkdir()
+    for i in range(4):
+        write_review_gzip(served / f"Category_{i}.jsonl.gz", 2000, seed=i)
+
+    with serve_directory(str(served)) as base_url:
+        urls = [f"{base_url}Category_{i}.jsonl.gz" for i in range(4)]
+        if stop == "early":
+            batches = load_review.read_category_files(urls, {}, workers=2)
+            next(batches)
+            batches.close()
+        else:
+            with pytest.raises(Exception):
+                for _ in load_review.read_category_files(urls[:1] + [f"{base_url}Missing.jsonl.gz"] + urls[1:], {}, 2):
+                    pass
+
+    assert list(spill_dir.iterdir()) == []
+
+
+def test_legacy_text_review_data_is_migrated_to_typed_columns(pg_connect):
+    connection = pg_connect()
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE review_data (
+                user_id TEXT, parent_asin TEXT, asin TEXT, rating TEXT, title TEXT, review_text TEXT, images TEXT,
+                review_timestamp TEXT, verified_purchase TEXT, helpful_vote TEXT, filename TEXT
+            )
+        """)
+        # rows as the original INSERT (str() of Python values) and the TEXT-column COPY loader wrote them
+        cursor.executemany("INSERT INTO review_data VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", [
+            ("U1", "B1", "B1", "5.0", "t", "x", '[{"url": "a\\u0000b"}]', "1600000000123", "true", "3", "A.jsonl"),
+            ("U2", "B2", "B2", "4", "t", "x", '["bad\\u0000"]', "1600000000456", "f", "0", "A.jsonl"),
+            ("U3", "B3", "B3", None, "t", "x", "[]", "1600000000789", "False", None, "A.jsonl"),
+        ])
+        load_review.create_review_data_table(connection, cursor)
+        load_review.create_review_data_table(connection, cursor)
+
+        cursor.execute("""
+            SELECT user_id, rating, images, review_timestamp, verified_purchase, helpful_vote
+            FROM review_data ORDER BY user_id
+        """)
+        assert cursor.fetchall() == [
+            ("U1", 5.0, [{"url": "ab"}], 1600000000123, True, 3),
+            ("U2", 4.0, ["bad"], 1600000000456, False, 0),
+            ("U3", None, [], 1600000000789, False, None),
+        ]
+        cursor.execute("""
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'review_data'
+              AND column_name IN ('review_timestamp', 'images')
+            ORDER BY column_name
+        """)
+        assert cursor.fetchall() == [("images", "jsonb"), ("review_timestamp", "bigint")]
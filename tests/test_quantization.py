@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from quantization import QuantizedFactors
+
+# worst-case error of one dequantized factor, as a fraction of the item's largest magnitude
+ELEMENT_ERROR = {"int8": 0.5 / 127, "float16": 2.0 ** -11}
+
+
+def item_factors(n_items=1000, n_factors=24, seed=0):
+    rng = np.random.default_rng(seed)
+    # per-item magnitudes from TruncatedSVD-small to large, so the per-item scales matter
+    return (rng.standard_normal((n_items, n_factors)) * 10.0 ** rng.uniform(-4, 1, (n_items, 1))).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_round_trip_error_is_bounded(dtype):
+    factors = item_factors()
+    quantized = QuantizedFactors.quantize(factors, dtype)
+    assert quantized.codes.dtype == np.dtype(dtype) and quantized.codes.shape == factors.shape[::-1]
+    assert quantized.shape == factors.shape and len(quantized) == len(factors)
+    restored = quantized.dequantize()
+    bound = np.abs(factors).max(axis=1, keepdims=True) * ELEMENT_ERROR[dtype]
+    assert np.all(np.abs(restored - factors) <= bound * (1 + 1e-5))
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+@pytest.mark.parametrize("block_items", [64, 333, 4096])
+def test_scores_match_the_float32_dot_product(dtype, block_items):
+    factors = item_factors(seed=1)
+    queries = np.random.default_rng(2).standard_normal((5, factors.shape[1])).astype(np.float32)
+    quantized = QuantizedFactors.quantize(factors, dtype)
+    exact = queries @ factors.T
+    # per-element errors add up to at most sum(|q|) times the item's element bound
+    bound = np.abs(queries).sum(axis=1, keepdims=True) * np.abs(factors).max(axis=1) * ELEMENT_ERROR[dtype]
+    scores = quantized.score(queries, block_items)
+    assert scores.dtype == np.float32 and scores.shape == exact.shape
+    assert np.all(np.abs(scores - exact) <= bound * 1.01 + 1e-4)
+    assert np.allclose(quantized.score(queries[0], block_items), scores[0], rtol=1e-5, atol=1e-6)
+    # and scoring agrees with its own dequantized factors to float32 rounding
+    assert np.allclose(scores, queries @ quantized.dequantize().T, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_zero_item_rows(dtype):
+    factors = item_factors(50, seed=3)
+    factors[[0, 17]] = 0
+    with np.errstate(all="raise"):
+        quantized = QuantizedFactors.quantize(factors, dtype)
+        scores = quantized.score(np.ones(factors.shape[1], dtype=np.float32))
+    assert quantized.scales[[0, 17]].tolist() == [0, 0]
+    assert np.all(np.isfinite(quantized.dequantize()))
+    assert np.all(quantized.dequantize()[[0, 17]] == 0)
+    assert scores[[0, 17]].tolist() == [0, 0]
+
+
+def test_unknown_dtype():
+    with pytest.raises(ValueError):
+        QuantizedFactors.quantize(item_factors(10), "int4")
+
+
+def test_save_load_round_trip(tmp_path):
+    quantized = QuantizedFactors.quantize(item_factors(200, seed=4), "int8")
+    quantized.save(str(tmp_path / "items"))
+    assert QuantizedFactors.exists(str(tmp_path / "items"))
+    loaded = QuantizedFactors.load(str(tmp_path / "items"), mmap=True)
+    query = np.arange(24, dtype=np.float32)
+    assert np.array_equal(loaded.score(query), quantized.score(query))
+    assert loaded.nbytes == quantized.nbytes
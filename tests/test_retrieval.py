@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from quantization import QuantizedFactors
+from retrieval import mask_seen, recommend, recommend_batch, top_k
+
+
+def reference(scores, k):
+    # full argsort, best first
+    order = np.argsort(-scores, kind="stable")[:k]
+    return order, scores[order]
+
+
+def factors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def seen_matrix(n_users, n_items, seen):
+    rows = [user for user, items in seen.items() for _ in items]
+    columns = [item for items in seen.values() for item in items]
+    return sp.csr_matrix((np.ones(len(rows), np.float32), (rows, columns)), shape=(n_users, n_items))
+
+
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_top_k_matches_a_full_sort(k):
+    scores = np.random.default_rng(1).standard_normal(50)
+    indices, values = top_k(scores, k)
+    expected, expected_values = reference(scores, k)
+    assert indices.tolist() == expected.tolist()
+    assert values.tolist() == expected_values.tolist()
+
+
+def test_top_k_larger_than_the_number_of_items():
+    scores = np.array([0.5, 2.0, -1.0])
+    indices, values = top_k(scores, 10)
+    assert indices.tolist() == [1, 0, 2] and values.tolist() == [2.0, 0.5, -1.0]
+    assert top_k(scores, 0)[0].shape == (0,)
+
+
+def test_top_k_with_ties():
+    scores = np.array([1.0, 3.0, 2.0, 3.0, 2.0, 2.0, 0.0])
+    indices, values = top_k(scores, 4)
+    assert values.tolist() == [3.0, 3.0, 2.0, 2.0]
+    assert sorted(indices[:2].tolist()) == [1, 3]
+    assert set(indices[2:].tolist()) <= {2, 4, 5}
+    assert scores[indices].tolist() == values.tolist()
+
+
+def test_top_k_per_row():
+    scores = np.random.default_rng(2).standard_normal((6, 30))
+    indices, values = top_k(scores, 7)
+    for row in range(6):
+        assert indices[row].tolist() == reference(scores[row], 7)[0].tolist()
+
+
+def test_mask_seen_one_user_and_a_block():
+    interactions = seen_matrix(3, 5, {0: [1, 4], 2: [0]})
+    scores = mask_seen(np.zeros(5), interactions, 0)
+    assert np.isneginf(scores).tolist() == [False, True, False, False, True]
+    block = mask_seen(np.zeros((3, 5)), interactions, np.array([2, 1, 0]))
+    assert np.argwhere(np.isneginf(block)).tolist() == [[0, 0], [2, 1], [2, 4]]
+
+
+@pytest.mark.parametrize("k", [3, 40])
+def test_recommend_matches_a_full_sort_of_unseen_items(k):
+    users, items = factors(4, seed=3), factors(30, seed=4)
+    seen = {0: [0, 5, 7], 1: [], 2: list(range(0, 30, 2)), 3: [29]}
+    interactions = seen_matrix(4, 30, seen)
+    for user in range(4):
+        scores = items @ users[user]
+        scores[seen[user]] = -np.inf
+        expected, expected_scores = reference(scores, min(k, 30 - len(seen[user])))
+        found, found_scores = recommend(user, users, items, interactions, k)
+        assert found.tolist() == expected.tolist()
+        assert np.allclose(found_scores, expected_scores)
+        assert not set(found.tolist()) & set(seen[user])
+
+
+def test_user_who_has_seen_every_item():
+    users, items = factors(2, seed=5), factors(6, seed=6)
+    interactions = seen_matrix(2, 6, {0: list(range(6)), 1: [2]})
+    found, scores = recommend(0, users, items, interactions, 3)
+    assert found.tolist() == [] and scores.tolist() == []
+    batch_items, batch_scores = recommend_batch([0, 1], users, items, interactions, 3)
+    assert batch_items[0].tolist() == [-1, -1, -1] and np.isneginf(batch_scores[0]).all()
+    assert batch_items[1].tolist() == recommend(1, users, items, interactions, 3)[0].tolist()
+
+
+def test_recommend_batch_pads_users_with_few_unseen_items():
+    users, items = factors(5, seed=7), factors(8, seed=8)
+    seen = {0: [1], 1: list(range(6)), 2: [], 3: [0, 7], 4: [3]}
+    interactions = seen_matrix(5, 8, seen)
+    batch_items, batch_scores = recommend_batch(np.arange(5), users, items, interactions, 4)
+    assert batch_items.shape == (5, 4)
+    for user in range(5):
+        found, found_scores = recommend(user, users, items, interactions, 4)
+        padding = 4 - len(found)
+        assert batch_items[user].tolist() == found.tolist() + [-1] * padding
+        assert np.allclose(batch_scores[user][:len(found)], found_scores)
+        assert np.isneginf(batch_scores[user][len(found):]).all()
+
+
+def test_float64_users_and_quantized_items():
+    users, items = factors(3, seed=9).astype(np.float64), factors(40, seed=10)
+    interactions = seen_matrix(3, 40, {0: [3]})
+    found, scores = recommend(0, users, items, interactions, 5)
+    assert scores.dtype == np.float32
+    quantized = QuantizedFactors.quantize(items, "float16")
+    found_quantized, _ = recommend(0, users, quantized, interactions, 5)
+    assert len(set(found.tolist()) & set(found_quantized.tolist())) >= 4
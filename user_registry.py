@@ -0,0 +1,73 @@
+import psycopg2
+from bulk_copy import copy_rows
+
+INT32_MAX = 2 ** 31 - 1
+
+
+class UserRegistry:
+    def __init__(self, users=()):
+        self._user_to_idx = {}
+        self._unsaved = []
+        for user_id, user_idx in users:
+            self._user_to_idx[user_id] = user_idx
+
+    def __contains__(self, user_id):
+        return user_id in self._user_to_idx
+
+    def __len__(self):
+        return len(self._user_to_idx)
+
+    def add(self, user_id):
+        user_idx = self._user_to_idx.get(user_id)
+        if user_idx is None:
+            user_idx = len(self._user_to_idx)
+            if user_idx > INT32_MAX:
+                raise OverflowError("user registry is full: user_idx no longer fits in int32")
+            self._user_to_idx[user_id] = user_idx
+            self._unsaved.append((user_idx, user_id))
+        return user_idx
+
+    def get(self, user_id):
+        return self._user_to_idx.get(user_id)
+
+    def save(self, cursor):
+        if not self._unsaved:
+            return 0
+        saved = copy_rows(cursor, "users", ["user_idx", "user_id"], self._unsaved)
+        self._unsaved = []
+        return saved
+
+
+def create_users_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_idx INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL UNIQUE
+        )
+    """)
+
+
+def load_user_registry(connection, cursor):
+    try:
+        create_users_table(cursor)
+        cursor.execute("SELECT user_id, user_idx FROM users ORDER BY user_idx")
+        registry = UserRegistry(cursor.fetchall())
+        connection.commit()
+    except psycopg2.Error as e:
+        print(f"Error loading user registry: {e}")
+        connection.rollback()
+        return UserRegistry()
+
+    if len(registry) == 0:
+        try:
+            cursor.execute("SELECT DISTINCT user_id FROM review_data ORDER BY user_id")
+            for (user_id,) in cursor.fetchall():
+                registry.add(user_id)
+            registry.save(cursor)
+            connection.commit()
+            print(f"Seeded users table with {len(registry)} users from review_data")
+        except psycopg2.Error:
+            connection.rollback()
+            registry = UserRegistry()
+
+    return registry